@@ -0,0 +1,51 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
+
+from app.core import profiling
+from app.core.config import settings
+
+
+def _require_profiling(authorization: Optional[str] = Header(None)):
+    """Profiling must be enabled and the request must carry `Authorization: Bearer <PROFILING_TOKEN>`"""
+    if not settings.PROFILING_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profiling is disabled")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not profiling.valid_token(token.strip()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Admin token required",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+router = APIRouter(dependencies=[Depends(_require_profiling)])
+
+
+@router.get("/profiles")
+async def list_profiles(limit: int = 50):
+    """
+    Most recent request profiles, newest first
+
+    - **limit**: Maximum number of profiles to list (default: 50)
+    """
+    return {"profiles": profiling.list_profiles(limit)}
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+    """Stage timings and per-stage top allocations of one profile"""
+    profile = profiling.read_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Profile {profile_id} not found")
+    return profile
+
+
+@router.get("/profiles/{profile_id}/stacks", response_class=PlainTextResponse)
+async def get_profile_stacks(profile_id: str):
+    """Collapsed stacks of one profile (flamegraph.pl / speedscope / inferno input)"""
+    stacks = profiling.read_stacks(profile_id)
+    if stacks is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Profile {profile_id} not found")
+    return stacks
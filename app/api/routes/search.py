@@ -1,10 +1,12 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Form
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, status, Depends, Form, Header
+from fastapi.responses import JSONResponse, Response
+import json
 from typing import Optional
 
 from app.core.models import SearchResponse, OpenAIResponse, SearchPipeline, SearchRequest
-from app.services.search_service import process_search_query
-from app.core.utils import convert_numpy_types
+from app.services.search_service import process_search_query, fetch_search_page, refine_search
+from app.core.results import dumps_response
+from app.services import http_cache, usage
 
 router = APIRouter()
 
@@ -42,11 +44,8 @@ async def search(
             do_rerank=do_rerank
         )
         
-        # Convert NumPy types to standard Python types for JSON serialization
-        converted_response = convert_numpy_types(openai_response)
-        
-        # Return the processed response
-        return converted_response
+        # Serialize straight to JSON bytes (hits and NumPy scalars are encoded inline)
+        return Response(content=dumps_response(openai_response), media_type="application/json")
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -60,7 +59,8 @@ async def search_get(
     limit: int = 30,
     rerank_limit: int = 10,
     pipeline: str = "FUSION_RRF",
-    do_rerank: bool = True
+    do_rerank: bool = True,
+    if_none_match: Optional[str] = Header(None),
 ):
     """
     Execute a search query with GET method and return OpenAI chat completion response
@@ -70,6 +70,9 @@ async def search_get(
     - **rerank_limit**: Maximum number of results to rerank (default: 10)
     - **pipeline**: Search pipeline to use (default: FUSION_RRF)
     - **do_rerank**: Whether to rerank search results (default: True)
+
+    With HTTP_CACHE_ENABLED the response carries an ETag and Cache-Control; a matching
+    If-None-Match is answered with 304 without running the search.
     """
     # Convert string pipeline parameter to enum
     from app.core.models import SearchPipeline
@@ -86,6 +89,20 @@ async def search_get(
         do_rerank=do_rerank
     )
     
+    # The ETag is derived from the request alone, so revalidation and repeats skip the pipeline
+    store = http_cache.response_store
+    etag = None
+    if store is not None:
+        etag = http_cache.response_etag(request.query, request.limit, request.rerank_limit,
+                                        request.pipeline, request.do_rerank)
+    if etag is not None:
+        if http_cache.etag_matches(if_none_match, etag):
+            store.record_not_modified()
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=http_cache.cache_headers(etag))
+        body = store.get(etag)
+        if body is not None:
+            return Response(content=body, media_type="application/json", headers=http_cache.cache_headers(etag))
+
     try:
         # Assuming process_search_query returns the OpenAI response
         openai_response = await process_search_query(
@@ -93,16 +110,83 @@ async def search_get(
             limit=request.limit,
             rerank_limit=request.rerank_limit,
             pipeline=request.pipeline,
-            do_rerank=request.do_rerank
+            do_rerank=request.do_rerank,
+            # Cached bodies drop next_cursor and session_id, so keep no snapshot or session for them
+            stateful=etag is None,
         )
         
-        # Convert NumPy types to standard Python types for JSON serialization
-        converted_response = convert_numpy_types(openai_response)
-        
-        # Return the processed response
-        return converted_response
+        shared_response = (http_cache.cacheable_response(openai_response, usage.current_request())
+                           if etag is not None else None)
+        if shared_response is not None:
+            body = dumps_response(shared_response)
+            store.put(etag, body)
+            return Response(content=body, media_type="application/json", headers=http_cache.cache_headers(etag))
+        # Serialize straight to JSON bytes (hits and NumPy scalars are encoded inline)
+        return Response(content=dumps_response(openai_response), media_type="application/json",
+                        headers={"Cache-Control": "no-store"} if etag is not None else None)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error processing search: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@router.get("/search/page")
+async def search_page(
+    cursor: str,
+    limit: Optional[int] = None,
+):
+    """
+    Fetch the next page of an earlier search from its server-side snapshot
+
+    No query expansion, embedding or retrieval is repeated; hits past the reranked head are
+    reranked within the page when the original search reranked.
+
+    - **cursor**: `next_cursor` from a search or an earlier page
+    - **limit**: Page size (default: `PAGINATION_PAGE_SIZE`)
+    """
+    page = await fetch_search_page(cursor, limit)
+    if page is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Cursor is unknown or has expired; run the search again"
+        )
+    return Response(content=dumps_response(page), media_type="application/json")
+
+
+@router.post("/search/refine")
+async def search_refine(
+    session_id: str = Form(..., description="session_id returned by an earlier search"),
+    refinement: Optional[str] = Form(None, description="Follow-up such as 'cheaper', 'in black' or 'from Logitech'"),
+    slots: Optional[str] = Form(None, description="Explicit slot delta as JSON"),
+    limit: Optional[int] = Form(None, description="Maximum number of results to return"),
+    generate_products: Optional[bool] = Form(False, description="Whether to generate product recommendations"),
+):
+    """
+    Narrow the candidates of an earlier search with a follow-up refinement
+
+    The refinement is applied as a slot delta to the candidates kept server-side; Qdrant is only
+    searched again when too few of them match. No query expansion is made.
+
+    Form parameters:
+    - **session_id**: `session_id` from a search or an earlier refinement
+    - **refinement**: Free-text follow-up (optional when **slots** is given)
+    - **slots**: Slot delta as JSON, e.g. `{"brand": "Logitech", "attributes": {"color": "schwarz"}, "max_price": 50}`
+    - **limit**: Maximum number of results (default: the search's limit)
+    - **generate_products**: Whether to generate product recommendations (default: False)
+    """
+    try:
+        slots_delta = json.loads(slots) if slots else None
+    except json.JSONDecodeError:
+        slots_delta = None
+    if slots is not None and not isinstance(slots_delta, dict):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="slots must be a JSON object")
+    if not refinement and not slots_delta:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="refinement or slots is required")
+
+    result = await refine_search(session_id, refinement, slots_delta, limit, generate_products)
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Session is unknown or has expired; run the search again"
+        )
+    return Response(content=dumps_response(result), media_type="application/json")
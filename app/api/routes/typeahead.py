@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Query
+from fastapi.responses import Response
+
+from app.core.results import dumps_response
+from app.services import typeahead
+
+router = APIRouter()
+
+@router.get("/typeahead")
+async def typeahead_get(
+    q: str = Query(..., description="Partial query as typed"),
+    limit: int = Query(8, ge=1, le=20, description="Maximum number of suggestions"),
+):
+    """
+    Suggest product titles, brands and categories for a partial query
+
+    Served from the in-memory index only (no LLM, embedding or Qdrant calls), so it is
+    cheap enough to call on every keystroke.
+
+    - **q**: Partial query text
+    - **limit**: Maximum number of suggestions (default: 8)
+    """
+    suggestions = typeahead.typeahead_index.suggest(q, limit)
+    return Response(content=dumps_response({"query": q, "suggestions": suggestions}), media_type="application/json")
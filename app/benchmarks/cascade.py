@@ -0,0 +1,101 @@
+"""
+Compare full cross-encoder reranking with the rerank cascade on labeled judgments.
+
+For the baseline and every early-exit margin given, reports cross-encoder pairs and calls per
+query, the early-exit rate, the quality metrics of app.benchmarks.evaluate and p50/p95 latency.
+
+    python -m app.benchmarks.cascade judgments.jsonl --pipeline FUSION_RRF --rerank-limit 20
+    python -m app.benchmarks.cascade --synthetic 200 --fake-reranker --margins 0.2,0.35,0.5
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, List
+
+from app.benchmarks.evaluate import evaluate_config, load_judgments, synthetic_judgments
+from app.benchmarks.standins import add_standin_arguments, install_from_args
+from app.services import rerank_cache
+
+
+class CountingModel:
+    """Wraps a cross-encoder and counts predict calls and scored pairs"""
+
+    def __init__(self, model):
+        self.model = model
+        self.calls = 0
+        self.pairs = 0
+
+    def predict(self, sentence_pairs, **kwargs):
+        self.calls += 1
+        self.pairs += len(sentence_pairs)
+        return self.model.predict(sentence_pairs, **kwargs)
+
+
+def run_variant(name: str, judgments: List[Dict[str, Any]], args: argparse.Namespace, cascade: bool,
+                margin: float = None) -> Dict[str, Any]:
+    from app.core.config import settings
+    from app.services import search_service
+
+    settings.RERANK_CASCADE_ENABLED = cascade
+    if margin is not None:
+        settings.RERANK_CASCADE_EARLY_EXIT_MARGIN = margin
+    counter = CountingModel(search_service.cross_encoder)
+    search_service.cross_encoder = counter
+    try:
+        row = evaluate_config(judgments, args.pipeline, None, args.limit, args.rerank_limit, args.k)
+    finally:
+        search_service.cross_encoder = counter.model
+    row.update({
+        "variant": name,
+        "cross_encoder_calls_per_query": counter.calls / len(judgments),
+        "cross_encoder_pairs_per_query": counter.pairs / len(judgments),
+        "early_exit_rate": 1 - counter.calls / len(judgments),
+    })
+    return row
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("judgments", nargs="?", help="JSONL file with query -> relevant product_id judgments")
+    parser.add_argument("--synthetic", type=int, default=0, help="Generate this many judged queries from the synthetic catalog")
+    parser.add_argument("--pipeline", default="FUSION_RRF")
+    parser.add_argument("--limit", type=int, default=30)
+    parser.add_argument("--rerank-limit", type=int, default=20)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--margins", default="", help="Comma-separated early-exit margins (default: configured margin)")
+    add_standin_arguments(parser)
+    parser.add_argument("--output", help="Write the JSON report here")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.judgments and not args.synthetic:
+        sys.exit("Provide a judgments file or --synthetic N")
+    products = install_from_args(args).products
+    # Every configuration repeats the same queries; measure uncached cross-encoder cost
+    rerank_cache.rerank_score_cache = None
+    judgments = load_judgments(args.judgments) if args.judgments else synthetic_judgments(products, args.synthetic, args.seed)
+
+    rows = [run_variant("full rerank", judgments, args, cascade=False)]
+    margins = [float(value) for value in args.margins.split(",") if value.strip()] or [None]
+    for margin in margins:
+        label = "cascade" if margin is None else f"cascade margin={margin}"
+        rows.append(run_variant(label, judgments, args, cascade=True, margin=margin))
+
+    baseline = rows[0]
+    quality_keys = [f"ndcg@{args.k}", f"recall@{args.k}", "mrr"]
+    for row in rows:
+        deltas = " ".join(f"{key}={row[key]:.3f} ({row[key] - baseline[key]:+.3f})" for key in quality_keys)
+        print(f"{row['variant']:<24} pairs/query={row['cross_encoder_pairs_per_query']:6.2f} "
+              f"calls/query={row['cross_encoder_calls_per_query']:4.2f} early_exit={row['early_exit_rate']:5.1%} "
+              f"p95={row['p95_ms']:7.1f}ms {deltas}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump({"judged_queries": len(judgments), "results": rows}, output_file, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
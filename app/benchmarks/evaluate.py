@@ -0,0 +1,238 @@
+"""
+Retrieval quality vs. latency sweep over pipelines, prefetch sizes, limits and rerank depth.
+
+Judgments are JSONL lines of the form
+    {"query": "34 Zoll curved Monitor 120Hz", "relevant": ["514383", "474243"]}
+or, with graded relevance, {"query": ..., "relevant": {"514383": 2, "474243": 1}}. An optional
+"variants" list of recorded query variants is used by app.benchmarks.multi_query.
+Every configuration runs search_and_rerank for every judged query and reports recall@k,
+nDCG@k and MRR next to p50/p95 latency, plus the Pareto frontier of quality vs. p95.
+
+    python -m app.benchmarks.evaluate judgments.jsonl --prefetch 20,30,50,80 --rerank 0,10,20
+    python -m app.benchmarks.evaluate --synthetic 200 --fake-reranker --latency-budget-ms 50
+"""
+import argparse
+import itertools
+import json
+import math
+import random
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from app.benchmarks.stats import summarize
+from app.benchmarks.standins import add_standin_arguments, install_from_args, iter_jsonl
+from app.services import rerank_cache
+
+# Settings that control the prefetch size of each multi-stage pipeline
+PREFETCH_SETTINGS = {
+    "FUSION_RRF": ["FUSION_DENSE_PREFETCH_LIMIT", "FUSION_SPARSE_PREFETCH_LIMIT"],
+    "BM25_TO_SEMANTIC": ["BM25_TO_SEMANTIC_PREFETCH_LIMIT"],
+    "SEMANTIC_TO_BM25": ["SEMANTIC_TO_BM25_PREFETCH_LIMIT"],
+}
+
+
+def load_judgments(path: str) -> List[Dict[str, Any]]:
+    """Normalize judgments to {"query": str, "relevant": {product_id: gain}}"""
+    judgments = []
+    for entry in iter_jsonl(path):
+        relevant = entry.get("relevant") or {}
+        if isinstance(relevant, list):
+            relevant = {str(product_id): 1 for product_id in relevant}
+        else:
+            relevant = {str(product_id): float(gain) for product_id, gain in relevant.items()}
+        if entry.get("query") and relevant:
+            judgment = {"query": entry["query"], "relevant": relevant}
+            if isinstance(entry.get("variants"), list):
+                judgment["variants"] = entry["variants"]
+            judgments.append(judgment)
+    return judgments
+
+
+def synthetic_judgments(products: List[Dict[str, Any]], count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Derive judged queries from a synthetic catalog: "<category> <attribute>" queries where
+    products sharing the category and attribute are relevant (gain 2 if the brand also matches).
+    """
+    rng = random.Random(seed)
+    judgments = []
+    for product in rng.sample(products, min(count, len(products))):
+        attribute = rng.choice(product["page_content"].split("Eigenschaften: ", 1)[1].split(".")[0].split(", "))
+        brand = product["brand"] if rng.random() < 0.5 else None
+        query = " ".join(part for part in (brand, product["category"], attribute) if part)
+        relevant = {}
+        for candidate in products:
+            if candidate["category"] == product["category"] and attribute in candidate["page_content"]:
+                relevant[str(candidate["product_id"])] = 2 if brand and candidate["brand"] == brand else 1
+        judgments.append({"query": query, "relevant": relevant})
+    return judgments
+
+
+def recall_at_k(ranking: Sequence[str], relevant: Dict[str, float], k: int) -> float:
+    if not relevant:
+        return 0.0
+    hits = sum(1 for product_id in ranking[:k] if product_id in relevant)
+    return hits / min(len(relevant), k)
+
+
+def ndcg_at_k(ranking: Sequence[str], relevant: Dict[str, float], k: int) -> float:
+    dcg = sum(relevant.get(product_id, 0) / math.log2(position + 2) for position, product_id in enumerate(ranking[:k]))
+    ideal = sorted(relevant.values(), reverse=True)[:k]
+    idcg = sum(gain / math.log2(position + 2) for position, gain in enumerate(ideal))
+    return dcg / idcg if idcg > 0 else 0.0
+
+
+def reciprocal_rank(ranking: Sequence[str], relevant: Dict[str, float]) -> float:
+    for position, product_id in enumerate(ranking):
+        if product_id in relevant:
+            return 1.0 / (position + 1)
+    return 0.0
+
+
+def final_ranking(original_results: List[Any], final_results: List[Any]) -> List[str]:
+    """Reranked head followed by the untouched retrieval tail, as product ids"""
+    ranking = [str(doc.product_id) for doc in final_results]
+    seen = set(ranking)
+    ranking.extend(str(doc.product_id) for doc in original_results if str(doc.product_id) not in seen)
+    return ranking
+
+
+def evaluate_config(judgments: List[Dict[str, Any]], pipeline: str, prefetch_limit: Optional[int],
+                    limit: int, rerank_limit: int, k: int) -> Dict[str, Any]:
+    """Run every judged query through one configuration and average the metrics"""
+    from app.services.search_service import search_and_rerank
+
+    recalls, ndcgs, reciprocal_ranks, latencies = [], [], [], []
+    for judgment in judgments:
+        started = time.perf_counter()
+        original_results, final_results, _ = search_and_rerank(
+            judgment["query"], limit, rerank_limit, pipeline,
+            do_rerank=rerank_limit > 0, prefetch_limit=prefetch_limit,
+        )
+        latencies.append((time.perf_counter() - started) * 1000)
+        ranking = final_ranking(original_results, final_results)
+        recalls.append(recall_at_k(ranking, judgment["relevant"], k))
+        ndcgs.append(ndcg_at_k(ranking, judgment["relevant"], k))
+        reciprocal_ranks.append(reciprocal_rank(ranking, judgment["relevant"]))
+
+    latency = summarize(latencies)
+    count = len(judgments)
+    return {
+        "pipeline": pipeline,
+        "prefetch_limit": prefetch_limit,
+        "limit": limit,
+        "rerank_limit": rerank_limit,
+        # Rounded so that configurations with equal quality tie on the frontier
+        f"recall@{k}": round(sum(recalls) / count, 4),
+        f"ndcg@{k}": round(sum(ndcgs) / count, 4),
+        "mrr": round(sum(reciprocal_ranks) / count, 4),
+        "p50_ms": latency["p50"],
+        "p95_ms": latency["p95"],
+    }
+
+
+def pareto_frontier(rows: List[Dict[str, Any]], quality_key: str, latency_key: str = "p95_ms") -> List[Dict[str, Any]]:
+    """Configurations that no other configuration beats on both quality and latency"""
+    frontier = []
+    for row in sorted(rows, key=lambda row: (row[latency_key], -row[quality_key])):
+        if not frontier or row[quality_key] > frontier[-1][quality_key]:
+            frontier.append(row)
+    return frontier
+
+
+def recommend(frontier: List[Dict[str, Any]], quality_key: str, latency_budget_ms: Optional[float],
+              tolerance: float = 0.005) -> Optional[Dict[str, Any]]:
+    """
+    Fastest frontier point within the latency budget whose quality is within tolerance of the
+    best point under that budget, so a negligible quality gain does not buy a large latency cost.
+    """
+    candidates = [row for row in frontier if latency_budget_ms is None or row["p95_ms"] <= latency_budget_ms]
+    if not candidates:
+        return None
+    best_quality = max(row[quality_key] for row in candidates)
+    return min((row for row in candidates if row[quality_key] >= best_quality - tolerance), key=lambda row: row["p95_ms"])
+
+
+def settings_for(row: Dict[str, Any]) -> Dict[str, int]:
+    """Environment settings that reproduce a configuration's prefetch size"""
+    if row["prefetch_limit"] is None:
+        return {}
+    return {name: row["prefetch_limit"] for name in PREFETCH_SETTINGS.get(row["pipeline"], [])}
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("judgments", nargs="?", help="JSONL file with query -> relevant product_id judgments")
+    parser.add_argument("--synthetic", type=int, default=0, help="Generate this many judged queries from the synthetic catalog")
+    parser.add_argument("--pipelines", default="SEMANTIC,FUSION_RRF,BM25_TO_SEMANTIC,SEMANTIC_TO_BM25")
+    parser.add_argument("--prefetch", type=_int_list, default=[20, 30, 50, 80], help="Comma-separated prefetch sizes")
+    parser.add_argument("--limits", type=_int_list, default=[30, 50], help="Comma-separated retrieval limits")
+    parser.add_argument("--rerank", type=_int_list, default=[0, 10, 20], help="Comma-separated rerank depths (0 = no rerank)")
+    parser.add_argument("--k", type=int, default=10, help="Cut-off for recall@k and nDCG@k")
+    parser.add_argument("--metric", choices=["recall", "ndcg", "mrr"], default="ndcg", help="Quality axis of the frontier")
+    parser.add_argument("--latency-budget-ms", type=float, help="Recommend the best frontier point under this p95")
+    parser.add_argument("--tolerance", type=float, default=0.005, help="Quality difference treated as a tie when recommending")
+    parser.add_argument("--live", action="store_true", help="Use the configured OpenAI/Qdrant/cross-encoder instead of stand-ins")
+    add_standin_arguments(parser)
+    parser.add_argument("--output", help="Write the JSON report here")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.judgments and not args.synthetic:
+        sys.exit("Provide a judgments file or --synthetic N")
+    if args.live:
+        products = None
+    else:
+        products = install_from_args(args).products
+    # Every configuration repeats the same queries; measure uncached cross-encoder cost
+    rerank_cache.rerank_score_cache = None
+    if args.judgments:
+        judgments = load_judgments(args.judgments)
+    elif args.catalog or products is None:
+        sys.exit("--synthetic requires the generated catalog (drop --catalog/--live)")
+    else:
+        judgments = synthetic_judgments(products, args.synthetic, seed=args.seed)
+    if not judgments:
+        sys.exit("No usable judgments")
+
+    quality_key = {"recall": f"recall@{args.k}", "ndcg": f"ndcg@{args.k}", "mrr": "mrr"}[args.metric]
+    rows = []
+    for pipeline in args.pipelines.split(","):
+        # The single-stage semantic pipeline has no prefetch to tune
+        prefetch_values = [None] if pipeline == "SEMANTIC" else args.prefetch
+        for prefetch_limit, limit, rerank_limit in itertools.product(prefetch_values, args.limits, args.rerank):
+            if rerank_limit > limit:
+                continue
+            row = evaluate_config(judgments, pipeline, prefetch_limit, limit, rerank_limit, args.k)
+            rows.append(row)
+            print(f"{pipeline:<18} prefetch={str(prefetch_limit):<5} limit={limit:<4} rerank={rerank_limit:<4} "
+                  f"{quality_key}={row[quality_key]:.3f} mrr={row['mrr']:.3f} p95={row['p95_ms']:.1f}ms")
+
+    frontier = pareto_frontier(rows, quality_key)
+    print(f"\nPareto frontier ({quality_key} vs. p95):")
+    for row in frontier:
+        print(f"  {row['pipeline']:<18} prefetch={str(row['prefetch_limit']):<5} limit={row['limit']:<4} "
+              f"rerank={row['rerank_limit']:<4} {quality_key}={row[quality_key]:.3f} p95={row['p95_ms']:.1f}ms")
+
+    best = recommend(frontier, quality_key, args.latency_budget_ms, args.tolerance)
+    if best:
+        print("\nRecommended configuration:")
+        for name, value in settings_for(best).items():
+            print(f"  {name}={value}")
+        print(f"  pipeline={best['pipeline']} limit={best['limit']} rerank_limit={best['rerank_limit']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump({"judged_queries": len(judgments), "metric": quality_key, "results": rows,
+                       "frontier": frontier, "recommended": best}, output_file, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Recall gain against retrieval latency of multi-query retrieval.
+
+Every judged query (see app.benchmarks.evaluate for the format) is retrieved three ways:
+"single" searches the query alone; "batched" adds its query variants through
+search_and_rerank(variants=...), i.e. one embeddings call and one query_batch_points round trip;
+"sequential" runs one search per variant and fuses the lists the same way, which is what
+multi-query retrieval would cost without batching. Reports recall@k, nDCG@k and MRR next to
+the retrieval latency percentiles and Qdrant round trips per query.
+
+Variants come from the judgments' "variants" field when present, else from the multi-query
+expansion prompt: the stand-in's (the query minus its first or last word, and its last two
+words) or, with --live-expansion, the OpenAI API's. --qdrant-latency-ms adds a network round
+trip to every Qdrant call of the in-memory collection.
+
+    python -m app.benchmarks.multi_query judgments.jsonl --variants 3 --qdrant-latency-ms 5 --live-expansion
+    python -m app.benchmarks.multi_query --synthetic 100 --fake-reranker --qdrant-latency-ms 5
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Any, Dict, List
+
+from app.benchmarks.evaluate import final_ranking, load_judgments, ndcg_at_k, recall_at_k, reciprocal_rank, synthetic_judgments
+from app.benchmarks.sharding import DelayedQdrant
+from app.benchmarks.standins import FakeChatCompletions, add_standin_arguments, install_from_args
+from app.benchmarks.stats import format_summary, summarize
+from app.services import rerank_cache
+
+APPROACHES = ("single", "batched", "sequential")
+
+
+def expand_variants(query: str, live: bool) -> List[str]:
+    """Query variants of the multi-query expansion prompt, from the stand-in or the OpenAI API"""
+    from app.core.config import settings
+    from app.core.prompts import REWRITE_MULTI_CHAT_PROMPT, REWRITE_MULTI_PROMPT
+    from app.services.search_service import _extract_json_string_from_llm_output, _render_prompt, get_openai_completion
+
+    system_prompt, user_prompt = _render_prompt(REWRITE_MULTI_CHAT_PROMPT, REWRITE_MULTI_PROMPT,
+                                                question=query, variants=settings.MULTI_QUERY_VARIANTS)
+    if not live:
+        return FakeChatCompletions._expansion(user_prompt).get("query_variants", [])
+    cleaned = _extract_json_string_from_llm_output(
+        get_openai_completion(user_prompt, "OpenAI Query Expansion", temperature=0.0, system_prompt=system_prompt)
+    )
+    try:
+        variants = json.loads(cleaned).get("query_variants") if cleaned else None
+    except json.JSONDecodeError:
+        variants = None
+    return variants if isinstance(variants, list) else []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("judgments", nargs="?", help="JSONL file with query -> relevant product_id judgments")
+    parser.add_argument("--synthetic", type=int, default=0, help="Generate this many judged queries from the synthetic catalog")
+    parser.add_argument("--variants", type=int, default=3, help="Query variants per query (MULTI_QUERY_VARIANTS)")
+    parser.add_argument("--fusion", choices=["rrf", "score"], default="rrf")
+    parser.add_argument("--pipeline", default="FUSION_RRF")
+    parser.add_argument("--limit", type=int, default=30)
+    parser.add_argument("--rerank-limit", type=int, default=10, help="0 disables reranking")
+    parser.add_argument("--k", type=int, default=10, help="Cut-off for recall@k and nDCG@k")
+    parser.add_argument("--qdrant-latency-ms", type=float, default=0.0, help="Round trip added to every Qdrant call")
+    parser.add_argument("--live-expansion", action="store_true",
+                        help="Generate variants with the OpenAI API (needs OPENAI_API_KEY)")
+    add_standin_arguments(parser)
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args(argv)
+    if not args.judgments and not args.synthetic:
+        sys.exit("Provide a judgments file or --synthetic N")
+
+    standins = install_from_args(args)
+    # Every approach repeats the same queries; measure uncached cross-encoder cost
+    rerank_cache.rerank_score_cache = None
+    if args.judgments:
+        judgments = load_judgments(args.judgments)
+    elif args.catalog:
+        sys.exit("--synthetic requires the generated catalog (drop --catalog)")
+    else:
+        judgments = synthetic_judgments(standins.products, args.synthetic, seed=args.seed)
+    if not judgments:
+        sys.exit("No usable judgments")
+
+    from app.core.config import settings
+    from app.core.models import SearchPipeline
+    from app.services import search_service, sharding
+    from app.services.reranking import rerank
+
+    settings.MULTI_QUERY_VARIANTS = args.variants
+    settings.MULTI_QUERY_FUSION = args.fusion
+    if args.live_expansion:
+        from openai import OpenAI
+        search_service.client = OpenAI()
+    qdrant = DelayedQdrant(standins.qdrant, args.qdrant_latency_ms, {})
+    search_service.qdrant_client = qdrant
+    pipeline = SearchPipeline(args.pipeline)
+    do_rerank = args.rerank_limit > 0
+
+    def sequential(query: str, variants: List[str]):
+        lists = []
+        for text in [query] + search_service.query_variants(query, variants):
+            hits, _, _ = search_service.search_and_rerank(text, args.limit, 0, pipeline, do_rerank=False)
+            lists.append((settings.COLLECTION_NAME, hits))
+        fused = sharding.fuse(lists, args.limit, args.fusion)
+        final = fused
+        if do_rerank and fused:
+            final, _ = rerank(query, fused[:args.rerank_limit], standins.cross_encoder)
+        return fused, final
+
+    collected: Dict[str, Dict[str, List[float]]] = {
+        approach: {"latency": [], "round_trips": [], "recall": [], "ndcg": [], "mrr": []} for approach in APPROACHES
+    }
+    variant_counts = []
+    for judgment in judgments:
+        variants = judgment.get("variants")
+        if variants is None:
+            variants = expand_variants(judgment["query"], args.live_expansion)
+        variant_counts.append(len(search_service.query_variants(judgment["query"], variants)))
+        runs = {
+            "single": lambda: search_service.search_and_rerank(
+                judgment["query"], args.limit, args.rerank_limit, pipeline, do_rerank)[:2],
+            "batched": lambda: search_service.search_and_rerank(
+                judgment["query"], args.limit, args.rerank_limit, pipeline, do_rerank, variants=variants)[:2],
+            "sequential": lambda: sequential(judgment["query"], variants),
+        }
+        for approach, run in runs.items():
+            round_trips_before = qdrant.round_trips
+            started = time.perf_counter()
+            original_results, final_results = run()
+            data = collected[approach]
+            data["latency"].append((time.perf_counter() - started) * 1000)
+            data["round_trips"].append(qdrant.round_trips - round_trips_before)
+            ranking = final_ranking(original_results, final_results)
+            data["recall"].append(recall_at_k(ranking, judgment["relevant"], args.k))
+            data["ndcg"].append(ndcg_at_k(ranking, judgment["relevant"], args.k))
+            data["mrr"].append(reciprocal_rank(ranking, judgment["relevant"]))
+
+    report: Dict[str, Any] = {
+        "judged_queries": len(judgments),
+        "variants_per_query": sum(variant_counts) / len(variant_counts),
+    }
+    print(f"{len(judgments)} judged queries, {report['variants_per_query']:.1f} variants per query\n")
+    for approach, data in collected.items():
+        count = len(data["latency"])
+        report[approach] = {
+            "latency": summarize(data["latency"]),
+            "qdrant_round_trips_per_query": sum(data["round_trips"]) / count,
+            f"recall@{args.k}": round(sum(data["recall"]) / count, 4),
+            f"ndcg@{args.k}": round(sum(data["ndcg"]) / count, 4),
+            "mrr": round(sum(data["mrr"]) / count, 4),
+        }
+        row = report[approach]
+        print(format_summary(approach, row["latency"])
+              + f"  round trips={row['qdrant_round_trips_per_query']:.1f} recall@{args.k}={row[f'recall@{args.k}']:.3f}"
+              + f" ndcg@{args.k}={row[f'ndcg@{args.k}']:.3f} mrr={row['mrr']:.3f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Page-2 latency: cursor over the search snapshot vs. re-running the search with a larger limit.
+
+For every query in the log, page 1 is served by process_search_query; page 2 is then fetched
+once through fetch_search_page with the returned cursor and once the old way, by repeating
+the search with twice the limit and slicing. Reports latency percentiles and the upstream
+calls (LLM completions, query encoding, Qdrant searches) each approach makes per page.
+
+    python -m app.benchmarks.pagination queries.jsonl --latency-log mini_RAG.log --fake-reranker
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List, Tuple
+
+from app.benchmarks.replay import load_query_log
+from app.benchmarks.standins import add_standin_arguments, install_from_args
+from app.benchmarks.stats import format_summary, summarize
+
+UPSTREAM_STAGES = ("OpenAI", "Query encoding", "Qdrant search")
+
+
+def timed(coroutine) -> Tuple[Any, float, List[Tuple[str, float]]]:
+    from app.services.search_service import record_stage_timings
+
+    with record_stage_timings() as stages:
+        started = time.perf_counter()
+        result = asyncio.run(coroutine)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+    return result, elapsed_ms, list(stages)
+
+
+def upstream_calls(stages: List[Tuple[str, float]]) -> int:
+    return sum(1 for operation, _ in stages if operation.startswith(UPSTREAM_STAGES))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("query_log", help="JSONL file with one query object per line")
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--rerank-limit", type=int, default=10)
+    parser.add_argument("--pipeline", default="FUSION_RRF")
+    parser.add_argument("--no-rerank", dest="do_rerank", action="store_false")
+    add_standin_arguments(parser)
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args(argv)
+
+    entries = load_query_log(args.query_log)
+    install_from_args(args)
+
+    from app.core.config import settings
+    from app.core.models import SearchPipeline
+    from app.services import pagination
+    from app.services.search_service import fetch_search_page, process_search_query
+
+    if pagination.snapshot_store is None:
+        # Pagination is opt-in; the benchmark always measures it
+        pagination.snapshot_store = pagination.SnapshotStore(settings.PAGINATION_MAX_SNAPSHOTS,
+                                                             settings.PAGINATION_TTL_SECONDS)
+
+    pipeline = SearchPipeline(args.pipeline)
+    collected: Dict[str, Dict[str, List[float]]] = {
+        approach: {"latency": [], "upstream_calls": []} for approach in ("cursor", "re-query")
+    }
+    for entry in entries:
+        first_page, _, _ = timed(process_search_query(
+            entry["query"], limit=args.page_size, rerank_limit=args.rerank_limit,
+            pipeline=pipeline, do_rerank=args.do_rerank,
+        ))
+        if not first_page.get("next_cursor"):
+            continue
+        _, cursor_ms, cursor_stages = timed(fetch_search_page(first_page["next_cursor"], args.page_size))
+        _, requery_ms, requery_stages = timed(process_search_query(
+            entry["query"], limit=2 * args.page_size, rerank_limit=args.rerank_limit,
+            pipeline=pipeline, do_rerank=args.do_rerank,
+        ))
+        for approach, elapsed_ms, stages in (("cursor", cursor_ms, cursor_stages),
+                                             ("re-query", requery_ms, requery_stages)):
+            collected[approach]["latency"].append(elapsed_ms)
+            collected[approach]["upstream_calls"].append(upstream_calls(stages))
+
+    report: Dict[str, Any] = {}
+    for approach, data in collected.items():
+        calls = data["upstream_calls"]
+        report[approach] = {
+            "latency": summarize(data["latency"]),
+            "upstream_calls_per_page": sum(calls) / len(calls) if calls else 0.0,
+        }
+        print(format_summary(f"page 2 via {approach}", report[approach]["latency"])
+              + f"  upstream calls/page={report[approach]['upstream_calls_per_page']:.1f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Bytes moved from Qdrant per query: full payload vs. the search payload projection.
+
+For every query and pipeline the same query_points call is issued three times: with
+with_payload=True (previous behaviour), with the projection while page_content is still
+fetched (catalog not yet backfilled), and with the projection using only the precomputed
+prompt_snippet / rerank_text fields. Reports serialized payload bytes and latency per query.
+
+    python -m app.benchmarks.payload queries.jsonl --content-chars 4000
+    python -m app.benchmarks.payload queries.jsonl --qdrant-url http://localhost:6333 --embedding-dimensions 3072
+"""
+import argparse
+import json
+import time
+from collections import defaultdict
+from typing import Any, Dict, List
+
+import orjson
+
+from app.benchmarks.replay import load_query_log
+from app.benchmarks.standins import add_standin_arguments, install_from_args
+from app.benchmarks.stats import summarize
+
+VARIANTS = ("full payload", "projection + page_content", "projection, precomputed only")
+
+
+def payload_bytes(points) -> int:
+    return sum(len(orjson.dumps(point.payload or {})) for point in points)
+
+
+def measure_query(query: str, pipeline: str, limit: int) -> Dict[str, Dict[str, float]]:
+    from app.core.config import settings
+    from app.services import search_service
+    from app.services.catalog import search_payload_fields
+
+    query_vector = search_service.openai_embeddings.embed_query(query)
+    bm25_query = None if pipeline == "SEMANTIC" else next(search_service.bm25_embedding_model.query_embed(query))
+    results = {}
+    for variant in VARIANTS:
+        if variant == "full payload":
+            with_payload = True
+        else:
+            settings.USE_PRECOMPUTED_SNIPPETS = variant == "projection, precomputed only"
+            with_payload = search_payload_fields()
+        params = search_service.build_search_params(query_vector, bm25_query, pipeline, limit, with_payload=with_payload)
+        started = time.perf_counter()
+        response = search_service.qdrant_client.query_points(**params)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        results[variant] = {"bytes": payload_bytes(response.points), "ms": elapsed_ms}
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("query_log", help="JSONL file with one query object per line")
+    parser.add_argument("--pipelines", default="SEMANTIC,FUSION_RRF")
+    parser.add_argument("--limit", type=int, default=30)
+    add_standin_arguments(parser)
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args(argv)
+
+    entries = load_query_log(args.query_log)
+    install_from_args(args)
+
+    report: Dict[str, Any] = {}
+    for pipeline in args.pipelines.split(","):
+        collected: Dict[str, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(list))
+        for entry in entries:
+            for variant, result in measure_query(entry["query"], pipeline, args.limit).items():
+                collected[variant]["bytes"].append(result["bytes"])
+                collected[variant]["ms"].append(result["ms"])
+        report[pipeline] = {}
+        baseline_bytes = sum(collected[VARIANTS[0]]["bytes"]) / len(entries)
+        for variant in VARIANTS:
+            mean_bytes = sum(collected[variant]["bytes"]) / len(entries)
+            latency = summarize(collected[variant]["ms"])
+            report[pipeline][variant] = {"bytes_per_query": mean_bytes, "latency": latency}
+            print(f"{pipeline:<18} {variant:<30} {mean_bytes / 1024:9.1f} KiB/query "
+                  f"({mean_bytes / baseline_bytes:6.1%} of full) p50={latency['p50']:7.2f}ms p95={latency['p95']:7.2f}ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
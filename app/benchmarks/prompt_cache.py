@@ -0,0 +1,133 @@
+"""
+Time to first token and cost of the LLM calls with and without the cache-friendly prompt layout.
+
+For every query in the log, the expansion prompt and the product prompt (with the query's top
+retrieved products as context) are rendered in the legacy layout (PROMPT_CACHE_LAYOUT=false)
+and in the cache-friendly one, and sent as streaming completions. Reports TTFT and total
+latency percentiles, the share of prompt tokens served from the provider's prefix cache and
+the cost per query, per layout and stage.
+
+By default completions go to the stand-in client, which models prefix caching and prefill time
+(see app.benchmarks.standins); with --live they go to the OpenAI API (needs OPENAI_API_KEY).
+
+    python -m app.benchmarks.prompt_cache queries.jsonl --fake-reranker
+    python -m app.benchmarks.prompt_cache queries.jsonl --fake-reranker --live
+"""
+import argparse
+import json
+import time
+from typing import Any, Dict, List, Tuple
+
+from app.benchmarks.replay import load_query_log
+from app.benchmarks.standins import FakeOpenAI, add_standin_arguments, install_from_args
+from app.benchmarks.stats import format_summary, summarize
+
+STAGES = ("OpenAI Query Expansion", "OpenAI Product JSON Generation")
+
+
+def stream_completion(openai_client, model: str, system_prompt: str, user_prompt: str) -> Tuple[float, float, Any]:
+    """TTFT (ms), total latency (ms) and usage of one streamed completion"""
+    started = time.perf_counter()
+    ttft_ms = None
+    usage = None
+    for chunk in openai_client.chat.completions.create(
+        model=model,
+        messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}],
+        stream=True,
+        stream_options={"include_usage": True},
+    ):
+        if ttft_ms is None and chunk.choices and chunk.choices[0].delta.content:
+            ttft_ms = (time.perf_counter() - started) * 1000
+        if chunk.usage is not None:
+            usage = chunk.usage
+    total_ms = (time.perf_counter() - started) * 1000
+    return ttft_ms if ttft_ms is not None else total_ms, total_ms, usage
+
+
+def render_prompts(query: str, docs) -> Dict[str, Tuple[str, str]]:
+    from app.core.prompts import REWRITE_CHAT_PROMPT, REWRITE_PROMPT
+    from app.services.search_service import _build_product_prompt, _render_prompt
+
+    return {
+        "OpenAI Query Expansion": _render_prompt(REWRITE_CHAT_PROMPT, REWRITE_PROMPT, question=query),
+        "OpenAI Product JSON Generation": _build_product_prompt(query, docs, {}),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("query_log", help="JSONL file with one query object per line")
+    parser.add_argument("--context-docs", type=int, default=10, help="Retrieved products in the product prompt")
+    parser.add_argument("--pipeline", default="FUSION_RRF")
+    parser.add_argument("--model", help="Chat model (default: LLM_MODEL)")
+    parser.add_argument("--live", action="store_true", help="Send the prompts to the OpenAI API instead of the stand-in")
+    add_standin_arguments(parser)
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args(argv)
+
+    entries = load_query_log(args.query_log)
+    standins = install_from_args(args)
+
+    from app.core.config import settings
+    from app.services import usage
+    from app.services.search_service import search_and_rerank
+
+    model = args.model or settings.LLM_MODEL
+    # Retrieval is the same for both layouts, so the contexts are fetched once up front
+    contexts = []
+    for entry in entries:
+        original_results, _, _ = search_and_rerank(entry["query"], args.context_docs, args.context_docs,
+                                                   args.pipeline, do_rerank=False)
+        contexts.append((entry["query"], original_results[:args.context_docs]))
+
+    report: Dict[str, Any] = {}
+    for layout, cache_layout in (("legacy", False), ("cache-friendly", True)):
+        settings.PROMPT_CACHE_LAYOUT = cache_layout
+        if args.live:
+            from openai import OpenAI
+            openai_client = OpenAI()
+        else:
+            # A fresh stand-in per layout so one layout never reads the other's cached prefixes
+            openai_client = FakeOpenAI(standins.openai.chat.completions.latency)
+        collected: Dict[str, Dict[str, List[float]]] = {
+            stage: {"ttft": [], "total": [], "prompt_tokens": [], "cached_tokens": [], "cost_usd": []} for stage in STAGES
+        }
+        for query, docs in contexts:
+            for stage, (system_prompt, user_prompt) in render_prompts(query, docs).items():
+                ttft_ms, total_ms, call_usage = stream_completion(openai_client, model, system_prompt, user_prompt)
+                details = getattr(call_usage, "prompt_tokens_details", None)
+                prompt_tokens = call_usage.prompt_tokens if call_usage is not None else 0
+                cached_tokens = (getattr(details, "cached_tokens", None) or 0) if details is not None else 0
+                completion_tokens = call_usage.completion_tokens if call_usage is not None else 0
+                data = collected[stage]
+                data["ttft"].append(ttft_ms)
+                data["total"].append(total_ms)
+                data["prompt_tokens"].append(prompt_tokens)
+                data["cached_tokens"].append(cached_tokens)
+                data["cost_usd"].append(usage.token_cost(model, prompt_tokens, completion_tokens, cached_tokens) or 0.0)
+
+        report[layout] = {}
+        print(f"\n{layout} layout")
+        for stage, data in collected.items():
+            prompt_tokens = sum(data["prompt_tokens"])
+            report[layout][stage] = {
+                "ttft": summarize(data["ttft"]),
+                "total": summarize(data["total"]),
+                "prompt_tokens": prompt_tokens,
+                "cached_tokens": sum(data["cached_tokens"]),
+                "cached_ratio": sum(data["cached_tokens"]) / prompt_tokens if prompt_tokens else 0.0,
+                "cost_usd_per_query": sum(data["cost_usd"]) / len(data["cost_usd"]) if data["cost_usd"] else 0.0,
+            }
+            stage_report = report[layout][stage]
+            print(format_summary(f"{stage} TTFT", stage_report["ttft"]))
+            print(format_summary(f"{stage} total", stage_report["total"])
+                  + f"  cached={stage_report['cached_ratio']:.1%} cost/query=${stage_report['cost_usd_per_query']:.6f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
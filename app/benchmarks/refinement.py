@@ -0,0 +1,97 @@
+"""
+Follow-up latency: session refinement vs. a brand-new search with the refinement appended.
+
+For every query in the log and every --refinements entry, a search opens a session; the
+refinement is then applied once through refine_search and once the old way, as a fresh
+process_search_query of "<query> <refinement>". Reports latency percentiles and upstream calls
+(LLM completions, query encoding, Qdrant searches) per follow-up, and how many refinements
+were served from the stored candidates without going back to Qdrant.
+
+    python -m app.benchmarks.refinement queries.jsonl --fake-reranker
+    python -m app.benchmarks.refinement queries.jsonl --refinements "cheaper;in schwarz;unter 100 euro" --generate-products
+"""
+import argparse
+import json
+from typing import Any, Dict, List
+
+from app.benchmarks.pagination import timed, upstream_calls
+from app.benchmarks.replay import load_query_log
+from app.benchmarks.standins import add_standin_arguments, install_from_args
+from app.benchmarks.stats import format_summary, summarize
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("query_log", help="JSONL file with one query object per line")
+    parser.add_argument("--refinements", default="cheaper;in schwarz;von Logitech",
+                        help="Semicolon-separated follow-ups applied to every query")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--rerank-limit", type=int, default=10)
+    parser.add_argument("--pipeline", default="FUSION_RRF")
+    parser.add_argument("--no-rerank", dest="do_rerank", action="store_false")
+    parser.add_argument("--generate-products", action="store_true",
+                        help="Let refinements generate recommendations like the fresh search does")
+    add_standin_arguments(parser)
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args(argv)
+
+    entries = load_query_log(args.query_log)
+    install_from_args(args)
+
+    from app.core.config import settings
+    from app.core.models import SearchPipeline
+    from app.services import sessions
+    from app.services.search_service import process_search_query, refine_search
+
+    if sessions.session_store is None:
+        # Sessions are opt-in; the benchmark always measures them
+        sessions.session_store = sessions.SessionStore(settings.SESSION_MAX_SESSIONS, settings.SESSION_TTL_SECONDS)
+
+    pipeline = SearchPipeline(args.pipeline)
+    refinements = [refinement.strip() for refinement in args.refinements.split(";") if refinement.strip()]
+    collected: Dict[str, Dict[str, List[float]]] = {
+        approach: {"latency": [], "upstream_calls": []} for approach in ("session", "new search")
+    }
+    sources: Dict[str, int] = {"local": 0, "qdrant": 0}
+    for entry in entries:
+        for refinement in refinements:
+            first, _, _ = timed(process_search_query(
+                entry["query"], limit=args.limit, rerank_limit=args.rerank_limit,
+                pipeline=pipeline, do_rerank=args.do_rerank,
+            ))
+            if not first.get("session_id"):
+                continue
+            refined, session_ms, session_stages = timed(refine_search(
+                first["session_id"], refinement, limit=args.limit, generate_products=args.generate_products,
+            ))
+            _, search_ms, search_stages = timed(process_search_query(
+                f"{entry['query']} {refinement}", limit=args.limit, rerank_limit=args.rerank_limit,
+                pipeline=pipeline, do_rerank=args.do_rerank,
+            ))
+            sources[refined["source"]] += 1
+            for approach, elapsed_ms, stages in (("session", session_ms, session_stages),
+                                                 ("new search", search_ms, search_stages)):
+                collected[approach]["latency"].append(elapsed_ms)
+                collected[approach]["upstream_calls"].append(upstream_calls(stages))
+
+    report: Dict[str, Any] = {}
+    for approach, data in collected.items():
+        calls = data["upstream_calls"]
+        report[approach] = {
+            "latency": summarize(data["latency"]),
+            "upstream_calls_per_follow_up": sum(calls) / len(calls) if calls else 0.0,
+        }
+        print(format_summary(f"follow-up via {approach}", report[approach]["latency"])
+              + f"  upstream calls/follow-up={report[approach]['upstream_calls_per_follow_up']:.1f}")
+    total = sum(sources.values())
+    report["local_ratio"] = sources["local"] / total if total else 0.0
+    print(f"\nServed from session candidates: {sources['local']}/{total} ({report['local_ratio']:.0%})")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
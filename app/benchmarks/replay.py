@@ -0,0 +1,175 @@
+"""
+Replay a JSONL query log against process_search_query and report latency percentiles.
+
+Each log line is a JSON object with a "query" and optionally "limit", "rerank_limit",
+"pipeline" and "do_rerank"; lines without a query are skipped. Requests are issued
+open-loop at --rate requests/second (Poisson arrivals, 0 = as fast as --concurrency allows)
+and per-stage timings are collected from log_performance.
+
+    python -m app.benchmarks.replay queries.jsonl --concurrency 4 --rate 2 --output run.json
+    python -m app.benchmarks.replay queries.jsonl --output new.json --compare run.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from app.benchmarks.stats import diff_summaries, format_summary, summarize
+from app.benchmarks.standins import add_standin_arguments, install_from_args, iter_jsonl
+
+
+def load_query_log(path: str, repeat: int = 1) -> List[Dict[str, Any]]:
+    """Read replayable entries (those carrying a non-empty "query") from a JSONL log"""
+    entries = [entry for entry in iter_jsonl(path) if isinstance(entry.get("query"), str) and entry["query"].strip()]
+    return entries * repeat
+
+
+def _run_request(entry: Dict[str, Any], defaults: argparse.Namespace, scheduled_at: float) -> Dict[str, Any]:
+    from app.core.models import SearchPipeline
+    from app.services.search_service import process_search_query, record_stage_timings
+
+    pipeline = SearchPipeline(entry.get("pipeline", defaults.pipeline))
+    with record_stage_timings() as stages:
+        started = time.perf_counter()
+        error = None
+        try:
+            asyncio.run(process_search_query(
+                query=entry["query"],
+                limit=int(entry.get("limit", defaults.limit)),
+                rerank_limit=int(entry.get("rerank_limit", defaults.rerank_limit)),
+                pipeline=pipeline,
+                do_rerank=bool(entry.get("do_rerank", defaults.do_rerank)),
+            ))
+        except Exception as e:
+            error = str(e)
+        finished = time.perf_counter()
+    return {
+        "pipeline": pipeline.value,
+        "service_ms": (finished - started) * 1000,
+        "latency_ms": (finished - scheduled_at) * 1000,
+        "stages": list(stages),
+        "error": error,
+    }
+
+
+def replay(entries: List[Dict[str, Any]], args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """Issue every entry at its arrival time on a pool of --concurrency worker threads"""
+    rng = random.Random(args.seed)
+    futures = []
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        next_arrival = time.perf_counter()
+        for entry in entries:
+            if args.rate > 0:
+                delay = next_arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                scheduled_at = next_arrival
+                next_arrival += rng.expovariate(args.rate)
+            else:
+                scheduled_at = time.perf_counter()
+            futures.append(pool.submit(_run_request, entry, args, scheduled_at))
+        return [future.result() for future in futures]
+
+
+def build_report(samples: List[Dict[str, Any]], wall_seconds: float, args: argparse.Namespace) -> Dict[str, Any]:
+    """Aggregate request samples into overall, per-stage and per-pipeline summaries"""
+    stage_timings: Dict[str, List[float]] = defaultdict(list)
+    pipelines: Dict[str, Dict[str, Any]] = defaultdict(lambda: {"latency": [], "stages": defaultdict(list)})
+    for sample in samples:
+        per_pipeline = pipelines[sample["pipeline"]]
+        per_pipeline["latency"].append(sample["latency_ms"])
+        for operation, elapsed_ms in sample["stages"]:
+            stage_timings[operation].append(elapsed_ms)
+            per_pipeline["stages"][operation].append(elapsed_ms)
+
+    return {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "requests": len(samples),
+        "errors": sum(1 for sample in samples if sample["error"]),
+        "wall_seconds": wall_seconds,
+        "throughput_rps": len(samples) / wall_seconds if wall_seconds > 0 else 0.0,
+        "latency": summarize(sample["latency_ms"] for sample in samples),
+        "service_time": summarize(sample["service_ms"] for sample in samples),
+        "stages": {operation: summarize(values) for operation, values in sorted(stage_timings.items())},
+        "pipelines": {
+            name: {
+                "latency": summarize(data["latency"]),
+                "stages": {operation: summarize(values) for operation, values in sorted(data["stages"].items())},
+            }
+            for name, data in sorted(pipelines.items())
+        },
+    }
+
+
+def compare_reports(base: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    """Percentile deltas for the overall latency and every stage present in both reports"""
+    comparison = {"latency": diff_summaries(base["latency"], current["latency"]), "stages": {}}
+    for operation in sorted(set(base["stages"]) & set(current["stages"])):
+        comparison["stages"][operation] = diff_summaries(base["stages"][operation], current["stages"][operation])
+    comparison["throughput_rps"] = {"base": base["throughput_rps"], "current": current["throughput_rps"]}
+    return comparison
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"Requests: {report['requests']} (errors: {report['errors']}), "
+          f"throughput: {report['throughput_rps']:.2f} req/s over {report['wall_seconds']:.1f}s")
+    print(format_summary("end-to-end latency", report["latency"]))
+    for operation, summary in report["stages"].items():
+        print(format_summary(f"  {operation}", summary))
+    for name, data in report["pipelines"].items():
+        print(format_summary(f"[{name}]", data["latency"]))
+
+
+def print_comparison(comparison: Dict[str, Any]):
+    print("\nChange against baseline (p50 / p95 / p99):")
+    rows = [("end-to-end latency", comparison["latency"])] + list(comparison["stages"].items())
+    for name, diff in rows:
+        cells = " ".join(f"{key}={diff[key]['delta']:+9.2f}ms ({diff[key]['delta_pct']:+6.1f}%)" for key in ("p50", "p95", "p99"))
+        print(f"{name:<40} {cells}")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("query_log", help="JSONL file with one query object per line")
+    parser.add_argument("--concurrency", type=int, default=4, help="Worker threads issuing requests")
+    parser.add_argument("--rate", type=float, default=0.0, help="Arrival rate in requests/second (0 = closed loop)")
+    parser.add_argument("--repeat", type=int, default=1, help="Replay the log this many times")
+    parser.add_argument("--limit", type=int, default=30)
+    parser.add_argument("--rerank-limit", type=int, default=10)
+    parser.add_argument("--pipeline", default="FUSION_RRF", help="Default pipeline for entries without one")
+    parser.add_argument("--no-rerank", dest="do_rerank", action="store_false")
+    add_standin_arguments(parser)
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--compare", help="Baseline JSON report to diff against")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    entries = load_query_log(args.query_log, args.repeat)
+    if not entries:
+        sys.exit(f"No replayable entries with a 'query' field in {args.query_log}")
+    install_from_args(args)
+
+    started = time.perf_counter()
+    samples = replay(entries, args)
+    report = build_report(samples, time.perf_counter() - started, args)
+    print_report(report)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as base_file:
+            report["comparison"] = compare_reports(json.load(base_file), report)
+        print_comparison(report["comparison"])
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
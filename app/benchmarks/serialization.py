@@ -0,0 +1,100 @@
+"""
+Micro-benchmark of per-response hit handling: per-hit dicts + convert_numpy_types + json
+versus SearchHit objects + orjson, at several result-set sizes.
+
+Each iteration turns Qdrant ScoredPoints into hits, applies cross-encoder scores (a float32
+array, as returned by predict) to the top rerank_limit, and serializes a response containing
+the hits. Both paths emit the same fields (page_content is not part of a response hit); the
+bodies differ in size only by json's ", "/": " separators. Reports mean time and tracemalloc
+peak memory per response.
+
+    python -m app.benchmarks.serialization --limits 50,200
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+from qdrant_client import models
+
+from app.core.results import SearchHit, dumps_response
+from app.core.utils import convert_numpy_types
+from app.benchmarks.standins import synthetic_catalog
+
+
+def make_points(limit: int) -> List[models.ScoredPoint]:
+    return [
+        models.ScoredPoint(id=index, version=0, score=1.0 / (index + 1), payload=product)
+        for index, product in enumerate(synthetic_catalog(limit))
+    ]
+
+
+def dict_response(points: List[models.ScoredPoint], rerank_scores: np.ndarray) -> bytes:
+    """The previous code path, kept here as the baseline, with the fields SearchHit.to_dict emits"""
+    retrieved_docs = []
+    for hit in points:
+        payload = hit.payload
+        retrieved_docs.append({
+            'point_id': hit.id,
+            'product_id': payload.get('product_id'),
+            'score': hit.score,
+            'title': payload.get('title', 'No Title'),
+            'url': payload.get('url', 'No URL'),
+            'thumbnail': payload.get('thumbnail', payload.get('image', 'https://placeholder.com/150')),
+        })
+    original_results = retrieved_docs.copy()
+    top = retrieved_docs[:len(rerank_scores)]
+    final_results = []
+    for score, item in sorted(zip(rerank_scores, top), key=lambda x: x[0], reverse=True):
+        item['rerank_score'] = score
+        final_results.append(item)
+    response = {"original_query": "gaming maus", "results": final_results + original_results[len(top):]}
+    return json.dumps(convert_numpy_types(response)).encode("utf-8")
+
+
+def hit_response(points: List[models.ScoredPoint], rerank_scores: np.ndarray) -> bytes:
+    retrieved_docs = [SearchHit(hit.id, hit.score, hit.payload) for hit in points]
+    top = retrieved_docs[:len(rerank_scores)]
+    final_results = []
+    for score, item in sorted(zip(rerank_scores.tolist(), top), key=lambda x: x[0], reverse=True):
+        item.rerank_score = score
+        final_results.append(item)
+    response = {"original_query": "gaming maus", "results": final_results + retrieved_docs[len(top):]}
+    return dumps_response(response)
+
+
+def measure(build: Callable[[List[Any], np.ndarray], bytes], points: List[Any], rerank_scores: np.ndarray,
+            iterations: int) -> Dict[str, float]:
+    build(points, rerank_scores)  # warm-up
+    started = time.perf_counter()
+    for _ in range(iterations):
+        payload = build(points, rerank_scores)
+    elapsed_us = (time.perf_counter() - started) / iterations * 1e6
+
+    tracemalloc.start()
+    build(points, rerank_scores)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"time_us": elapsed_us, "bytes": len(payload), "peak_kib": peak / 1024}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limits", default="50,200", help="Comma-separated result-set sizes")
+    parser.add_argument("--rerank-limit", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    for limit in [int(value) for value in args.limits.split(",")]:
+        points = make_points(limit)
+        rerank_scores = np.random.default_rng(0).random(min(args.rerank_limit, limit), dtype=np.float32)
+        for name, build in (("dict + convert_numpy_types", dict_response), ("SearchHit + orjson", hit_response)):
+            result = measure(build, points, rerank_scores, args.iterations)
+            print(f"limit={limit:<4} {name:<28} {result['time_us']:9.1f}us/response "
+                  f"peak alloc={result['peak_kib']:8.1f}KiB size={result['bytes']}B")
+
+
+if __name__ == "__main__":
+    main()
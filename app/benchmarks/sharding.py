@@ -0,0 +1,166 @@
+"""
+Retrieval latency against shard count for the fan-out search.
+
+The catalog is seeded once as a single collection and, for every --shards count, split
+round-robin into that many in-memory collections. Each logged query is searched (no rerank)
+over the single collection and over every shard set; the report has the "Qdrant search" stage
+latency (fan-out and fusion) per shard count, the overlap of the fused top hits with the
+single-collection ones (hits tied with the last single-collection hit count as matches) and
+the share of shards dropped by --timeout-ms. --shard-latency-ms adds a network round trip to every shard
+call and --slow-shard-ms an extra delay to the last shard of each set. --concurrency replays the
+queries from that many threads at once, so shards dropped by one request compete with the next.
+
+    python -m app.benchmarks.sharding queries.jsonl --catalog-size 20000 --shards 2,4,8 --shard-latency-ms 5
+    python -m app.benchmarks.sharding queries.jsonl --shards 4 --slow-shard-ms 200 --timeout-ms 50
+    python -m app.benchmarks.sharding queries.jsonl --shards 4 --slow-shard-ms 400 --timeout-ms 150 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Set
+
+from app.benchmarks.replay import load_query_log
+from app.benchmarks.standins import add_standin_arguments, install_from_args, seed_collection
+from app.benchmarks.stats import format_summary, summarize
+
+
+class DelayedQdrant:
+    """
+    Delegates to a Qdrant client, sleeping before every query_points / query_batch_points round
+    trip to model network and slow shards; round_trips counts them.
+    """
+
+    def __init__(self, qdrant, latency_ms: float, slow_collections: Dict[str, float]):
+        self._qdrant = qdrant
+        self.latency_ms = latency_ms
+        self.slow_collections = slow_collections
+        self.round_trips = 0
+
+    def _delay_ms(self, collection_name: str) -> float:
+        self.round_trips += 1
+        return self.latency_ms + self.slow_collections.get(collection_name, 0.0)
+
+    def _delay(self, collection_name: str):
+        delay_ms = self._delay_ms(collection_name)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+
+    def query_points(self, collection_name: str, **kwargs):
+        self._delay(collection_name)
+        return self._qdrant.query_points(collection_name=collection_name, **kwargs)
+
+    def query_batch_points(self, collection_name: str, **kwargs):
+        self._delay(collection_name)
+        return self._qdrant.query_batch_points(collection_name=collection_name, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._qdrant, name)
+
+
+class AsyncDelayedQdrant(DelayedQdrant):
+    """
+    DelayedQdrant as the async client of the fan-out: the delays are awaited, so a shard cancelled
+    at its timeout stops waiting like an aborted request. The queries run on the wrapped client in
+    a worker thread, standing in for the server, so they do not block the fan-out loop.
+    """
+
+    async def query_points(self, collection_name: str, **kwargs):
+        await asyncio.sleep(self._delay_ms(collection_name) / 1000)
+        return await asyncio.to_thread(self._qdrant.query_points, collection_name=collection_name, **kwargs)
+
+    async def query_batch_points(self, collection_name: str, **kwargs):
+        await asyncio.sleep(self._delay_ms(collection_name) / 1000)
+        return await asyncio.to_thread(self._qdrant.query_batch_points, collection_name=collection_name, **kwargs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("query_log", help="JSONL file with one query object per line")
+    parser.add_argument("--shards", default="2,4,8", help="Comma-separated shard counts")
+    parser.add_argument("--limit", type=int, default=30)
+    parser.add_argument("--pipeline", default="FUSION_RRF")
+    parser.add_argument("--fusion", choices=["raw", "rrf", "score"], default="raw")
+    parser.add_argument("--shard-latency-ms", type=float, default=0.0, help="Round trip added to every shard call")
+    parser.add_argument("--slow-shard-ms", type=float, default=0.0, help="Extra delay of the last shard of each set")
+    parser.add_argument("--timeout-ms", type=float, default=0.0, help="Per-shard timeout (0: wait for all)")
+    parser.add_argument("--concurrency", type=int, default=1, help="Queries in flight at once")
+    add_standin_arguments(parser)
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args(argv)
+    if args.qdrant_url:
+        parser.error("the shard sets are seeded in memory; --qdrant-url is not supported")
+
+    entries = load_query_log(args.query_log)
+    standins = install_from_args(args)
+
+    from app.core.config import settings
+    from app.core.models import SearchPipeline
+    from app.services import search_service, sharding
+
+    shard_sets: Dict[int, List[str]] = {1: [settings.COLLECTION_NAME]}
+    slow_collections: Dict[str, float] = {}
+    for count in (int(value) for value in args.shards.split(",") if value.strip()):
+        if count <= 1:
+            continue
+        names = [f"{settings.COLLECTION_NAME}_{count}x{index}" for index in range(count)]
+        for index, name in enumerate(names):
+            seed_collection(standins.qdrant, name, standins.products[index::count], standins.embeddings,
+                            search_service.bm25_embedding_model)
+        shard_sets[count] = names
+        if args.slow_shard_ms:
+            slow_collections[names[-1]] = args.slow_shard_ms
+    search_service.qdrant_client = DelayedQdrant(standins.qdrant, args.shard_latency_ms, slow_collections)
+    search_service.async_qdrant_client = AsyncDelayedQdrant(standins.qdrant, args.shard_latency_ms, slow_collections)
+    settings.SHARD_FUSION = args.fusion
+    settings.SHARD_TIMEOUT_MS = args.timeout_ms
+
+    pipeline = SearchPipeline(args.pipeline)
+    # Single-collection top hits plus every hit tied with the last of them
+    baseline: Dict[str, Set[Any]] = {}
+    for entry in entries:
+        reference, _, _ = search_service.search_and_rerank(entry["query"], 4 * args.limit, 0, pipeline, do_rerank=False,
+                                                           collections=shard_sets[1])
+        if reference:
+            cutoff = reference[min(args.limit, len(reference)) - 1].score
+            baseline[entry["query"]] = {hit.product_id for hit in reference if hit.score >= cutoff}
+
+    report: Dict[str, Any] = {}
+    for count, names in shard_sets.items():
+        latencies, overlaps = [], []
+        timeouts_before = sum(counts["timeouts"] for counts in sharding.shard_metrics.stats()["by_collection"].values())
+
+        def run(entry):
+            with search_service.record_stage_timings() as stages:
+                original_results, _, _ = search_service.search_and_rerank(
+                    entry["query"], args.limit, 0, pipeline, do_rerank=False, collections=names,
+                )
+            return original_results, stages
+
+        with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+            runs = list(pool.map(run, entries))
+        for entry, (original_results, stages) in zip(entries, runs):
+            latencies.extend(elapsed_ms for operation, elapsed_ms in stages if operation == "Qdrant search")
+            product_ids = {hit.product_id for hit in original_results[:args.limit]}
+            if baseline.get(entry["query"]):
+                overlaps.append(len(product_ids & baseline[entry["query"]]) / min(args.limit, len(product_ids) or 1))
+        timeouts = sum(counts["timeouts"] for counts in sharding.shard_metrics.stats()["by_collection"].values()) - timeouts_before
+
+        report[str(count)] = {
+            "latency": summarize(latencies),
+            "overlap_with_single": sum(overlaps) / len(overlaps) if overlaps else 1.0,
+            "dropped_shard_ratio": timeouts / (len(entries) * count) if entries and count > 1 else 0.0,
+        }
+        print(format_summary(f"{count} shard(s)", report[str(count)]["latency"])
+              + f"  overlap@{args.limit}={report[str(count)]['overlap_with_single']:.2f}"
+              + f" dropped={report[str(count)]['dropped_shard_ratio']:.1%}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+"""
+Local stand-ins for the external backends used by the search service.
+
+The benchmark harnesses swap these into app.services.search_service so a query log can be
+replayed without OpenAI access or a running Qdrant: chat completions replay recorded latencies,
+embeddings are deterministic hashed bag-of-words vectors, and the catalog lives in an
+in-memory Qdrant collection with the same named vectors as production.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import time
+import zlib
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from qdrant_client import QdrantClient, models
+
+from app.services.catalog import derive_payload_fields
+
+DENSE_VECTOR_NAME = "openai_text_embedding_large_v3"
+SPARSE_VECTOR_NAME = "bm25"
+
+# Default latencies (ms) used when no performance log is given
+DEFAULT_LATENCIES_MS = {
+    "OpenAI Query Expansion": 1800.0,
+    "OpenAI Product JSON Generation": 3500.0,
+    "Embedding": 150.0,
+}
+
+# Time-to-first-token model of the stand-in: a fixed overhead plus prefill of the uncached prompt tokens
+BASE_TTFT_MS = 200.0
+PREFILL_MS_PER_1K_TOKENS = 60.0
+
+_PERFORMANCE_LINE = re.compile(r"PERFORMANCE: (?P<operation>.+?) for '.*' took (?P<ms>[0-9.]+)ms")
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+class LatencyModel:
+    """Samples per-operation latencies, either recorded from mini_RAG.log or fixed defaults"""
+
+    def __init__(self, recorded: Optional[Dict[str, List[float]]] = None, scale: float = 1.0, seed: int = 0):
+        self.recorded = recorded or {}
+        self.scale = scale
+        self._random = random.Random(seed)
+
+    @classmethod
+    def from_log(cls, path: str, scale: float = 1.0, seed: int = 0) -> "LatencyModel":
+        """Collect every 'PERFORMANCE: <operation> ... took <ms>ms' line of a log file"""
+        recorded: Dict[str, List[float]] = {}
+        with open(path, encoding="utf-8", errors="replace") as log_file:
+            for line in log_file:
+                match = _PERFORMANCE_LINE.search(line)
+                if match and "Error" not in line:
+                    recorded.setdefault(match.group("operation"), []).append(float(match.group("ms")))
+        return cls(recorded, scale=scale, seed=seed)
+
+    def sample_ms(self, operation: str) -> float:
+        samples = self.recorded.get(operation)
+        if samples:
+            value = self._random.choice(samples)
+        else:
+            value = DEFAULT_LATENCIES_MS.get(operation, 0.0)
+        return value * self.scale
+
+    def sleep(self, operation: str):
+        delay_ms = self.sample_ms(operation)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN.findall((text or "").lower())
+
+
+def _estimate_tokens(text: str) -> int:
+    # Roughly four characters per token for the tokenizer-free stand-ins
+    return max(1, len(text) // 4)
+
+
+class PromptPrefixCache:
+    """
+    Provider-side prompt caching as OpenAI documents it: prompts of at least 1024 tokens are
+    cached in 128-token increments, and a later prompt reuses the longest cached prefix.
+    """
+
+    MIN_TOKENS = 1024
+    INCREMENT = 128
+
+    def __init__(self):
+        self._prefixes = set()
+
+    def cached_tokens(self, prompt: str) -> int:
+        """Tokens of the prompt served from cache; the prompt's own prefixes are cached afterwards"""
+        chars_per_increment = self.INCREMENT * 4
+        increments = _estimate_tokens(prompt) // self.INCREMENT
+        first = self.MIN_TOKENS // self.INCREMENT
+        cached = 0
+        for index in range(first, increments + 1):
+            if prompt[:index * chars_per_increment] not in self._prefixes:
+                break
+            cached = index * self.INCREMENT
+        for index in range(first, increments + 1):
+            self._prefixes.add(prompt[:index * chars_per_increment])
+        return cached
+
+
+class FakeChatCompletions:
+    """
+    Mimics client.chat.completions.create for the rewrite and product prompts, with prefix
+    caching and, for stream=True, a first chunk delayed by the modelled time to first token.
+    Recorded latencies are taken as uncached; cached prompt tokens skip their prefill time.
+    """
+
+    def __init__(self, latency: LatencyModel):
+        self.latency = latency
+        self.calls = 0
+        self.prefix_cache = PromptPrefixCache()
+
+    def create(self, model: str, messages: List[Dict[str, str]], stream: bool = False, **kwargs) -> Any:
+        self.calls += 1
+        prompt = "\n".join(message.get("content", "") for message in messages)
+        # The variable parts are in the last (user) message; the system message may hold examples
+        user_prompt = messages[-1].get("content", "") if messages else ""
+        if "### CONTEXT: PRODUCT DATA ###" in user_prompt:
+            operation = "OpenAI Product JSON Generation"
+            content = json.dumps(self._product_list(user_prompt))
+        else:
+            operation = "OpenAI Query Expansion"
+            content = json.dumps(self._expansion(user_prompt))
+        prompt_tokens = _estimate_tokens(prompt)
+        cached_tokens = self.prefix_cache.cached_tokens(prompt)
+        saved_ms = cached_tokens / 1000 * PREFILL_MS_PER_1K_TOKENS * self.latency.scale
+        ttft_ms = (BASE_TTFT_MS + (prompt_tokens - cached_tokens) / 1000 * PREFILL_MS_PER_1K_TOKENS) * self.latency.scale
+        total_ms = max(self.latency.sample_ms(operation) - saved_ms, ttft_ms)
+        usage = SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=_estimate_tokens(content),
+            total_tokens=prompt_tokens + _estimate_tokens(content),
+            prompt_tokens_details=SimpleNamespace(cached_tokens=cached_tokens),
+        )
+        if stream:
+            return self._stream(model, content, usage, ttft_ms, total_ms)
+        time.sleep(total_ms / 1000)
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=usage,
+        )
+
+    @staticmethod
+    def _stream(model: str, content: str, usage: Any, ttft_ms: float, total_ms: float):
+        """Two content chunks and a final usage chunk, as with stream_options={"include_usage": True}"""
+        time.sleep(ttft_ms / 1000)
+        middle = len(content) // 2
+        yield SimpleNamespace(model=model, choices=[SimpleNamespace(delta=SimpleNamespace(content=content[:middle]))], usage=None)
+        time.sleep(max(total_ms - ttft_ms, 0.0) / 1000)
+        yield SimpleNamespace(model=model, choices=[SimpleNamespace(delta=SimpleNamespace(content=content[middle:]))], usage=None)
+        yield SimpleNamespace(model=model, choices=[], usage=usage)
+
+    @staticmethod
+    def _expansion(prompt: str) -> Dict[str, Any]:
+        match = re.search(r'User\'s Original Query: "(.*)"', prompt)
+        question = match.group(1) if match else prompt[-200:]
+        expansion = {
+            "improved_query": question,
+            "slots": {
+                "category": None,
+                "brand": None,
+                "attributes": {},
+                "price_indication": None,
+                "intended_use_or_problem": None,
+                "other_keywords": [],
+            },
+        }
+        requested = re.search(r"Number of query variants: (\d+)", prompt)
+        if requested:
+            # No reasoning here: variants are the query without its first word, without its last
+            # word, and its last two words
+            words = question.split()
+            candidates = [" ".join(words[1:]), " ".join(words[:-1]), " ".join(words[-2:])]
+            expansion["query_variants"] = [variant for variant in candidates if variant][:int(requested.group(1))]
+        return expansion
+
+    @staticmethod
+    def _product_list(prompt: str) -> Dict[str, Any]:
+        context = prompt.split("### CONTEXT: PRODUCT DATA ###", 1)[1]
+        products = []
+        for block in re.split(r"\n(?=PRODUCT \d+:)", context):
+            fields = dict(re.findall(r"^([A-Z_]+): (.*)$", block, flags=re.MULTILINE))
+            if "PRODUCT_ID" not in fields:
+                continue
+            products.append({
+                "id": fields.get("ID", ""),
+                "product_id": fields.get("PRODUCT_ID", ""),
+                "name": fields.get("NAME", ""),
+                "product_url": fields.get("URL", ""),
+                "thumbnail_url": fields.get("THUMBNAIL", ""),
+                "description": fields.get("CONTENT", "")[:120],
+            })
+            if len(products) == 3:
+                break
+        return {"response_type": "PRODUCT_LIST", "message_text": "Recorded stand-in response.", "products": products}
+
+
+class FakeOpenAI:
+    """Drop-in for openai.OpenAI() exposing only chat.completions"""
+
+    def __init__(self, latency: Optional[LatencyModel] = None):
+        self.chat = SimpleNamespace(completions=FakeChatCompletions(latency or LatencyModel()))
+
+
+class HashingEmbeddings:
+    """Deterministic bag-of-words embeddings with the OpenAIEmbeddings embed_query/embed_documents API"""
+
+    def __init__(self, dimensions: int = 256, latency: Optional[LatencyModel] = None):
+        self.dimensions = dimensions
+        self.latency = latency
+        self.calls = 0
+
+    def encode(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for token in _tokens(text):
+            bucket = zlib.crc32(token.encode("utf-8"))
+            vector[bucket % self.dimensions] += 1.0 if (bucket >> 16) & 1 else -1.0
+        norm = float(np.linalg.norm(vector))
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        if self.latency:
+            self.latency.sleep("Embedding")
+        return self.encode(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.latency:
+            self.latency.sleep("Embedding")
+        return [self.encode(text) for text in texts]
+
+
+class TokenOverlapCrossEncoder:
+    """Cheap stand-in for the ELECTRA cross-encoder: query-token overlap plus a fixed per-pair cost"""
+
+    def __init__(self, per_pair_ms: float = 4.0):
+        self.per_pair_ms = per_pair_ms
+        self.calls = 0
+        self.pairs = 0
+
+    def predict(self, sentence_pairs, **kwargs) -> np.ndarray:
+        self.calls += 1
+        self.pairs += len(sentence_pairs)
+        if self.per_pair_ms > 0:
+            time.sleep(self.per_pair_ms * len(sentence_pairs) / 1000)
+        scores = []
+        for query, document in sentence_pairs:
+            query_tokens = set(_tokens(query))
+            document_tokens = set(_tokens(document))
+            overlap = len(query_tokens & document_tokens) / (len(query_tokens) or 1)
+            scores.append(1 / (1 + math.exp(-6 * (overlap - 0.5))))
+        return np.asarray(scores, dtype=np.float32)
+
+
+_BRANDS = ["Logitech", "Samsung", "ADATA", "Kingston", "Lenovo", "Poly", "Corsair", "Razer", "IIYAMA", "LC-Power"]
+_CATEGORIES = {
+    "Gaming Maus": ["12000 dpi", "16000 dpi", "kabellos", "RGB", "optischer Sensor"],
+    "SSD": ["1TB", "2TB", "NVMe Gen4", "SATA", "M.2"],
+    "Monitor": ["27 Zoll", "34 Zoll", "curved", "144Hz", "1ms"],
+    "Headset": ["Noise Cancelling", "USB", "Bluetooth", "Teams zertifiziert", "kabelgebunden"],
+    "Arbeitsspeicher": ["16GB", "32GB", "DDR4", "DDR5", "3200 MHz"],
+    "Powerbank": ["20000 mAh", "USB-C", "Schnellladen", "65W", "kompakt"],
+}
+
+_COLORS = ["schwarz", "weiss", "grau", "silber", "rot", "blau"]
+_PRICE_RANGES = {
+    "Gaming Maus": (19.0, 149.0), "SSD": (39.0, 299.0), "Monitor": (129.0, 899.0),
+    "Headset": (29.0, 349.0), "Arbeitsspeicher": (29.0, 249.0), "Powerbank": (15.0, 99.0),
+}
+
+
+def synthetic_catalog(size: int, seed: int = 0, content_chars: int = 0) -> List[Dict[str, Any]]:
+    """
+    Generate a German-flavoured electronics catalog with the production payload fields.
+    content_chars pads page_content to roughly that length to mimic full product descriptions.
+    """
+    rng = random.Random(seed)
+    # Facets come from their own generator so titles and content stay those of earlier runs
+    facet_rng = random.Random(seed + 1)
+    categories = list(_CATEGORIES)
+    catalog = []
+    for index in range(size):
+        category = rng.choice(categories)
+        brand = rng.choice(_BRANDS)
+        attributes = rng.sample(_CATEGORIES[category], 3)
+        product_id = str(400000 + index)
+        title = f"{brand} {category} {' '.join(attributes[:2])}"
+        page_content = (f"{title}. Kategorie: {category}. Marke: {brand}. "
+                        f"Eigenschaften: {', '.join(attributes)}. " * 3).strip()
+        if content_chars > len(page_content):
+            filler = f" Technische Daten: {', '.join(_CATEGORIES[category])}. Lieferumfang: {category}, Handbuch."
+            page_content += filler * ((content_chars - len(page_content)) // len(filler) + 1)
+        catalog.append({
+            "product_id": product_id,
+            "title": title,
+            "category": category,
+            "brand": brand,
+            "color": facet_rng.choice(_COLORS),
+            "price": round(facet_rng.uniform(*_PRICE_RANGES[category]), 2),
+            "url": f"https://shop.api.de/product/details/{product_id}",
+            "page_content": page_content,
+            "thumbnail": f"https://shop.api.de/images/{product_id}.jpg",
+        })
+    return catalog
+
+
+def load_catalog(path: str) -> List[Dict[str, Any]]:
+    """Read a JSONL catalog with one product payload per line"""
+    with open(path, encoding="utf-8") as catalog_file:
+        return [json.loads(line) for line in catalog_file if line.strip()]
+
+
+def seed_collection(qdrant: QdrantClient, collection_name: str, products: List[Dict[str, Any]],
+                    embeddings: HashingEmbeddings, bm25_model, batch_size: int = 256):
+    """Create a collection with the production vector names and upsert the catalog (with derived fields)"""
+    if qdrant.collection_exists(collection_name):
+        qdrant.delete_collection(collection_name)
+    qdrant.create_collection(
+        collection_name,
+        vectors_config={
+            DENSE_VECTOR_NAME: models.VectorParams(size=embeddings.dimensions, distance=models.Distance.COSINE),
+        },
+        sparse_vectors_config={
+            SPARSE_VECTOR_NAME: models.SparseVectorParams(modifier=models.Modifier.IDF),
+        },
+    )
+    for start in range(0, len(products), batch_size):
+        batch = products[start:start + batch_size]
+        texts = [product.get("page_content") or product.get("title", "") for product in batch]
+        dense = [embeddings.encode(text) for text in texts]
+        sparse = list(bm25_model.embed(texts))
+        qdrant.upsert(collection_name, points=[
+            models.PointStruct(
+                id=start + offset,
+                vector={
+                    DENSE_VECTOR_NAME: dense[offset],
+                    SPARSE_VECTOR_NAME: models.SparseVector(**sparse[offset].as_object()),
+                },
+                payload={**product, **derive_payload_fields(product)},
+            )
+            for offset, product in enumerate(batch)
+        ])
+
+
+def iter_jsonl(path: str) -> Iterable[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as jsonl_file:
+        for line in jsonl_file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def install_standins(products: Optional[List[Dict[str, Any]]] = None, latency: Optional[LatencyModel] = None,
+                     qdrant_url: Optional[str] = None, fake_reranker: bool = False,
+                     embedding_dimensions: int = 256) -> SimpleNamespace:
+    """
+    Point app.services.search_service at local stand-ins and return them.
+    With qdrant_url the existing collection is queried as-is; otherwise the catalog is
+    seeded into an in-memory Qdrant. The real cross-encoder is loaded unless fake_reranker is set.
+    """
+    from app.core.config import settings
+    from app.services import search_service
+
+    latency = latency or LatencyModel()
+    embeddings = HashingEmbeddings(dimensions=embedding_dimensions, latency=latency)
+    if qdrant_url:
+        qdrant = QdrantClient(url=qdrant_url)
+    else:
+        qdrant = QdrantClient(":memory:")
+        seed_collection(qdrant, settings.COLLECTION_NAME, products or synthetic_catalog(2000),
+                        embeddings, search_service.bm25_embedding_model)
+    reranker = TokenOverlapCrossEncoder() if fake_reranker else search_service.load_cross_encoder()
+    openai_client = FakeOpenAI(latency)
+
+    search_service.client = openai_client
+    search_service.qdrant_client = qdrant
+    search_service.openai_embeddings = embeddings
+    search_service.cross_encoder = reranker
+    return SimpleNamespace(openai=openai_client, qdrant=qdrant, embeddings=embeddings, cross_encoder=reranker)
+
+
+def add_standin_arguments(parser: argparse.ArgumentParser):
+    """Register the backend stand-in options shared by the benchmark CLIs"""
+    group = parser.add_argument_group("backends")
+    group.add_argument("--catalog", help="JSONL catalog to seed the in-memory Qdrant (default: synthetic)")
+    group.add_argument("--catalog-size", type=int, default=2000, help="Size of the synthetic catalog")
+    group.add_argument("--content-chars", type=int, default=0, help="Pad synthetic page_content to this length")
+    group.add_argument("--qdrant-url", help="Query an existing Qdrant instead of an in-memory collection")
+    group.add_argument("--embedding-dimensions", type=int, default=256,
+                       help="Stand-in embedding size (must match the collection when --qdrant-url is used)")
+    group.add_argument("--latency-log", help="mini_RAG.log to sample recorded OpenAI latencies from")
+    group.add_argument("--latency-scale", type=float, default=1.0, help="Multiply recorded/default latencies")
+    group.add_argument("--fake-reranker", action="store_true", help="Use a token-overlap stand-in for the cross-encoder")
+    group.add_argument("--seed", type=int, default=0)
+
+
+def install_from_args(args: argparse.Namespace) -> SimpleNamespace:
+    """Build the catalog and latency model from parsed CLI options and install the stand-ins"""
+    # The stand-ins replace the OpenAI client, but the service module still constructs one on import
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark-standin")
+    if args.latency_log:
+        latency = LatencyModel.from_log(args.latency_log, scale=args.latency_scale, seed=args.seed)
+    else:
+        latency = LatencyModel(scale=args.latency_scale, seed=args.seed)
+    if args.catalog:
+        products = load_catalog(args.catalog)
+    else:
+        products = synthetic_catalog(args.catalog_size, seed=args.seed, content_chars=args.content_chars)
+    standins = install_standins(products, latency, qdrant_url=args.qdrant_url, fake_reranker=args.fake_reranker,
+                                embedding_dimensions=args.embedding_dimensions)
+    standins.products = products
+    return standins
@@ -0,0 +1,51 @@
+import math
+from typing import Any, Dict, Iterable, List
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Linear-interpolated percentile (pct in 0..100) of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    lower = math.floor(rank)
+    upper = math.ceil(rank)
+    if lower == upper:
+        return ordered[int(rank)]
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarize(values: Iterable[float]) -> Dict[str, float]:
+    """Count, mean, p50/p95/p99 and max of a series of millisecond timings"""
+    values = list(values)
+    if not values:
+        return {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values),
+    }
+
+
+def format_summary(name: str, summary: Dict[str, Any]) -> str:
+    """One aligned line per summary, used by the benchmark CLIs"""
+    return (f"{name:<40} n={summary['count']:<6} mean={summary['mean']:9.2f}ms "
+            f"p50={summary['p50']:9.2f}ms p95={summary['p95']:9.2f}ms p99={summary['p99']:9.2f}ms")
+
+
+def diff_summaries(base: Dict[str, Any], current: Dict[str, Any], keys=("p50", "p95", "p99")) -> Dict[str, Dict[str, float]]:
+    """Absolute and relative change of the given percentiles between two summaries"""
+    diff = {}
+    for key in keys:
+        before = base.get(key, 0.0)
+        after = current.get(key, 0.0)
+        diff[key] = {
+            "base": before,
+            "current": after,
+            "delta": after - before,
+            "delta_pct": ((after - before) / before * 100.0) if before else 0.0,
+        }
+    return diff
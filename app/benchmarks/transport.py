@@ -0,0 +1,131 @@
+"""
+Qdrant REST vs. gRPC: latency and client CPU per query at our payload sizes.
+
+Runs the pipeline query of every logged query against a running Qdrant once per transport and
+limit, with the search payload projection (or --full-payload), through a client built by
+app.services.qdrant_transport. Reports latency percentiles and client process CPU time per
+query (request encoding, response decoding and the gRPC I/O threads); --concurrency threads
+share one client, so pool sizes and keep-alive are exercised as in the API. The rest-async and
+grpc-async transports use the async client of the shard fan-out instead, with --concurrency
+queries in flight on one event loop.
+
+    python -m app.benchmarks.transport queries.jsonl --qdrant-url http://localhost:6333 --limits 10,50,200
+    python -m app.benchmarks.transport queries.jsonl --transports rest,rest-async --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from app.benchmarks.replay import load_query_log
+from app.benchmarks.standins import DENSE_VECTOR_NAME, HashingEmbeddings
+from app.benchmarks.stats import format_summary, summarize
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("query_log", help="JSONL file with one query object per line")
+    parser.add_argument("--qdrant-url", help="Qdrant REST URL (default: QDRANT_URL); gRPC uses QDRANT_GRPC_PORT")
+    parser.add_argument("--collection", help="Collection to query (default: COLLECTION_NAME)")
+    parser.add_argument("--limits", default="10,50,200")
+    parser.add_argument("--transports", default="rest,grpc", help="Comma-separated: rest, grpc, rest-async, grpc-async")
+    parser.add_argument("--pipeline", default="FUSION_RRF")
+    parser.add_argument("--full-payload", action="store_true", help="Fetch every payload field instead of the projection")
+    parser.add_argument("--concurrency", type=int, default=1, help="Threads sharing one client")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the query log per configuration")
+    parser.add_argument("--warmup", type=int, default=5, help="Untimed queries per configuration")
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args(argv)
+
+    # The search service module constructs an OpenAI client on import; no call is made here
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark-standin")
+    from qdrant_client import AsyncQdrantClient, QdrantClient
+
+    from app.core.config import settings
+    from app.core.models import SearchPipeline
+    from app.services import qdrant_transport
+    from app.services.search_service import bm25_embedding_model, build_search_params
+
+    if args.qdrant_url:
+        settings.QDRANT_URL = args.qdrant_url
+    collection_name = args.collection or settings.COLLECTION_NAME
+    pipeline = SearchPipeline(args.pipeline)
+    entries = load_query_log(args.query_log, repeat=args.repeat)
+
+    # Query vectors of the collection's size, encoded once so only the Qdrant call is measured
+    probe = QdrantClient(**qdrant_transport.client_kwargs(prefer_grpc=False))
+    vectors_config = probe.get_collection(collection_name).config.params.vectors
+    dimensions = (vectors_config[DENSE_VECTOR_NAME] if isinstance(vectors_config, dict) else vectors_config).size
+    embeddings = HashingEmbeddings(dimensions=dimensions)
+    encoded = [
+        (embeddings.encode(entry["query"]),
+         None if pipeline == SearchPipeline.SEMANTIC else next(bm25_embedding_model.query_embed(entry["query"])))
+        for entry in entries
+    ]
+
+    report: Dict[str, Any] = {}
+    for transport in (name.strip() for name in args.transports.split(",") if name.strip()):
+        asynchronous = transport.endswith("-async")
+        kwargs = qdrant_transport.client_kwargs(prefer_grpc=transport.startswith("grpc"))
+        client = AsyncQdrantClient(**kwargs) if asynchronous else QdrantClient(**kwargs)
+        # One loop for all of the async client's calls: its pooled connections belong to it
+        loop = asyncio.new_event_loop() if asynchronous else None
+        for limit in (int(value) for value in args.limits.split(",") if value.strip()):
+            def params(query: Tuple[Any, Any]) -> Dict[str, Any]:
+                return build_search_params(query[0], query[1], pipeline, limit,
+                                           prefetch_limit=limit if limit > settings.FUSION_DENSE_PREFETCH_LIMIT else None,
+                                           with_payload=True if args.full_payload else None,
+                                           collection_name=collection_name)
+
+            def run(query: Tuple[Any, Any]) -> float:
+                search_params = params(query)
+                started = time.perf_counter()
+                qdrant_transport.response_hits(client.query_points(**search_params))
+                return (time.perf_counter() - started) * 1000
+
+            async def run_async(queries: List[Tuple[Any, Any]]) -> List[float]:
+                in_flight = asyncio.Semaphore(max(1, args.concurrency))
+
+                async def one(query: Tuple[Any, Any]) -> float:
+                    search_params = params(query)
+                    async with in_flight:
+                        started = time.perf_counter()
+                        qdrant_transport.response_hits(await client.query_points(**search_params))
+                        return (time.perf_counter() - started) * 1000
+
+                return list(await asyncio.gather(*(one(query) for query in queries)))
+
+            if asynchronous:
+                loop.run_until_complete(run_async(encoded[:args.warmup]))
+                cpu_started = time.process_time()
+                latencies: List[float] = loop.run_until_complete(run_async(encoded))
+            else:
+                for query in encoded[:args.warmup]:
+                    run(query)
+                cpu_started = time.process_time()
+                with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+                    latencies = list(pool.map(run, encoded))
+            cpu_ms = (time.process_time() - cpu_started) * 1000
+            name = f"{transport} limit={limit}"
+            report[name] = {
+                "latency": summarize(latencies),
+                "cpu_ms_per_query": cpu_ms / len(latencies) if latencies else 0.0,
+            }
+            print(format_summary(name, report[name]["latency"]) + f"  cpu/query={report[name]['cpu_ms_per_query']:.2f}ms")
+        if asynchronous:
+            loop.run_until_complete(client.close())
+            loop.close()
+        else:
+            client.close()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
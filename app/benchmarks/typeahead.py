@@ -0,0 +1,122 @@
+"""
+Typeahead index latency and memory at catalog scale.
+
+Builds the index over synthetic German electronics titles (with model codes so the vocabulary
+grows with the catalog, and Zipf-distributed popularity), then times suggest() for prefixes
+cut from random titles at every length, umlaut-free spellings and incremental upserts.
+
+    python -m app.benchmarks.typeahead --titles 1000000
+    python -m app.benchmarks.typeahead --catalog products.jsonl
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+from app.benchmarks.standins import _BRANDS, _CATEGORIES, load_catalog
+from app.benchmarks.stats import format_summary, summarize
+from app.services.typeahead import TypeaheadIndex
+
+_SERIES = ["Pro", "Ultra", "Max", "Air", "Prime", "Gamer", "Büro", "Kompakt", "Flüster", "Wärmeleit"]
+
+
+def synthetic_titles(size: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Title/brand/category/popularity records only (no page_content) so 1M products fit in memory"""
+    rng = random.Random(seed)
+    categories = list(_CATEGORIES)
+    products = []
+    for index in range(size):
+        category = rng.choice(categories)
+        brand = rng.choice(_BRANDS)
+        model = f"{rng.choice('ABCDEFGHKMRSTXZ')}{rng.choice('ABCDEFGHKMRSTXZ')}{rng.randint(100, 99999)}"
+        attribute = rng.choice(_CATEGORIES[category])
+        products.append({
+            "product_id": str(400000 + index),
+            "title": f"{brand} {rng.choice(_SERIES)} {category} {model} {attribute}",
+            "brand": brand,
+            "category": category,
+            "popularity": int(rng.paretovariate(1.2)),
+        })
+    return products
+
+
+def sample_queries(products: List[Dict[str, Any]], count: int, seed: int = 0) -> List[str]:
+    """Prefixes of random titles at every typed length, a quarter with umlauts typed as bare vowels"""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        title = rng.choice(products)["title"]
+        if rng.random() < 0.25:
+            title = title.replace("ä", "a").replace("ö", "o").replace("ü", "u")
+        queries.append(title[:rng.randint(1, min(len(title), 24))])
+    return queries
+
+
+def time_calls(func, inputs) -> List[float]:
+    timings = []
+    for value in inputs:
+        started = time.perf_counter()
+        func(value)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--titles", type=int, default=1_000_000, help="Synthetic catalog size")
+    parser.add_argument("--catalog", help="JSONL catalog to index instead of synthetic titles")
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--limit", type=int, default=8)
+    parser.add_argument("--upserts", type=int, default=1000, help="Products upserted one at a time after the build")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args(argv)
+
+    products = load_catalog(args.catalog) if args.catalog else synthetic_titles(args.titles, args.seed)
+    queries = sample_queries(products, args.queries, args.seed)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    index = TypeaheadIndex.from_products(products)
+    build_s = time.perf_counter() - started
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"Indexed {len(products)} products in {build_s:.1f}s: {index.stats()}")
+    print(f"Memory: {retained / 2**20:.1f} MiB retained, {peak / 2**20:.1f} MiB peak during build")
+
+    index.suggest(queries[0], args.limit)
+    by_length: Dict[str, List[float]] = {"1-2 chars": [], "3-6 chars": [], "7+ chars": []}
+    for query in queries:
+        bucket = "1-2 chars" if len(query) <= 2 else "3-6 chars" if len(query) <= 6 else "7+ chars"
+        by_length[bucket].extend(time_calls(lambda text: index.suggest(text, args.limit), [query]))
+    report: Dict[str, Any] = {
+        "products": len(products),
+        "build_seconds": build_s,
+        "retained_mib": retained / 2**20,
+        "peak_mib": peak / 2**20,
+        "suggest": summarize(sum(by_length.values(), [])),
+        "suggest_by_length": {bucket: summarize(timings) for bucket, timings in by_length.items()},
+    }
+    print()
+    print(format_summary("suggest (all)", report["suggest"]))
+    for bucket, summary in report["suggest_by_length"].items():
+        print(format_summary(f"  {bucket}", summary))
+
+    updates = synthetic_titles(args.upserts, args.seed + 1)
+    for offset, product in enumerate(updates):
+        product["product_id"] = str(400000 + offset)
+    report["upsert"] = summarize(time_calls(lambda product: index.upsert_products([product]), updates))
+    report["suggest_with_delta"] = summarize(time_calls(lambda text: index.suggest(text, args.limit), queries[:1000]))
+    print(format_summary("upsert (one product)", report["upsert"]))
+    print(format_summary("suggest with delta", report["suggest_with_delta"]))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,115 @@ class Settings(BaseSettings):
     OPENAI_EMBEDDING_MODEL: str = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-large")
     LLM_MODEL: str = os.getenv("LLM_MODEL", "gpt-4o-mini")
     
+    # Prefetch sizes per search pipeline (tune with app.benchmarks.evaluate)
+    FUSION_DENSE_PREFETCH_LIMIT: int = int(os.getenv("FUSION_DENSE_PREFETCH_LIMIT", "30"))
+    FUSION_SPARSE_PREFETCH_LIMIT: int = int(os.getenv("FUSION_SPARSE_PREFETCH_LIMIT", "30"))
+    BM25_TO_SEMANTIC_PREFETCH_LIMIT: int = int(os.getenv("BM25_TO_SEMANTIC_PREFETCH_LIMIT", "50"))
+    SEMANTIC_TO_BM25_PREFETCH_LIMIT: int = int(os.getenv("SEMANTIC_TO_BM25_PREFETCH_LIMIT", "40"))
+    
+    # Cascade reranking: cheap first stage, early exit on a clear lead, cross-encoder on the rest
+    RERANK_CASCADE_ENABLED: bool = os.getenv("RERANK_CASCADE_ENABLED", "false").lower() == "true"
+    RERANK_CASCADE_FIRST_STAGE_MODEL: str = os.getenv("RERANK_CASCADE_FIRST_STAGE_MODEL", "")
+    RERANK_CASCADE_EARLY_EXIT_TOP_K: int = int(os.getenv("RERANK_CASCADE_EARLY_EXIT_TOP_K", "1"))
+    RERANK_CASCADE_EARLY_EXIT_MARGIN: float = float(os.getenv("RERANK_CASCADE_EARLY_EXIT_MARGIN", "0.35"))
+    RERANK_CASCADE_PRUNE_BELOW: float = float(os.getenv("RERANK_CASCADE_PRUNE_BELOW", "0.2"))
+    RERANK_CASCADE_MAX_PAIRS: int = int(os.getenv("RERANK_CASCADE_MAX_PAIRS", "0"))
+    
+    # Cross-encoder score cache keyed by (normalized query, document text hash)
+    RERANK_CACHE_ENABLED: bool = os.getenv("RERANK_CACHE_ENABLED", "true").lower() == "true"
+    RERANK_CACHE_MAX_ENTRIES: int = int(os.getenv("RERANK_CACHE_MAX_ENTRIES", "50000"))
+    RERANK_CACHE_PATH: str = os.getenv("RERANK_CACHE_PATH", "")
+    
+    # Precomputed payload fields (see app.services.catalog) and retrieval payload projection
+    PROMPT_SNIPPET_MAX_CHARS: int = int(os.getenv("PROMPT_SNIPPET_MAX_CHARS", "400"))
+    RERANK_TEXT_MAX_CHARS: int = int(os.getenv("RERANK_TEXT_MAX_CHARS", "1500"))
+    USE_PRECOMPUTED_SNIPPETS: bool = os.getenv("USE_PRECOMPUTED_SNIPPETS", "false").lower() == "true"
+    
+    # Typeahead index over titles, brands and categories (app.services.typeahead)
+    TYPEAHEAD_ENABLED: bool = os.getenv("TYPEAHEAD_ENABLED", "true").lower() == "true"
+    TYPEAHEAD_REFRESH_SECONDS: int = int(os.getenv("TYPEAHEAD_REFRESH_SECONDS", "60"))
+    TYPEAHEAD_PREFIX_BOOST: float = float(os.getenv("TYPEAHEAD_PREFIX_BOOST", "2.0"))
+    TYPEAHEAD_FACET_BOOST: float = float(os.getenv("TYPEAHEAD_FACET_BOOST", "0.5"))
+    
+    # Cursor pagination over a server-side snapshot of each search (app.services.pagination); opt-in,
+    # since every search then retrieves PAGINATION_CANDIDATE_LIMIT hits
+    PAGINATION_ENABLED: bool = os.getenv("PAGINATION_ENABLED", "false").lower() == "true"
+    PAGINATION_CANDIDATE_LIMIT: int = int(os.getenv("PAGINATION_CANDIDATE_LIMIT", "100"))
+    PAGINATION_PAGE_SIZE: int = int(os.getenv("PAGINATION_PAGE_SIZE", "10"))
+    PAGINATION_TTL_SECONDS: int = int(os.getenv("PAGINATION_TTL_SECONDS", "600"))
+    PAGINATION_MAX_SNAPSHOTS: int = int(os.getenv("PAGINATION_MAX_SNAPSHOTS", "500"))
+    
+    # Precomputed responses for head queries (app.services.precompute), tagged with the catalog version
+    CATALOG_VERSION: str = os.getenv("CATALOG_VERSION", "")
+    CATALOG_META_COLLECTION: str = os.getenv("CATALOG_META_COLLECTION", "catalog_meta")
+    PRECOMPUTE_PATH: str = os.getenv("PRECOMPUTE_PATH", "")
+    PRECOMPUTE_TOP_N: int = int(os.getenv("PRECOMPUTE_TOP_N", "200"))
+    PRECOMPUTE_CONCURRENCY: int = int(os.getenv("PRECOMPUTE_CONCURRENCY", "4"))
+    PRECOMPUTE_CHECK_SECONDS: int = int(os.getenv("PRECOMPUTE_CHECK_SECONDS", "60"))
+    
+    # On-demand request profiling (app.core.profiling); admin endpoints under /admin/profiles
+    PROFILING_ENABLED: bool = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+    PROFILING_HEADER: str = os.getenv("PROFILING_HEADER", "X-Profile")
+    # Admin token for the profiling header and /admin; unset, neither is accepted
+    PROFILING_TOKEN: str = os.getenv("PROFILING_TOKEN", "")
+    PROFILING_SAMPLE_RATE: float = float(os.getenv("PROFILING_SAMPLE_RATE", "0.0"))
+    PROFILING_INTERVAL_MS: float = float(os.getenv("PROFILING_INTERVAL_MS", "1.0"))
+    PROFILING_TRACEMALLOC_FRAMES: int = int(os.getenv("PROFILING_TRACEMALLOC_FRAMES", "1"))
+    PROFILING_TOP_ALLOCATIONS: int = int(os.getenv("PROFILING_TOP_ALLOCATIONS", "10"))
+    PROFILING_DIR: str = os.getenv("PROFILING_DIR", "profiles")
+    PROFILING_KEEP: int = int(os.getenv("PROFILING_KEEP", "50"))
+    
+    # LLM token accounting and budgets (app.services.usage); 0 disables a budget
+    TOKEN_BUDGET_PER_REQUEST: int = int(os.getenv("TOKEN_BUDGET_PER_REQUEST", "0"))
+    TOKEN_BUDGET_PER_MINUTE: int = int(os.getenv("TOKEN_BUDGET_PER_MINUTE", "0"))
+    BUDGET_CONTEXT_DOCS: int = int(os.getenv("BUDGET_CONTEXT_DOCS", "3"))
+    USAGE_IN_RESPONSE: bool = os.getenv("USAGE_IN_RESPONSE", "false").lower() == "true"
+    MODEL_PRICES_JSON: str = os.getenv("MODEL_PRICES_JSON", "")
+    
+    # Fan-out search over several collections (app.services.sharding); empty means COLLECTION_NAME only
+    SEARCH_COLLECTIONS: str = os.getenv("SEARCH_COLLECTIONS", "")
+    SHARD_ROUTING_JSON: str = os.getenv("SHARD_ROUTING_JSON", "")
+    SHARD_FUSION: str = os.getenv("SHARD_FUSION", "raw")
+    SHARD_RRF_K: int = int(os.getenv("SHARD_RRF_K", "60"))
+    SHARD_TIMEOUT_MS: float = float(os.getenv("SHARD_TIMEOUT_MS", "0"))
+    
+    # Qdrant transport (app.services.qdrant_transport); gRPC needs the Qdrant gRPC port reachable
+    QDRANT_PREFER_GRPC: bool = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"
+    QDRANT_GRPC_PORT: int = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+    QDRANT_API_KEY: str = os.getenv("QDRANT_API_KEY", "")
+    QDRANT_HTTP_POOL_SIZE: int = int(os.getenv("QDRANT_HTTP_POOL_SIZE", "20"))
+    QDRANT_GRPC_POOL_SIZE: int = int(os.getenv("QDRANT_GRPC_POOL_SIZE", "0"))
+    QDRANT_KEEPALIVE_SECONDS: float = float(os.getenv("QDRANT_KEEPALIVE_SECONDS", "30"))
+    QDRANT_TIMEOUT_SECONDS: int = int(os.getenv("QDRANT_TIMEOUT_SECONDS", "10"))
+    QDRANT_SEARCH_TIMEOUT_SECONDS: int = int(os.getenv("QDRANT_SEARCH_TIMEOUT_SECONDS", "0"))
+    
+    # Search sessions for follow-up refinements (app.services.sessions); POST /search/refine. Opt-in,
+    # since every search then retrieves SESSION_CANDIDATE_LIMIT hits
+    SESSIONS_ENABLED: bool = os.getenv("SESSIONS_ENABLED", "false").lower() == "true"
+    SESSION_TTL_SECONDS: int = int(os.getenv("SESSION_TTL_SECONDS", "900"))
+    SESSION_MAX_SESSIONS: int = int(os.getenv("SESSION_MAX_SESSIONS", "1000"))
+    SESSION_CANDIDATE_LIMIT: int = int(os.getenv("SESSION_CANDIDATE_LIMIT", "100"))
+    SESSION_MIN_CANDIDATES: int = int(os.getenv("SESSION_MIN_CANDIDATES", "5"))
+    
+    # HTTP caching of GET /search (app.services.http_cache): ETag, Cache-Control and a local response store
+    HTTP_CACHE_ENABLED: bool = os.getenv("HTTP_CACHE_ENABLED", "false").lower() == "true"
+    HTTP_CACHE_MAX_AGE_SECONDS: int = int(os.getenv("HTTP_CACHE_MAX_AGE_SECONDS", "300"))
+    HTTP_CACHE_TTL_SECONDS: int = int(os.getenv("HTTP_CACHE_TTL_SECONDS", "3600"))
+    HTTP_CACHE_MAX_ENTRIES: int = int(os.getenv("HTTP_CACHE_MAX_ENTRIES", "2000"))
+    HTTP_CACHE_VERSION_SECONDS: int = int(os.getenv("HTTP_CACHE_VERSION_SECONDS", "60"))
+    PROMPT_VERSION: str = os.getenv("PROMPT_VERSION", "")
+    # Temperature 0 and a fixed seed for every LLM call, so equal inputs give (near) equal responses
+    LLM_DETERMINISTIC: bool = os.getenv("LLM_DETERMINISTIC", "false").lower() == "true"
+    LLM_SEED: int = int(os.getenv("LLM_SEED", "42"))
+    
+    # Multi-query retrieval: expansion returns query variants, searched in one batched Qdrant request and fused
+    MULTI_QUERY_ENABLED: bool = os.getenv("MULTI_QUERY_ENABLED", "false").lower() == "true"
+    MULTI_QUERY_VARIANTS: int = int(os.getenv("MULTI_QUERY_VARIANTS", "3"))
+    MULTI_QUERY_FUSION: str = os.getenv("MULTI_QUERY_FUSION", "rrf")
+    
+    # Static instructions in a stable system message so the provider prefix cache applies (app.core.prompts)
+    PROMPT_CACHE_LAYOUT: bool = os.getenv("PROMPT_CACHE_LAYOUT", "true").lower() == "true"
+    
     # OpenAI API key will be loaded from the environment
     # or from .env file with python-dotenv if installed
 
@@ -0,0 +1,255 @@
+"""
+On-demand request profiling.
+
+A request carrying the PROFILING_HEADER header with PROFILING_TOKEN as its value (or picked at
+PROFILING_SAMPLE_RATE) runs under
+a sampling profiler that records the stacks of the serving thread every PROFILING_INTERVAL_MS,
+with tracemalloc snapshots taken at every log_performance stage. Each profile is written to
+PROFILING_DIR/<id>/ as stacks.folded (collapsed stacks for flamegraph.pl, speedscope or
+inferno) and profile.json (stage timings with the top allocations of each stage).
+
+Nothing is sampled or traced unless a request is profiled; otherwise the middleware only
+checks the settings and log_performance only reads a context variable.
+"""
+import contextvars
+import hmac
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger("mini_RAG")
+
+PROFILE_ID = re.compile(r"^[0-9A-Za-z_-]+$")
+
+_active_profile: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar(
+    "active_profile", default=None
+)
+# tracemalloc is process-wide, so only one request is profiled at a time
+_profile_slot = threading.Lock()
+
+
+def _frame_label(code) -> str:
+    path = code.co_filename.replace(os.sep, "/").rsplit("/", 2)
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Counts the collapsed Python stacks of one thread, sampled from a background thread"""
+
+    def __init__(self, thread_id: int, interval_s: float):
+        self.thread_id = thread_id
+        self.interval_s = interval_s
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class RequestProfile:
+    """Sampler plus per-stage allocation snapshots for one request"""
+
+    def __init__(self, method: str, path: str, query_string: str):
+        self.profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.method = method
+        self.path = path
+        self.query_string = query_string
+        self.stages: List[Dict[str, Any]] = []
+        self.sampler = StackSampler(threading.get_ident(), settings.PROFILING_INTERVAL_MS / 1000)
+        self._started_tracing = False
+        self._snapshot = None
+        self._started_at = 0.0
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(settings.PROFILING_TRACEMALLOC_FRAMES)
+            self._started_tracing = True
+        self._snapshot = self._take_snapshot()
+        self._started_at = time.perf_counter()
+        self.sampler.start()
+
+    @staticmethod
+    def _take_snapshot():
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+
+    def mark_stage(self, operation: str, elapsed_ms: float):
+        """Record a finished stage with the allocations made since the previous mark"""
+        snapshot = self._take_snapshot()
+        top = snapshot.compare_to(self._snapshot, "lineno")[:settings.PROFILING_TOP_ALLOCATIONS]
+        self._snapshot = snapshot
+        self.stages.append({
+            "operation": operation,
+            "elapsed_ms": round(elapsed_ms, 2),
+            "top_allocations": [
+                {"location": str(stat.traceback[0]), "size_diff_kib": round(stat.size_diff / 1024, 1),
+                 "count_diff": stat.count_diff}
+                for stat in top if stat.size_diff > 0
+            ],
+        })
+
+    def finish(self, status_code: Optional[int]) -> str:
+        total_ms = (time.perf_counter() - self._started_at) * 1000
+        self.sampler.stop()
+        peak_kib = tracemalloc.get_traced_memory()[1] / 1024
+        if self._started_tracing:
+            tracemalloc.stop()
+
+        directory = os.path.join(settings.PROFILING_DIR, self.profile_id)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "stacks.folded"), "w", encoding="utf-8") as stacks_file:
+            stacks_file.write(self.sampler.folded())
+        with open(os.path.join(directory, "profile.json"), "w", encoding="utf-8") as profile_file:
+            json.dump({
+                "id": self.profile_id,
+                "created_at": time.time(),
+                "method": self.method,
+                "path": self.path,
+                "query_string": self.query_string,
+                "status_code": status_code,
+                "total_ms": round(total_ms, 2),
+                "interval_ms": settings.PROFILING_INTERVAL_MS,
+                "samples": self.sampler.samples,
+                "traced_peak_kib": round(peak_kib, 1),
+                "stages": self.stages,
+            }, profile_file, indent=2, ensure_ascii=False)
+        prune_profiles()
+        logger.info(f"Saved request profile {self.profile_id} ({self.sampler.samples} samples, {total_ms:.1f}ms)")
+        return self.profile_id
+
+
+def mark_stage(operation: str, elapsed_ms: float):
+    """Called from log_performance; a no-op unless the current request is being profiled"""
+    profile = _active_profile.get()
+    if profile is not None:
+        profile.mark_stage(operation, elapsed_ms)
+
+
+def list_profiles(limit: int = 50) -> List[Dict[str, Any]]:
+    """Summaries of the most recent profiles, newest first"""
+    if not os.path.isdir(settings.PROFILING_DIR):
+        return []
+    summaries = []
+    for profile_id in sorted(os.listdir(settings.PROFILING_DIR), reverse=True)[:limit]:
+        profile = read_profile(profile_id)
+        if profile is not None:
+            summaries.append({key: profile[key] for key in
+                              ("id", "created_at", "method", "path", "query_string", "status_code", "total_ms", "samples")})
+    return summaries
+
+
+def read_profile(profile_id: str) -> Optional[Dict[str, Any]]:
+    if not PROFILE_ID.match(profile_id):
+        return None
+    try:
+        with open(os.path.join(settings.PROFILING_DIR, profile_id, "profile.json"), encoding="utf-8") as profile_file:
+            return json.load(profile_file)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def read_stacks(profile_id: str) -> Optional[str]:
+    if not PROFILE_ID.match(profile_id):
+        return None
+    try:
+        with open(os.path.join(settings.PROFILING_DIR, profile_id, "stacks.folded"), encoding="utf-8") as stacks_file:
+            return stacks_file.read()
+    except OSError:
+        return None
+
+
+def valid_token(token: Optional[str]) -> bool:
+    """Whether token is the PROFILING_TOKEN; without a configured token nothing is accepted"""
+    if not settings.PROFILING_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode("utf-8"), settings.PROFILING_TOKEN.encode("utf-8"))
+
+
+def prune_profiles():
+    """Keep only the PROFILING_KEEP most recent profile directories"""
+    profile_ids = sorted(os.listdir(settings.PROFILING_DIR), reverse=True)
+    for profile_id in profile_ids[settings.PROFILING_KEEP:]:
+        shutil.rmtree(os.path.join(settings.PROFILING_DIR, profile_id), ignore_errors=True)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requests on demand; other requests pass straight through"""
+
+    def __init__(self, app):
+        self.app = app
+        self.header = settings.PROFILING_HEADER.lower().encode("latin-1")
+
+    def _wants_profile(self, scope) -> bool:
+        if scope["type"] != "http" or not scope["path"].startswith(settings.API_V1_STR):
+            return False
+        # The header only triggers a profile with the admin token, so clients cannot force one
+        if any(name == self.header and valid_token(value.decode("latin-1")) for name, value in scope["headers"]):
+            return True
+        return settings.PROFILING_SAMPLE_RATE > 0 and random.random() < settings.PROFILING_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if not settings.PROFILING_ENABLED or not self._wants_profile(scope) or not _profile_slot.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"], scope.get("query_string", b"").decode("latin-1"))
+        status_code = None
+
+        async def send_with_profile_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-id", profile.profile_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        token = _active_profile.set(profile)
+        try:
+            profile.start()
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            _active_profile.reset(token)
+            try:
+                profile.finish(status_code)
+            except OSError as e:
+                logger.error(f"Could not save request profile {profile.profile_id}: {e}")
+            finally:
+                _profile_slot.release()
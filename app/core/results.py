@@ -0,0 +1,84 @@
+from typing import Any, Dict, Optional
+
+import numpy as np
+import orjson
+
+DEFAULT_THUMBNAIL = 'https://placeholder.com/150'
+
+
+class SearchHit:
+    """
+    One retrieved point. Scores are plain floats; payload fields are read from the Qdrant
+    payload on access instead of being copied into a per-hit dict.
+    """
+
+    __slots__ = ("point_id", "score", "rerank_score", "_payload")
+
+    def __init__(self, point_id: Any, score: float, payload: Optional[Dict[str, Any]]):
+        self.point_id = point_id
+        self.score = float(score) if score is not None else 0.0
+        self.rerank_score: Optional[float] = None
+        self._payload = payload or {}
+
+    @property
+    def product_id(self) -> Optional[Any]:
+        return self._payload.get('product_id')
+
+    @property
+    def title(self) -> str:
+        return self._payload.get('title', 'No Title')
+
+    @property
+    def url(self) -> str:
+        return self._payload.get('url', 'No URL')
+
+    @property
+    def page_content(self) -> str:
+        return self._payload.get('page_content', '')
+
+    @property
+    def thumbnail(self) -> str:
+        return self._payload.get('thumbnail', self._payload.get('image', DEFAULT_THUMBNAIL))
+
+    @property
+    def prompt_snippet(self) -> str:
+        """Compact description for the product prompt (full text until the catalog is backfilled)"""
+        return self._payload.get('prompt_snippet') or self.page_content
+
+    @property
+    def rerank_text(self) -> str:
+        """Cross-encoder input, pre-truncated at ingestion (full text until the catalog is backfilled)"""
+        return self._payload.get('rerank_text') or self.page_content
+
+    def get(self, field: str, default: Any = None) -> Any:
+        """Any other payload field (facets such as brand, category, color or price)"""
+        return self._payload.get(field, default)
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {
+            'point_id': self.point_id,
+            'product_id': self.product_id,
+            'score': self.score,
+            'title': self.title,
+            'url': self.url,
+            'thumbnail': self.thumbnail,
+        }
+        if self.rerank_score is not None:
+            result['rerank_score'] = self.rerank_score
+        return result
+
+    def __repr__(self) -> str:
+        return f"SearchHit(point_id={self.point_id!r}, score={self.score:.4f}, rerank_score={self.rerank_score})"
+
+
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, SearchHit):
+        return obj.to_dict()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps_response(response: Any) -> bytes:
+    """Serialize an API response straight to JSON bytes; hits and NumPy values are handled inline"""
+    return orjson.dumps(response, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY)
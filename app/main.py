@@ -1,9 +1,14 @@
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.api.routes.admin import router as admin_router
 from app.api.routes.search import router as search_router
+from app.api.routes.typeahead import router as typeahead_router
 from app.core.config import settings
+from app.core.profiling import ProfilingMiddleware
+from app.services import http_cache, pagination, precompute, rerank_cache, sessions, sharding, typeahead, usage
 
 # Configure logging
 logging.basicConfig(
@@ -12,11 +17,27 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Restore persisted caches and start the typeahead index and precomputed-response refresh on
+    startup; stop the background threads and write caches back on shutdown
+    """
+    rerank_cache.load_rerank_cache()
+    background_stops = [typeahead.start_typeahead_refresh(), precompute.start_precompute_refresh()]
+    yield
+    for stop in background_stops:
+        if stop is not None:
+            stop.set()
+    rerank_cache.save_rerank_cache()
+
+
 # Create FastAPI app
 app = FastAPI(
     title=settings.PROJECT_NAME,
     description="API for searching and retrieving personalized product recommendations",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Set up CORS middleware
@@ -26,10 +47,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Profile-Id", "ETag"],
 )
 
+# Profiles requests on demand (PROFILING_ENABLED); a pass-through otherwise
+app.add_middleware(ProfilingMiddleware)
+
 # Include routers
 app.include_router(search_router, prefix=f"{settings.API_V1_STR}/products", tags=["products"])
+app.include_router(typeahead_router, prefix=f"{settings.API_V1_STR}/products", tags=["products"])
+app.include_router(admin_router, prefix="/admin", tags=["admin"])
 
 @app.get("/health", tags=["health"])
 async def health_check():
@@ -37,6 +64,22 @@ async def health_check():
     return {"status": "ok"}
 
 
+@app.get("/metrics", tags=["health"])
+async def metrics():
+    """In-process cache, index and token usage metrics"""
+    cache = rerank_cache.rerank_score_cache
+    return {
+        "rerank_cache": cache.stats() if cache is not None else None,
+        "llm_usage": usage.usage_metrics.stats(),
+        "typeahead": typeahead.typeahead_index.stats(),
+        "precomputed_responses": precompute.precomputed_store.stats() if precompute.precomputed_store is not None else None,
+        "search_snapshots": pagination.snapshot_store.stats() if pagination.snapshot_store is not None else None,
+        "shards": sharding.shard_metrics.stats(),
+        "sessions": sessions.session_store.stats() if sessions.session_store is not None else None,
+        "http_cache": http_cache.response_store.stats() if http_cache.response_store is not None else None,
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8002, reload=True)
\ No newline at end of file
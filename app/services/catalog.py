@@ -0,0 +1,152 @@
+"""
+Catalog payload helpers: derived per-product fields written at ingestion, and the payload
+projection requested from Qdrant on the search path.
+
+    python -m app.services.catalog backfill        # add prompt_snippet / rerank_text to existing points
+    python -m app.services.catalog bump-version    # mark the catalog as changed after ingestion or delta sync
+"""
+import argparse
+import logging
+import time
+import uuid
+from typing import Any, Dict, List
+
+from qdrant_client import QdrantClient, models
+
+from app.core.config import settings
+
+logger = logging.getLogger("mini_RAG")
+
+# Payload fields the search path reads: links for the API response, a compact summary for the
+# product prompt and a truncated text for the cross-encoder
+LINK_FIELDS = ["product_id", "title", "url", "thumbnail", "image"]
+DERIVED_FIELDS = ["prompt_snippet", "rerank_text"]
+# Facets that session refinements filter on locally (app.services.sessions)
+FACET_FIELDS = ["brand", "category", "color", "price"]
+
+# Payload key of the catalog version marker (one point per catalog collection in CATALOG_META_COLLECTION);
+# precomputed and HTTP-cached responses are tagged with it
+CATALOG_VERSION_KEY = "catalog_version"
+
+
+def truncate_text(text: str, max_chars: int) -> str:
+    """Cut text to at most max_chars, preferring a sentence end and otherwise a word boundary"""
+    text = (text or "").strip()
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    sentence_end = cut.rfind(". ")
+    if sentence_end >= max_chars // 2:
+        return cut[:sentence_end + 1]
+    word_end = cut.rfind(" ")
+    return cut[:word_end] if word_end > 0 else cut
+
+
+def derive_payload_fields(payload: Dict[str, Any]) -> Dict[str, str]:
+    """Precomputed fields stored next to page_content so the hot path never moves the full text"""
+    page_content = payload.get("page_content", "")
+    return {
+        "prompt_snippet": truncate_text(page_content, settings.PROMPT_SNIPPET_MAX_CHARS),
+        "rerank_text": truncate_text(page_content, settings.RERANK_TEXT_MAX_CHARS),
+    }
+
+
+def search_payload_fields() -> List[str]:
+    """Payload projection for retrieval; page_content is only fetched until the catalog is backfilled"""
+    fields = LINK_FIELDS + DERIVED_FIELDS + FACET_FIELDS
+    if not settings.USE_PRECOMPUTED_SNIPPETS:
+        fields = fields + ["page_content"]
+    return fields
+
+
+def backfill_derived_fields(client: QdrantClient, collection_name: str, batch_size: int = 256) -> int:
+    """Compute and store the derived fields for every point of a collection; returns the point count"""
+    updated = 0
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name, limit=batch_size, offset=offset, with_payload=["page_content"], with_vectors=False,
+        )
+        if not points:
+            break
+        client.batch_update_points(collection_name, update_operations=[
+            models.SetPayloadOperation(set_payload=models.SetPayload(
+                payload=derive_payload_fields(point.payload or {}), points=[point.id],
+            ))
+            for point in points
+        ])
+        updated += len(points)
+        if offset is None:
+            break
+    return updated
+
+
+def _version_point_id(collection_name: str) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"catalog-version/{collection_name}"))
+
+
+def get_catalog_version(client: QdrantClient, collection_name: str) -> str:
+    """
+    Current catalog version: CATALOG_VERSION when pinned, else the marker written by
+    bump_catalog_version, else the point count (so at least additions and deletions are noticed)
+    """
+    if settings.CATALOG_VERSION:
+        return settings.CATALOG_VERSION
+    if client.collection_exists(settings.CATALOG_META_COLLECTION):
+        markers = client.retrieve(settings.CATALOG_META_COLLECTION, [_version_point_id(collection_name)],
+                                  with_payload=[CATALOG_VERSION_KEY], with_vectors=False)
+        if markers and (markers[0].payload or {}).get(CATALOG_VERSION_KEY):
+            return str(markers[0].payload[CATALOG_VERSION_KEY])
+    return f"count-{client.get_collection(collection_name).points_count}"
+
+
+def get_catalogs_version(client: QdrantClient, collection_names: List[str]) -> str:
+    """Catalog version over several collections; changes when any of them does"""
+    if settings.CATALOG_VERSION or len(collection_names) == 1:
+        return get_catalog_version(client, collection_names[0])
+    return "+".join(f"{name}:{get_catalog_version(client, name)}" for name in collection_names)
+
+
+def bump_catalog_version(client: QdrantClient, collection_name: str, version: str = None) -> str:
+    """
+    Record a new catalog version; call after every catalog write. The version is a payload
+    marker in CATALOG_META_COLLECTION rather than collection metadata, which needs Qdrant and
+    qdrant-client 1.16 or newer.
+    """
+    version = version or time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+    if not client.collection_exists(settings.CATALOG_META_COLLECTION):
+        # Points need a vector on every server version; this one is a placeholder
+        client.create_collection(settings.CATALOG_META_COLLECTION,
+                                 vectors_config=models.VectorParams(size=1, distance=models.Distance.DOT))
+    client.upsert(settings.CATALOG_META_COLLECTION, points=[models.PointStruct(
+        id=_version_point_id(collection_name), vector=[1.0],
+        payload={"collection": collection_name, CATALOG_VERSION_KEY: version},
+    )])
+    return version
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["backfill", "bump-version"])
+    parser.add_argument("--collection", default=settings.COLLECTION_NAME)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--version", help="Version string for bump-version (default: current UTC time)")
+    args = parser.parse_args(argv)
+
+    start_time = time.time()
+    from app.services.qdrant_transport import get_client
+
+    client = get_client()
+    if args.command == "bump-version":
+        version = bump_catalog_version(client, args.collection, args.version)
+        logger.info(f"Catalog version of {args.collection} is now {version}")
+        return
+    updated = backfill_derived_fields(client, args.collection, args.batch_size)
+    version = bump_catalog_version(client, args.collection)
+    logger.info(f"Backfilled {', '.join(DERIVED_FIELDS)} for {updated} points in {args.collection} "
+                f"({time.time() - start_time:.1f}s), catalog version {version}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,184 @@
+"""
+HTTP caching of GET /search responses.
+
+A response is identified by the normalized query, the request parameters, the catalog version
+and the prompt version (a digest of the prompt templates and LLM settings, or PROMPT_VERSION).
+That key is the response's weak ETag: it is known before any stage runs, so If-None-Match is
+answered with 304 straight away, and Cache-Control lets browsers and the CDN keep the body for
+HTTP_CACHE_MAX_AGE_SECONDS. Bodies are also kept in a local LRU, so a repeated request within
+HTTP_CACHE_TTL_SECONDS is served byte-identical without running the pipeline.
+
+Cached bodies are shared, so they carry no per-request state: no next_cursor, session_id or
+usage. Responses of the cheaper path (token budget exceeded) are sent with no-store instead, so
+a budget spike does not pin degraded answers behind an ETag. Set LLM_DETERMINISTIC=true so a recomputed body matches an evicted one as closely as the
+provider allows.
+"""
+import functools
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.core import prompts
+from app.core.config import settings
+from app.services.precompute import request_key
+
+logger = logging.getLogger("mini_RAG")
+
+# Per-request fields that must not be shared through a cache
+UNCACHED_FIELDS = {"next_cursor": None, "session_id": None}
+
+
+@functools.lru_cache(maxsize=1)
+def prompt_version() -> str:
+    """PROMPT_VERSION, else a digest of everything that shapes the LLM stages' output"""
+    if settings.PROMPT_VERSION:
+        return settings.PROMPT_VERSION
+    parts = [
+        prompts.DEFAULT_SYSTEM_PROMPT, prompts.REWRITE_PROMPT, prompts.PRODUCT_PROMPT,
+        prompts.REWRITE_SYSTEM_PROMPT, prompts.REWRITE_USER_PROMPT,
+        prompts.PRODUCT_SYSTEM_PROMPT, prompts.PRODUCT_USER_PROMPT, prompts.QUERY_VARIANTS_INSTRUCTIONS,
+        settings.LLM_MODEL, str(settings.PROMPT_CACHE_LAYOUT), str(settings.LLM_DETERMINISTIC), str(settings.LLM_SEED),
+        str(settings.MULTI_QUERY_ENABLED), str(settings.MULTI_QUERY_VARIANTS), settings.MULTI_QUERY_FUSION,
+    ]
+    return hashlib.blake2b("\x00".join(parts).encode("utf-8"), digest_size=6).hexdigest()
+
+
+_catalog_version: Optional[Tuple[float, Optional[str]]] = None
+_catalog_version_lock = threading.Lock()
+
+
+def catalog_version() -> Optional[str]:
+    """
+    Catalog version of the search collections, re-read every HTTP_CACHE_VERSION_SECONDS; None if
+    unavailable. A failed read is kept for the same interval, so an unreachable Qdrant is not
+    asked again on every request
+    """
+    global _catalog_version
+    if settings.CATALOG_VERSION:
+        return settings.CATALOG_VERSION
+    now = time.time()
+    with _catalog_version_lock:
+        if _catalog_version is not None and now - _catalog_version[0] < settings.HTTP_CACHE_VERSION_SECONDS:
+            return _catalog_version[1]
+    from app.services import qdrant_transport, search_service
+    from app.services.catalog import get_catalogs_version
+    from app.services.sharding import search_collections
+
+    try:
+        # The search client if it is up, else the shared one; no models are loaded for this
+        client = search_service.qdrant_client or qdrant_transport.get_client()
+        version = get_catalogs_version(client, search_collections())
+    except Exception as e:
+        logger.warning(f"Could not read the catalog version, responses are not cacheable: {e}")
+        version = None
+    with _catalog_version_lock:
+        _catalog_version = (now, version)
+    return version
+
+
+def response_etag(query: str, limit: int, rerank_limit: int, pipeline: Any, do_rerank: bool) -> Optional[str]:
+    """Weak ETag of a GET /search response, or None when the catalog version is unknown"""
+    version = catalog_version()
+    if version is None:
+        return None
+    key = list(request_key(query, limit, rerank_limit, pipeline, do_rerank)) + [version, prompt_version()]
+    digest = hashlib.blake2b(json.dumps(key, ensure_ascii=False).encode("utf-8"), digest_size=16).hexdigest()
+    # Weak: a recomputed body is equivalent, not byte-identical (status timings, LLM wording)
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match comparison (weak, as RFC 9110 prescribes for it)"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in (tag.removeprefix("W/") for tag in tags)
+
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": f"public, max-age={settings.HTTP_CACHE_MAX_AGE_SECONDS}"}
+
+
+def cacheable_response(response: Dict[str, Any], request_usage: Any = None) -> Optional[Dict[str, Any]]:
+    """
+    The response without per-request fields, or None when it should not be cached: failed
+    stages, or the cheaper path of request_usage (app.services.usage.RequestUsage)
+    """
+    if response.get("recommended_products") is None:
+        return None
+    if request_usage is not None and request_usage.cheap_path:
+        return None
+    shared = {key: value for key, value in response.items() if key != "usage"}
+    shared.update(UNCACHED_FIELDS)
+    return shared
+
+
+class ResponseStore:
+    """Thread-safe, TTL- and size-bounded LRU of serialized responses keyed by ETag"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def get(self, etag: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is not None and time.time() - entry[0] >= self.ttl_seconds:
+                del self._entries[etag]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(etag)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, etag: str, body: bytes):
+        with self._lock:
+            self._entries[etag] = (time.time(), body)
+            self._entries.move_to_end(etag)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "bytes": sum(len(body) for _, body in self._entries.values()),
+                "prompt_version": prompt_version(),
+                "catalog_version": _catalog_version[1] if _catalog_version is not None else settings.CATALOG_VERSION or None,
+            }
+
+
+response_store: Optional[ResponseStore] = (
+    ResponseStore(settings.HTTP_CACHE_MAX_ENTRIES, settings.HTTP_CACHE_TTL_SECONDS)
+    if settings.HTTP_CACHE_ENABLED else None
+)
@@ -0,0 +1,127 @@
+"""
+Server-side search snapshots for cursor pagination.
+
+A snapshot keeps what a follow-up page needs without expansion, embedding or retrieval: the
+expanded query, slots and the ordered candidate list. Candidates past the reranked head are
+reranked window by window as pages reach them. Snapshots expire after PAGINATION_TTL_SECONDS
+and the store holds at most PAGINATION_MAX_SNAPSHOTS (least recently used are dropped first).
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.results import SearchHit
+
+
+class SearchSnapshot:
+    """Ordered candidates of one search plus the context needed to serve later pages"""
+
+    __slots__ = ("original_query", "query", "slots", "pipeline", "do_rerank", "candidates",
+                 "created_at", "lock")
+
+    def __init__(self, original_query: str, query: str, slots: Optional[Dict[str, Any]], pipeline: str,
+                 do_rerank: bool, candidates: List[SearchHit]):
+        self.original_query = original_query
+        self.query = query
+        self.slots = slots
+        self.pipeline = pipeline
+        self.do_rerank = do_rerank
+        self.candidates = candidates
+        self.created_at = time.time()
+        # Serializes lazy reranking of a window between concurrent page requests
+        self.lock = threading.Lock()
+
+
+def order_candidates(shown: List[SearchHit], original_results: List[SearchHit],
+                     final_results: List[SearchHit]) -> List[SearchHit]:
+    """Hits already shown first, then the reranked head, then the remaining retrieval order"""
+    ordered = list(shown)
+    seen = {id(hit) for hit in ordered}
+    for hit in list(final_results) + list(original_results):
+        if id(hit) not in seen:
+            seen.add(id(hit))
+            ordered.append(hit)
+    return ordered
+
+
+def encode_cursor(snapshot_id: str, offset: int) -> str:
+    return f"{snapshot_id}.{offset}"
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[str, int]]:
+    snapshot_id, _, offset = (cursor or "").rpartition(".")
+    if not snapshot_id or not offset.isdigit():
+        return None
+    return snapshot_id, int(offset)
+
+
+class SnapshotStore:
+    """Thread-safe, TTL- and size-bounded LRU of search snapshots"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, SearchSnapshot]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def _expire(self, now: float):
+        # Entries are in LRU order, not creation order, so scan until a live one is found
+        while self._entries:
+            snapshot_id, snapshot = next(iter(self._entries.items()))
+            if now - snapshot.created_at < self.ttl_seconds:
+                break
+            del self._entries[snapshot_id]
+            self.expired += 1
+
+    def put(self, snapshot: SearchSnapshot) -> str:
+        snapshot_id = secrets.token_urlsafe(12)
+        with self._lock:
+            self._expire(time.time())
+            self._entries[snapshot_id] = snapshot
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return snapshot_id
+
+    def get(self, snapshot_id: str) -> Optional[SearchSnapshot]:
+        with self._lock:
+            snapshot = self._entries.get(snapshot_id)
+            if snapshot is not None and time.time() - snapshot.created_at >= self.ttl_seconds:
+                del self._entries[snapshot_id]
+                self.expired += 1
+                snapshot = None
+            if snapshot is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(snapshot_id)
+            self.hits += 1
+            return snapshot
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+            }
+
+
+snapshot_store: Optional[SnapshotStore] = (
+    SnapshotStore(settings.PAGINATION_MAX_SNAPSHOTS, settings.PAGINATION_TTL_SECONDS)
+    if settings.PAGINATION_ENABLED else None
+)
@@ -0,0 +1,299 @@
+"""
+Precomputed responses for head queries.
+
+An offline job mines the most frequent queries from a JSONL query log and/or the performance
+log, runs them through process_search_query in bulk and stores the responses tagged with the
+catalog version. The API serves a stored response before any live stage when query, parameters
+and catalog version match; a background thread watches the catalog version and recomputes
+stale entries after ingestion or delta sync (see app.services.catalog.bump_catalog_version).
+
+    python -m app.services.precompute build --query-log queries.jsonl --perf-log mini_RAG.log --top 200
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.rerank_cache import normalize_query
+from app.services.sharding import search_collections
+
+logger = logging.getLogger("mini_RAG")
+
+# "PERFORMANCE SUMMARY for '<query>' (limit: ..., do_rerank: ...):" is logged once per
+# process_search_query call; lines written before the parameters were added have none
+_SUMMARY_LINE = re.compile(
+    r"PERFORMANCE SUMMARY for '(?P<query>.*)'"
+    r"(?: \(limit: (?P<limit>\d+), rerank_limit: (?P<rerank_limit>\d+), "
+    r"pipeline: (?P<pipeline>\w+), do_rerank: (?P<do_rerank>True|False)\))?:"
+)
+
+# Parameters of the GET /search endpoint, used for queries mined without parameters
+DEFAULT_PARAMS = {"limit": 30, "rerank_limit": 10, "pipeline": "FUSION_RRF", "do_rerank": True}
+
+Key = Tuple[str, str, int, int, bool]
+
+# Set on precompute worker threads so recomputation neither reads the store nor skews its stats
+_computing = threading.local()
+
+
+def request_key(query: str, limit: int, rerank_limit: int, pipeline: Any, do_rerank: bool) -> Key:
+    return normalize_query(query), getattr(pipeline, "value", str(pipeline)), int(limit), int(rerank_limit), bool(do_rerank)
+
+
+class PrecomputedStore:
+    """Thread-safe map of request key -> stored response, each tagged with its catalog version"""
+
+    def __init__(self):
+        self._entries: Dict[Key, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        # Version the live catalog is known to be at; nothing is served until it is known
+        self.catalog_version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def get(self, key: Key) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if self.catalog_version is None or entry["catalog_version"] != self.catalog_version:
+                self.stale += 1
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry["response"]
+
+    def put(self, request: Dict[str, Any], response: Dict[str, Any], catalog_version: str) -> bool:
+        """Store the shared form of response (as the HTTP cache keeps it); False when it is not cacheable"""
+        from app.services.http_cache import cacheable_response
+
+        shared = cacheable_response(response)
+        if shared is None:
+            return False
+        key = request_key(**request)
+        with self._lock:
+            self._entries[key] = {
+                "request": request,
+                "response": shared,
+                "catalog_version": catalog_version,
+                "created_at": time.time(),
+            }
+        return True
+
+    def requests(self, stale_only: bool = False) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [entry["request"] for entry in self._entries.values()
+                    if not stale_only or entry["catalog_version"] != self.catalog_version]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "current": sum(1 for entry in self._entries.values()
+                               if entry["catalog_version"] == self.catalog_version),
+                "catalog_version": self.catalog_version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "serve_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def save(self, path: str):
+        """Written to a temp file first so a crash never truncates the store"""
+        with self._lock:
+            data = {"entries": list(self._entries.values())}
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as store_file:
+            json.dump(data, store_file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        logger.info(f"Saved {len(data['entries'])} precomputed responses to {path}")
+
+    def load(self, path: str):
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, encoding="utf-8") as store_file:
+                data = json.load(store_file)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Could not read precomputed responses {path}: {e}")
+            return
+        from app.services.http_cache import cacheable_response
+
+        with self._lock:
+            for entry in data.get("entries", []):
+                # Files written before responses were stored in their shared form still carry usage
+                entry["response"] = cacheable_response(entry["response"])
+                if entry["response"] is not None:
+                    self._entries[request_key(**entry["request"])] = entry
+        logger.info(f"Loaded {len(data.get('entries', []))} precomputed responses from {path}")
+
+
+precomputed_store: Optional[PrecomputedStore] = PrecomputedStore() if settings.PRECOMPUTE_PATH else None
+
+
+def lookup(query: str, limit: int, rerank_limit: int, pipeline: Any, do_rerank: bool) -> Optional[Dict[str, Any]]:
+    """Stored response for this request at the current catalog version, if any"""
+    if precomputed_store is None or getattr(_computing, "active", False):
+        return None
+    return precomputed_store.get(request_key(query, limit, rerank_limit, pipeline, do_rerank))
+
+
+def mine_head_queries(query_logs: Iterable[str] = (), perf_logs: Iterable[str] = (),
+                      top_n: int = 200) -> Tuple[List[Dict[str, Any]], float]:
+    """
+    Most frequent requests across the logs, and the share of logged traffic they cover (the
+    serve ratio to expect). JSONL entries and performance-log summaries keep their parameters
+    (so POST and GET traffic are precomputed as sent); entries without them get DEFAULT_PARAMS.
+    """
+    counts: Counter = Counter()
+    requests: Dict[Key, Dict[str, Any]] = {}
+
+    def count(request: Dict[str, Any]):
+        key = request_key(**request)
+        counts[key] += 1
+        requests.setdefault(key, request)
+
+    for path in query_logs:
+        with open(path, encoding="utf-8") as log_file:
+            for line in log_file:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if isinstance(entry.get("query"), str) and entry["query"].strip():
+                    count(dict({name: entry.get(name, default) for name, default in DEFAULT_PARAMS.items()},
+                               query=entry["query"]))
+    for path in perf_logs:
+        with open(path, encoding="utf-8", errors="replace") as log_file:
+            for line in log_file:
+                match = _SUMMARY_LINE.search(line)
+                if not match:
+                    continue
+                if match.group("limit") is None:
+                    count(dict(DEFAULT_PARAMS, query=match.group("query")))
+                else:
+                    count({
+                        "query": match.group("query"),
+                        "limit": int(match.group("limit")),
+                        "rerank_limit": int(match.group("rerank_limit")),
+                        "pipeline": match.group("pipeline"),
+                        "do_rerank": match.group("do_rerank") == "True",
+                    })
+
+    total = sum(counts.values())
+    head = counts.most_common(top_n)
+    coverage = sum(frequency for _, frequency in head) / total if total else 0.0
+    return [requests[key] for key, _ in head], coverage
+
+
+def _compute(request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    from app.core.models import SearchPipeline
+    from app.services.search_service import process_search_query
+
+    _computing.active = True
+    try:
+        return asyncio.run(process_search_query(
+            query=request["query"], limit=request["limit"], rerank_limit=request["rerank_limit"],
+            pipeline=SearchPipeline(request["pipeline"]), do_rerank=request["do_rerank"], stateful=False,
+        ))
+    except Exception as e:
+        logger.error(f"Precompute failed for '{request['query']}': {e}")
+        return None
+    finally:
+        _computing.active = False
+
+
+def precompute(store: PrecomputedStore, requests: List[Dict[str, Any]], catalog_version: str,
+               concurrency: int = settings.PRECOMPUTE_CONCURRENCY) -> int:
+    """Run the requests through the full pipeline and store the responses; returns the number stored"""
+    start_time = time.time()
+    stored = 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        for request, response in zip(requests, pool.map(_compute, requests)):
+            # Responses without products (LLM failure) are left to the live path
+            if response and response.get("recommended_products") and store.put(request, response, catalog_version):
+                stored += 1
+    logger.info(f"PERFORMANCE: Precompute of {len(requests)} head queries took "
+                f"{(time.time() - start_time) * 1000:.2f}ms, details: stored: {stored}, catalog version: {catalog_version}")
+    return stored
+
+
+def refresh_stale(store: PrecomputedStore, catalog_version: str) -> int:
+    """Adopt a new catalog version and recompute every entry tagged with an older one"""
+    store.catalog_version = catalog_version
+    stale = store.requests(stale_only=True)
+    if not stale:
+        return 0
+    logger.info(f"Catalog version is {catalog_version}; recomputing {len(stale)} precomputed responses")
+    stored = precompute(store, stale, catalog_version)
+    store.save(settings.PRECOMPUTE_PATH)
+    return stored
+
+
+def start_precompute_refresh() -> Optional[threading.Event]:
+    """
+    Load the stored responses and, in a background thread, poll the catalog version every
+    PRECOMPUTE_CHECK_SECONDS, recomputing stale entries when it changes. Returns the stop event.
+    """
+    if precomputed_store is None:
+        return None
+    precomputed_store.load(settings.PRECOMPUTE_PATH)
+    stop = threading.Event()
+
+    def refresh_loop():
+        from app.services.catalog import get_catalogs_version
+        from app.services.search_service import initialize_models
+
+        while True:
+            try:
+                client = initialize_models()[0]
+                if client is not None:
+                    refresh_stale(precomputed_store, get_catalogs_version(client, search_collections()))
+            except Exception as e:
+                logger.error(f"Precompute refresh failed: {e}")
+            if stop.wait(settings.PRECOMPUTE_CHECK_SECONDS):
+                return
+
+    threading.Thread(target=refresh_loop, name="precompute-refresh", daemon=True).start()
+    return stop
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--query-log", action="append", default=[], help="JSONL query log (repeatable)")
+    parser.add_argument("--perf-log", action="append", default=[], help="Application log with PERFORMANCE lines (repeatable)")
+    parser.add_argument("--top", type=int, default=settings.PRECOMPUTE_TOP_N)
+    parser.add_argument("--concurrency", type=int, default=settings.PRECOMPUTE_CONCURRENCY)
+    parser.add_argument("--output", default=settings.PRECOMPUTE_PATH, help="Store path (default: PRECOMPUTE_PATH)")
+    args = parser.parse_args(argv)
+    if not args.output:
+        parser.error("--output or PRECOMPUTE_PATH is required")
+    if not args.query_log and not args.perf_log:
+        parser.error("at least one --query-log or --perf-log is required")
+
+    from app.services.catalog import get_catalogs_version
+    from app.services.search_service import initialize_models
+
+    requests, coverage = mine_head_queries(args.query_log, args.perf_log, args.top)
+    catalog_version = get_catalogs_version(initialize_models()[0], search_collections())
+    store = PrecomputedStore()
+    store.load(args.output)
+    stored = precompute(store, requests, catalog_version, args.concurrency)
+    store.save(args.output)
+    print(f"Precomputed {stored}/{len(requests)} head queries at catalog version {catalog_version}; "
+          f"they cover {coverage:.1%} of logged traffic (expected serve-from-precompute ratio)")
+
+
+if __name__ == "__main__":
+    main()
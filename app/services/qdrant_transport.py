@@ -0,0 +1,107 @@
+"""
+Qdrant transport: client construction and response normalization.
+
+Every Qdrant client of the service (search, typeahead, catalog CLI, and the async client of the
+shard fan-out) is built from the same settings: REST or gRPC (QDRANT_PREFER_GRPC), connection
+pool size, keep-alive and per-call timeouts. query_points responses are normalized into
+SearchHits in one place, whichever transport produced them.
+"""
+import functools
+import inspect
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+import httpx
+from qdrant_client import AsyncQdrantClient, QdrantClient
+
+from app.core.config import settings
+from app.core.results import SearchHit
+
+logger = logging.getLogger("mini_RAG")
+
+_client: Optional[QdrantClient] = None
+_async_client: Optional[AsyncQdrantClient] = None
+_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=1)
+def supports_pool_size() -> bool:
+    """Whether the installed qdrant-client takes pool_size (added after the 1.14 line uv.lock pins)"""
+    return "pool_size" in inspect.signature(QdrantClient.__init__).parameters
+
+
+def client_kwargs(prefer_grpc: Optional[bool] = None) -> Dict[str, Any]:
+    """QdrantClient/AsyncQdrantClient arguments for the configured (or the given) transport"""
+    prefer_grpc = settings.QDRANT_PREFER_GRPC if prefer_grpc is None else prefer_grpc
+    kwargs: Dict[str, Any] = {
+        "url": settings.QDRANT_URL,
+        "prefer_grpc": prefer_grpc,
+        "grpc_port": settings.QDRANT_GRPC_PORT,
+        "timeout": settings.QDRANT_TIMEOUT_SECONDS,
+    }
+    if settings.QDRANT_API_KEY:
+        kwargs["api_key"] = settings.QDRANT_API_KEY
+    if prefer_grpc:
+        kwargs["grpc_options"] = {
+            "grpc.keepalive_time_ms": int(settings.QDRANT_KEEPALIVE_SECONDS * 1000),
+            "grpc.keepalive_timeout_ms": settings.QDRANT_TIMEOUT_SECONDS * 1000,
+            "grpc.keepalive_permit_without_calls": 1,
+            "grpc.http2.max_pings_without_data": 0,
+        }
+    pooled_grpc = prefer_grpc and settings.QDRANT_GRPC_POOL_SIZE > 0
+    if pooled_grpc and not supports_pool_size():
+        logger.warning("QDRANT_GRPC_POOL_SIZE is ignored: the installed qdrant-client has no pool_size; "
+                       "upgrade it to pool gRPC channels")
+        pooled_grpc = False
+    if pooled_grpc:
+        # gRPC channels; the client also caps its REST connections at this size (and rejects `limits`)
+        kwargs["pool_size"] = settings.QDRANT_GRPC_POOL_SIZE
+    else:
+        kwargs["limits"] = httpx.Limits(
+            max_connections=settings.QDRANT_HTTP_POOL_SIZE,
+            max_keepalive_connections=settings.QDRANT_HTTP_POOL_SIZE,
+            keepalive_expiry=settings.QDRANT_KEEPALIVE_SECONDS,
+        )
+    return kwargs
+
+
+def get_client() -> QdrantClient:
+    """Process-wide Qdrant client; thread-safe, so the fan-out and background jobs share its pool"""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = QdrantClient(**client_kwargs())
+    return _client
+
+
+def get_async_client() -> AsyncQdrantClient:
+    """
+    Process-wide async client with the same transport settings. It belongs to the event loop of
+    its first call: sharding.fan_out issues every call from its one loop
+    """
+    global _async_client
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                _async_client = AsyncQdrantClient(**client_kwargs())
+    return _async_client
+
+
+def query_timeout() -> Dict[str, Any]:
+    """Server-side timeout argument for query_points (none unless QDRANT_SEARCH_TIMEOUT_SECONDS is set)"""
+    return {"timeout": settings.QDRANT_SEARCH_TIMEOUT_SECONDS} if settings.QDRANT_SEARCH_TIMEOUT_SECONDS > 0 else {}
+
+
+def response_hits(response: Any) -> List[SearchHit]:
+    """
+    SearchHits of a query_points response. Both transports return a QueryResponse (the client
+    converts gRPC messages); a raw REST body ({"result": {"points": [...]}}) is accepted for
+    callers that bypass the client.
+    """
+    if isinstance(response, dict):
+        result = response.get("result") or {}
+        points = result.get("points", []) if isinstance(result, dict) else result
+        return [SearchHit(point.get("id"), point.get("score", 0.0), point.get("payload")) for point in points]
+    return [SearchHit(point.id, point.score, point.payload) for point in response.points]
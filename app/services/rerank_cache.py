@@ -0,0 +1,124 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger("mini_RAG")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Case-fold, NFKC-normalize and collapse whitespace so trivially different queries share entries"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", query or "")).strip().casefold()
+
+
+def content_hash(document_text: str) -> str:
+    """Short digest of the scored document text; any catalog text change yields a new key"""
+    return hashlib.blake2b((document_text or "").encode("utf-8"), digest_size=16).hexdigest()
+
+
+class RerankScoreCache:
+    """Thread-safe LRU of cross-encoder scores keyed by (normalized query, content hash)"""
+
+    def __init__(self, max_entries: int, model_name: str):
+        self.max_entries = max_entries
+        self.model_name = model_name
+        self._entries: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(query: str, document_text: str) -> Tuple[str, str]:
+        return normalize_query(query), content_hash(document_text)
+
+    def get(self, key: Tuple[str, str]) -> Optional[float]:
+        with self._lock:
+            score = self._entries.get(key)
+            if score is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return score
+
+    def put(self, key: Tuple[str, str], score: float):
+        with self._lock:
+            self._entries[key] = float(score)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def save(self, path: str):
+        """Write entries in LRU order; written to a temp file first so a crash never truncates the cache"""
+        with self._lock:
+            data = {"model": self.model_name, "entries": [[q, h, s] for (q, h), s in self._entries.items()]}
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as cache_file:
+            json.dump(data, cache_file)
+        os.replace(tmp_path, path)
+        logger.info(f"Saved {len(data['entries'])} rerank cache entries to {path}")
+
+    def load(self, path: str):
+        """Restore entries written by save(); files from a different cross-encoder are ignored"""
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, encoding="utf-8") as cache_file:
+                data = json.load(cache_file)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Could not read rerank cache {path}: {e}")
+            return
+        if data.get("model") != self.model_name:
+            logger.info(f"Ignoring rerank cache {path} written for model {data.get('model')}")
+            return
+        for query, digest, score in data.get("entries", [])[-self.max_entries:]:
+            self.put((query, digest), score)
+        logger.info(f"Loaded {len(self._entries)} rerank cache entries from {path}")
+
+
+rerank_score_cache: Optional[RerankScoreCache] = (
+    RerankScoreCache(settings.RERANK_CACHE_MAX_ENTRIES, settings.CROSS_ENCODER_MODEL)
+    if settings.RERANK_CACHE_ENABLED else None
+)
+
+
+def load_rerank_cache():
+    """Restore the persisted cache at startup when RERANK_CACHE_PATH is set"""
+    if rerank_score_cache is not None and settings.RERANK_CACHE_PATH:
+        rerank_score_cache.load(settings.RERANK_CACHE_PATH)
+
+
+def save_rerank_cache():
+    """Persist the cache at shutdown when RERANK_CACHE_PATH is set"""
+    if rerank_score_cache is not None and settings.RERANK_CACHE_PATH:
+        try:
+            rerank_score_cache.save(settings.RERANK_CACHE_PATH)
+        except OSError as e:
+            logger.error(f"Could not save rerank cache to {settings.RERANK_CACHE_PATH}: {e}")
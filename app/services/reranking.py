@@ -0,0 +1,114 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.results import SearchHit
+from app.services import rerank_cache
+
+
+def _normalize(scores) -> np.ndarray:
+    """Min-max scale scores to [0, 1]; a constant list maps to all ones"""
+    scores = np.asarray(scores, dtype=np.float64)
+    if scores.size == 0:
+        return scores
+    spread = scores.max() - scores.min()
+    if spread <= 0:
+        return np.ones_like(scores)
+    return (scores - scores.min()) / spread
+
+
+def _confident_head(stage_one_scores: np.ndarray, top_k: int, margin: float) -> int:
+    """Size of the leading block separated from the next candidate by at least margin (0 if none within top_k)"""
+    for size in range(1, min(top_k, len(stage_one_scores) - 1) + 1):
+        if stage_one_scores[size - 1] - stage_one_scores[size] >= margin:
+            return size
+    return 0
+
+
+def score_pairs(query: str, items: List[SearchHit], cross_encoder_model) -> Tuple[np.ndarray, int]:
+    """
+    Cross-encoder scores for (query, item) pairs, served from the rerank score cache where possible.
+    Returns the scores and the number of pairs that actually went through the model.
+    """
+    cache = rerank_cache.rerank_score_cache
+    if cache is None:
+        return np.asarray(cross_encoder_model.predict([[query, item.rerank_text] for item in items])), len(items)
+
+    scores = np.empty(len(items), dtype=np.float32)
+    keys = [cache.key(query, item.rerank_text) for item in items]
+    missing = []
+    for index, key in enumerate(keys):
+        cached = cache.get(key)
+        if cached is None:
+            missing.append(index)
+        else:
+            scores[index] = cached
+    if missing:
+        predicted = cross_encoder_model.predict([[query, items[index].rerank_text] for index in missing])
+        for index, score in zip(missing, predicted):
+            scores[index] = score
+            cache.put(keys[index], score)
+    return scores, len(missing)
+
+
+def rerank(query: str, items: List[SearchHit], cross_encoder_model) -> Tuple[List[SearchHit], Dict[str, Any]]:
+    """Score every item with the cross-encoder and sort by the new score"""
+    if not items:
+        return [], {"candidates": 0, "cross_encoder_pairs": 0, "cache_hits": 0, "early_exit": False}
+    rerank_scores, predicted = score_pairs(query, items, cross_encoder_model)
+
+    reranked_items = sorted(zip(rerank_scores, items), key=lambda x: x[0], reverse=True)
+    final_results = []
+    for score, item in reranked_items:
+        item.rerank_score = float(score)
+        final_results.append(item)
+    return final_results, {"candidates": len(items), "cross_encoder_pairs": predicted,
+                           "cache_hits": len(items) - predicted, "early_exit": False}
+
+
+def cascade_rerank(query: str, retrieved_docs: List[SearchHit], rerank_limit: int, cross_encoder_model,
+                   first_stage_model: Optional[Any] = None) -> Tuple[List[SearchHit], Dict[str, Any]]:
+    """
+    Rerank the top rerank_limit candidates in stages so the cross-encoder only sees ambiguous ones.
+
+    Stage one scores candidates cheaply: with the retrieval score, min-max scaled over all retrieved
+    documents, or with first_stage_model (a small cross-encoder) when configured. If the leading
+    RERANK_CASCADE_EARLY_EXIT_TOP_K candidates are separated from the rest by at least
+    RERANK_CASCADE_EARLY_EXIT_MARGIN, the stage-one order is returned without running the expensive
+    model. Otherwise candidates scoring below RERANK_CASCADE_PRUNE_BELOW are pruned, at most
+    RERANK_CASCADE_MAX_PAIRS of the remainder are scored by the cross-encoder, and pruned/overflow
+    candidates follow the reranked ones in stage-one order.
+    """
+    candidates = retrieved_docs[:rerank_limit]
+    stats = {"candidates": len(candidates), "first_stage_pairs": 0, "cross_encoder_pairs": 0,
+             "cache_hits": 0, "pruned": 0, "early_exit": False}
+    if not candidates:
+        return [], stats
+
+    if first_stage_model is not None:
+        stage_one = _normalize(first_stage_model.predict([[query, item.rerank_text] for item in candidates]))
+        stats["first_stage_pairs"] = len(candidates)
+    else:
+        stage_one = _normalize([doc.score for doc in retrieved_docs])[:len(candidates)]
+
+    order = np.argsort(-stage_one, kind="stable")
+    ordered = [candidates[i] for i in order]
+    ordered_scores = stage_one[order]
+
+    if _confident_head(ordered_scores, settings.RERANK_CASCADE_EARLY_EXIT_TOP_K, settings.RERANK_CASCADE_EARLY_EXIT_MARGIN):
+        stats["early_exit"] = True
+        return ordered, stats
+
+    keep = ordered_scores >= settings.RERANK_CASCADE_PRUNE_BELOW
+    middle = [item for item, kept in zip(ordered, keep) if kept]
+    tail = [item for item, kept in zip(ordered, keep) if not kept]
+    if settings.RERANK_CASCADE_MAX_PAIRS > 0 and len(middle) > settings.RERANK_CASCADE_MAX_PAIRS:
+        tail = middle[settings.RERANK_CASCADE_MAX_PAIRS:] + tail
+        middle = middle[:settings.RERANK_CASCADE_MAX_PAIRS]
+    stats["pruned"] = len(tail)
+
+    reranked, rerank_stats = rerank(query, middle, cross_encoder_model)
+    stats["cross_encoder_pairs"] = rerank_stats["cross_encoder_pairs"]
+    stats["cache_hits"] = rerank_stats["cache_hits"]
+    return reranked + tail, stats
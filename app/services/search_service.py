@@ -4,18 +4,29 @@ import logging
 import datetime
 import traceback
 import json
+import contextlib
+import contextvars
 from typing import Dict, List, Tuple, Any, Optional
 
 import torch
 import openai
-from qdrant_client import QdrantClient, models
+from qdrant_client import models
 from fastembed import SparseTextEmbedding
 from langchain_openai import OpenAIEmbeddings
 from sentence_transformers import CrossEncoder
 
 from app.core.config import settings
+from app.core import profiling
 from app.core.models import SearchPipeline
-from app.core.prompts import REWRITE_PROMPT, PRODUCT_PROMPT # Import necessary prompts
+from app.core.results import SearchHit
+from app.core.prompts import (  # Import necessary prompts
+    DEFAULT_SYSTEM_PROMPT, PRODUCT_CHAT_PROMPT, PRODUCT_PROMPT, REWRITE_CHAT_PROMPT, REWRITE_PROMPT,
+    REWRITE_MULTI_CHAT_PROMPT, REWRITE_MULTI_PROMPT, ChatPrompt,
+)
+from app.services.catalog import search_payload_fields, truncate_text
+from app.services import pagination, precompute, qdrant_transport, sessions, sharding, usage
+from app.services.reranking import rerank, cascade_rerank
+from app.services.rerank_cache import normalize_query
 
 
 # Set up logging
@@ -37,8 +48,16 @@ bm25_embedding_model = SparseTextEmbedding("Qdrant/bm25", language="german")
 
 # Global variables for clients and models
 qdrant_client = None
+# Async client of the multi-collection fan-out, created on first use
+async_qdrant_client = None
 openai_embeddings = None
 cross_encoder = None
+first_stage_cross_encoder = None
+
+# Per-request stage timings; only populated inside record_stage_timings()
+_stage_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "stage_timings", default=None
+)
 
 def _extract_json_string_from_llm_output(llm_output: Optional[str]) -> Optional[str]:
     """
@@ -74,25 +93,53 @@ def log_performance(operation, query, elapsed_time_ms, details=None):
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
     details_str = f", details: {details}" if details else ""
     logger.info(f"PERFORMANCE: {operation} for '{query}' took {elapsed_time_ms:.2f}ms{details_str}")
+    timings = _stage_timings.get()
+    if timings is not None:
+        timings.append((operation, elapsed_time_ms))
+    profiling.mark_stage(operation, elapsed_time_ms)
+
+
+@contextlib.contextmanager
+def record_stage_timings():
+    """
+    Collect (operation, elapsed_ms) pairs logged by log_performance within this context.
+    The context is copied into tasks started by asyncio.run, so a whole request can be wrapped.
+    """
+    timings: List[Tuple[str, float]] = []
+    token = _stage_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _stage_timings.reset(token)
 
 
-def get_openai_completion(prompt: str, operation_name: str, model: str = settings.LLM_MODEL) -> Optional[str]:
-    """Get completion from OpenAI API and log its performance."""
+def get_openai_completion(prompt: str, operation_name: str, model: str = settings.LLM_MODEL,
+                          temperature: float = 0.7, system_prompt: str = DEFAULT_SYSTEM_PROMPT) -> Optional[str]:
+    """Get completion from OpenAI API, log its performance and record its token usage (including cached prompt tokens)."""
     start_time = time.time()
-    prompt_snippet = (prompt[:70] + '...') if len(prompt) > 70 else prompt # For concise logging
+    # Deterministic mode: greedy decoding with a fixed seed, so cached responses can be reproduced
+    deterministic = {"seed": settings.LLM_SEED} if settings.LLM_DETERMINISTIC else {}
+    if settings.LLM_DETERMINISTIC:
+        temperature = 0.0
+    prompt_snippet = ((prompt[:70] + '...') if len(prompt) > 70 else prompt).replace("\n", " ") # For concise, one-line logging
     try:
         response = client.chat.completions.create(
             model=model,
             messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
+                {"role": "system", "content": system_prompt},
                 {"role": "user", "content": prompt}
             ],
-            temperature=0.7,
+            temperature=temperature,
+            **deterministic,
             # store=True, # This parameter is not standard for openai.ChatCompletion.create
         )
         content = response.choices[0].message.content
         elapsed_ms = (time.time() - start_time) * 1000
-        log_performance(operation_name, prompt_snippet, elapsed_ms, details=f"Model: {model}")
+        call = usage.record_completion(operation_name, model, getattr(response, "usage", None))
+        details = f"Model: {model}"
+        if call is not None:
+            details += f", prompt_tokens: {call['prompt_tokens']}, cached_tokens: {call['cached_tokens']}"
+        log_performance(operation_name, prompt_snippet, elapsed_ms, details=details)
         return content
     except Exception as e:
         elapsed_ms = (time.time() - start_time) * 1000
@@ -101,26 +148,48 @@ def get_openai_completion(prompt: str, operation_name: str, model: str = setting
         return None
 
 
+def load_cross_encoder(model_name: str = settings.CROSS_ENCODER_MODEL) -> CrossEncoder:
+    """Load a cross-encoder (the configured one by default) on GPU if available, otherwise CPU"""
+    logger.info(f"Loading cross-encoder model {model_name}...")
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    return CrossEncoder(
+        model_name, 
+        device=device, 
+        trust_remote_code=True, 
+        activation_fn=torch.nn.Sigmoid()
+    )
+
+
+def get_first_stage_model() -> Optional[CrossEncoder]:
+    """Lazily load the small cascade first-stage cross-encoder, if one is configured"""
+    global first_stage_cross_encoder
+    if settings.RERANK_CASCADE_FIRST_STAGE_MODEL and first_stage_cross_encoder is None:
+        first_stage_cross_encoder = load_cross_encoder(settings.RERANK_CASCADE_FIRST_STAGE_MODEL)
+    return first_stage_cross_encoder
+
+
+def get_async_qdrant_client():
+    """Async Qdrant client for sharding.fan_out, with the transport settings of the sync one"""
+    global async_qdrant_client
+    if async_qdrant_client is None:
+        async_qdrant_client = qdrant_transport.get_async_client()
+    return async_qdrant_client
+
+
 def initialize_models():
     """Initialize Qdrant client and embedding models"""
     global qdrant_client, openai_embeddings, cross_encoder
     if qdrant_client is None or openai_embeddings is None or cross_encoder is None:
         try:
             start_time = time.time()
-            logger.info(f"Connecting to Qdrant at {settings.QDRANT_URL}...")
-            qdrant_client = QdrantClient(url=settings.QDRANT_URL)
+            logger.info(f"Connecting to Qdrant at {settings.QDRANT_URL} "
+                        f"({'gRPC' if settings.QDRANT_PREFER_GRPC else 'REST'})...")
+            qdrant_client = qdrant_transport.get_client()
             
             logger.info(f"Initializing OpenAI embeddings ({settings.OPENAI_EMBEDDING_MODEL})...")
             openai_embeddings = OpenAIEmbeddings(model=settings.OPENAI_EMBEDDING_MODEL)
             
-            logger.info(f"Loading cross-encoder model {settings.CROSS_ENCODER_MODEL}...")
-            device = 'cuda' if torch.cuda.is_available() else 'cpu'
-            cross_encoder = CrossEncoder(
-                settings.CROSS_ENCODER_MODEL, 
-                device=device, 
-                trust_remote_code=True, 
-                activation_fn=torch.nn.Sigmoid()
-            )
+            cross_encoder = load_cross_encoder()
             
             elapsed_ms = (time.time() - start_time) * 1000
             log_performance("Initialization", "models_and_client", elapsed_ms)
@@ -135,8 +204,131 @@ def initialize_models():
     return qdrant_client, openai_embeddings, cross_encoder, None
 
 
-def search_and_rerank(query, limit=50, rerank_limit=10, pipeline="SEMANTIC", do_rerank=True):
-    """Search Qdrant and rerank results using cross-encoder with selectable pipeline"""
+def build_search_params(query_vector, bm25_query, pipeline, limit, prefetch_limit=None,
+                        with_payload=None, collection_name=None) -> Dict[str, Any]:
+    """
+    Build the query_points arguments for a search pipeline.
+    with_payload defaults to the search payload projection; pass True to fetch every field.
+    """
+    if with_payload is None:
+        # Only fetch the payload fields the rerank, prompt and response stages read
+        with_payload = search_payload_fields()
+    collection_name = collection_name or settings.COLLECTION_NAME
+    
+    # Select search parameters based on selected pipeline
+    if pipeline == SearchPipeline.SEMANTIC:
+        # Vanilla Semantic Search
+        search_params = {
+            "collection_name": collection_name,
+            "query": query_vector,
+            "limit": limit,
+            "with_payload": with_payload,
+            "using": "openai_text_embedding_large_v3",
+        }
+        
+    elif pipeline == SearchPipeline.FUSION_RRF:
+        # RRF Fusion Search
+        prefetch = [
+            models.Prefetch(
+                query=query_vector,
+                using="openai_text_embedding_large_v3",
+                limit=prefetch_limit or settings.FUSION_DENSE_PREFETCH_LIMIT,
+            ),
+            models.Prefetch(
+                query=models.SparseVector(**bm25_query.as_object()),
+                using="bm25",
+                limit=prefetch_limit or settings.FUSION_SPARSE_PREFETCH_LIMIT,
+            ),
+        ]
+        search_params = {    
+            "collection_name": collection_name,
+            "query": models.FusionQuery(
+                fusion=models.Fusion.RRF
+            ),
+            "limit": limit,
+            "with_payload": with_payload,
+            "prefetch": prefetch,
+        }
+        
+    elif pipeline == SearchPipeline.BM25_TO_SEMANTIC:
+        # 2-step: BM25 > Semantic Search
+        prefetch = [
+            models.Prefetch(
+                query=models.SparseVector(**bm25_query.as_object()),
+                using="bm25",
+                limit=prefetch_limit or settings.BM25_TO_SEMANTIC_PREFETCH_LIMIT,
+            ),
+        ]
+        search_params = {
+            "prefetch": prefetch,
+            "collection_name": collection_name,
+            "query": query_vector,
+            "limit": limit,
+            "with_payload": with_payload,
+            "using": "openai_text_embedding_large_v3",
+        }
+        
+    elif pipeline == SearchPipeline.SEMANTIC_TO_BM25:
+        # 2-step: Semantic Search > BM25
+        prefetch = [
+            models.Prefetch(
+                query=query_vector,
+                using="openai_text_embedding_large_v3",
+                limit=prefetch_limit or settings.SEMANTIC_TO_BM25_PREFETCH_LIMIT,
+            ),
+        ]
+        search_params = {
+            "prefetch": prefetch,
+            "collection_name": collection_name,
+            "query": models.SparseVector(**bm25_query.as_object()),
+            "limit": limit,
+            "with_payload": with_payload,
+            "using": "bm25",
+        }
+    else:
+        raise ValueError(f"Unknown search pipeline: {pipeline}")
+    search_params.update(qdrant_transport.query_timeout())
+    return search_params
+
+
+def build_query_request(search_params: Dict[str, Any]) -> models.QueryRequest:
+    """query_points arguments as one request of a query_batch_points call"""
+    return models.QueryRequest(**{key: value for key, value in search_params.items()
+                                  if key not in ("collection_name", "timeout")})
+
+
+def build_leg_requests(search_params: Dict[str, Any]) -> List[models.QueryRequest]:
+    """The prefetches of a FUSION_RRF query as standalone requests, whose raw scores merge across shards"""
+    return [
+        models.QueryRequest(query=prefetch.query, using=prefetch.using, limit=prefetch.limit,
+                            with_payload=search_params["with_payload"])
+        for prefetch in search_params["prefetch"]
+    ]
+
+
+def query_variants(query: str, variants: Optional[List[str]]) -> List[str]:
+    """Distinct variants other than the query itself, at most MULTI_QUERY_VARIANTS"""
+    seen = {normalize_query(query)}
+    distinct = []
+    for variant in variants or []:
+        if isinstance(variant, str) and variant.strip() and normalize_query(variant) not in seen:
+            seen.add(normalize_query(variant))
+            distinct.append(variant.strip())
+    return distinct[:settings.MULTI_QUERY_VARIANTS]
+
+
+def search_and_rerank(query, limit=50, rerank_limit=10, pipeline="SEMANTIC", do_rerank=True, prefetch_limit=None,
+                      candidate_limit=None, collections=None, variants=None):
+    """
+    Search Qdrant and rerank results using cross-encoder with selectable pipeline.
+    prefetch_limit overrides the configured prefetch size(s) of the multi-stage pipelines.
+    candidate_limit retrieves that many hits (for later pages); only the first `limit` are reranked,
+    the rest are appended to original_results in retrieval order.
+    collections (default: SEARCH_COLLECTIONS) are searched concurrently and their hits fused.
+    variants are further queries retrieved alongside query: all are embedded in one call and sent
+    as one query_batch_points request per collection, and their hit lists are fused (MULTI_QUERY_FUSION)
+    before reranking against query.
+    """
     if not query:
         return [], [], "Error: Query is required."
     
@@ -152,109 +344,89 @@ def search_and_rerank(query, limit=50, rerank_limit=10, pipeline="SEMANTIC", do_
         
         # Encode query using OpenAI embeddings
         encode_start = time.time()
-        query_vector = embeddings_model.embed_query(query)
-        
-        # Get BM25 vector if needed
-        bm25_query = None
-        if pipeline != SearchPipeline.SEMANTIC:
-            bm25_query = next(bm25_embedding_model.query_embed(query))
+        variants = query_variants(query, variants)
+        if variants:
+            # One embeddings request and one BM25 pass for the query and all its variants
+            queries = [query] + variants
+            query_vectors = embeddings_model.embed_documents(queries)
+            for text in queries:
+                usage.record_embedding("Query encoding", settings.OPENAI_EMBEDDING_MODEL, text)
+            bm25_queries = [None] * len(queries)
+            if pipeline != SearchPipeline.SEMANTIC:
+                bm25_queries = list(bm25_embedding_model.query_embed(queries))
+            query_vector, bm25_query = query_vectors[0], bm25_queries[0]
+        else:
+            query_vector = embeddings_model.embed_query(query)
+            usage.record_embedding("Query encoding", settings.OPENAI_EMBEDDING_MODEL, query)
+            
+            # Get BM25 vector if needed
+            bm25_query = None
+            if pipeline != SearchPipeline.SEMANTIC:
+                bm25_query = next(bm25_embedding_model.query_embed(query))
             
         encode_elapsed = (time.time() - encode_start) * 1000
-        log_performance("Query encoding", query, encode_elapsed)
+        log_performance("Query encoding", query, encode_elapsed, f"variants: {len(variants)}" if variants else None)
         
         # Search in Qdrant
         search_start = time.time()
-        
-        # Select search parameters based on selected pipeline
-        if pipeline == SearchPipeline.SEMANTIC:
-            # Vanilla Semantic Search
-            search_params = {
-                "collection_name": settings.COLLECTION_NAME,
-                "query": query_vector,
-                "limit": limit,
-                "with_payload": True,
-                "using": "openai_text_embedding_large_v3",
-            }
-            
-        elif pipeline == SearchPipeline.FUSION_RRF:
-            # RRF Fusion Search
-            prefetch = [
-                models.Prefetch(
-                    query=query_vector,
-                    using="openai_text_embedding_large_v3",
-                    limit=30,
-                ),
-                models.Prefetch(
-                    query=models.SparseVector(**bm25_query.as_object()),
-                    using="bm25",
-                    limit=30,
-                ),
-            ]
-            search_params = {    
-                "collection_name": settings.COLLECTION_NAME,
-                "query": models.FusionQuery(
-                    fusion=models.Fusion.RRF
-                ),
-                "limit": limit,
-                "with_payload": True,
-                "prefetch": prefetch,
-            }
-            
-        elif pipeline == SearchPipeline.BM25_TO_SEMANTIC:
-            # 2-step: BM25 > Semantic Search
-            prefetch = [
-                models.Prefetch(
-                    query=models.SparseVector(**bm25_query.as_object()),
-                    using="bm25",
-                    limit=50,
-                ),
-            ]
-            search_params = {
-                "prefetch": prefetch,
-                "collection_name": settings.COLLECTION_NAME,
-                "query": query_vector,
-                "limit": limit,
-                "with_payload": True,
-                "using": "openai_text_embedding_large_v3",
-            }
-            
-        elif pipeline == SearchPipeline.SEMANTIC_TO_BM25:
-            # 2-step: Semantic Search > BM25
-            prefetch = [
-                models.Prefetch(
-                    query=query_vector,
-                    using="openai_text_embedding_large_v3",
-                    limit=40,
-                ),
-            ]
-            search_params = {
-                "prefetch": prefetch,
-                "collection_name": settings.COLLECTION_NAME,
-                "query": models.SparseVector(**bm25_query.as_object()),
-                "limit": limit,
-                "with_payload": True,
-                "using": "bm25",
-            }
-            
-        # Get response from Qdrant
-        response = client.query_points(**search_params)
-        
-        # Extract points from the response based on the schema
-        if hasattr(response, 'result') and hasattr(response.result, 'points'):
-            # If it's a structured response object
-            hits = response.result.points
-        elif hasattr(response, 'points'):
-            # If it's the QueryResponse with points attribute
-            hits = response.points
+        fetch_limit = max(limit, candidate_limit or 0)
+        collections = collections or sharding.search_collections()
+        # Shards of one catalog: fetch the RRF legs and fuse them over all shards (sharding.fuse)
+        fuse_legs = (len(collections) > 1 and settings.SHARD_FUSION == "raw"
+                     and pipeline == SearchPipeline.FUSION_RRF and not variants)
+
+        def collection_query(collection_name):
+            """
+            The Qdrant call for one collection as (call, to_hits): call(client) issues it on the
+            sync or the async client (returning the response or a coroutine of it), to_hits
+            converts the response
+            """
+            if variants:
+                # All variants in one round trip, fused per collection
+                requests = [
+                    build_query_request(build_search_params(vector, bm25, pipeline, fetch_limit, prefetch_limit,
+                                                            collection_name=collection_name))
+                    for vector, bm25 in zip(query_vectors, bm25_queries)
+                ]
+
+                def fuse_variants(responses):
+                    variant_hits = [(collection_name, qdrant_transport.response_hits(response)) for response in responses]
+                    return sharding.fuse(variant_hits, fetch_limit, settings.MULTI_QUERY_FUSION)
+
+                return (lambda qdrant: qdrant.query_batch_points(collection_name=collection_name, requests=requests,
+                                                                 **qdrant_transport.query_timeout()),
+                        fuse_variants)
+            search_params = build_search_params(query_vector, bm25_query, pipeline, fetch_limit, prefetch_limit,
+                                                collection_name=collection_name)
+            if fuse_legs:
+                requests = build_leg_requests(search_params)
+                return (lambda qdrant: qdrant.query_batch_points(collection_name=collection_name, requests=requests,
+                                                                 **qdrant_transport.query_timeout()),
+                        lambda responses: sharding.LegHits(
+                            [qdrant_transport.response_hits(response) for response in responses],
+                            [request.limit for request in requests]))
+            return lambda qdrant: qdrant.query_points(**search_params), qdrant_transport.response_hits
+
+        def search_collection(collection_name):
+            call, to_hits = collection_query(collection_name)
+            return to_hits(call(client))
+
+        async def search_shard(collection_name):
+            call, to_hits = collection_query(collection_name)
+            return to_hits(await call(async_client))
+
+        if len(collections) == 1:
+            hits = search_collection(collections[0])
+            search_details = f"pipeline: {pipeline}, hits: {len(hits)}"
         else:
-            # Try treating it as a dictionary (raw JSON response)
-            try:
-                hits = response.get('result', {}).get('points', [])
-            except:
-                logger.error("Couldn't extract points from response")
-                hits = []
+            async_client = get_async_qdrant_client()
+            hits, shard_details = sharding.fan_out(search_shard, collections, fetch_limit)
+            search_details = f"pipeline: {pipeline}, hits: {len(hits)}, {shard_details}"
+        if variants:
+            search_details += f", variants: {len(variants)}"
         
         search_elapsed = (time.time() - search_start) * 1000
+        log_performance("Qdrant search", query, search_elapsed, search_details)
 
         if not hits:
             elapsed_ms = (time.time() - start_time) * 1000
@@ -262,63 +434,30 @@ def search_and_rerank(query, limit=50, rerank_limit=10, pipeline="SEMANTIC", do_
             log_performance("Search", query, elapsed_ms, "No results")
             return [], [], status_message
 
-        # Process retrieved documents
-        retrieved_docs = []
-        for hit in hits:
-            try:
-                # Handle both object-style hits and dictionary-style hits
-                if hasattr(hit, 'payload'):
-                    # It's a structured Point object
-                    point_id = hit.id
-                    score = hit.score
-                    payload = hit.payload
-                elif isinstance(hit, dict):
-                    # It's a dictionary
-                    point_id = hit.get('id', 'unknown')
-                    score = hit.get('score', 0)
-                    payload = hit.get('payload', {})
-                else:
-                    logger.warning(f"Unknown hit type: {type(hit)}")
-                    continue
-                
-                retrieved_docs.append({
-                    'point_id': point_id,
-                    'product_id': payload.get('product_id'),
-                    'score': score,
-                    'title': payload.get('title', 'No Title'),
-                    'url': payload.get('url', 'No URL'),
-                    'page_content': payload.get('page_content', ''),
-                    'thumbnail': payload.get('thumbnail', payload.get('image', 'https://placeholder.com/150')),
-                })
-            except Exception as e:
-                logger.error(f"Error processing hit: {e}")
-                continue
-                
-        original_results = retrieved_docs.copy()
+        extra_candidates = hits[limit:]
+        retrieved_docs = hits[:limit]
+        original_results = retrieved_docs + extra_candidates
         
         # Rerank top results only if do_rerank is True
         rerank_elapsed = 0
-        final_results = original_results # Default to original results if no reranking
+        final_results = retrieved_docs # Default to original results if no reranking
         
         if do_rerank and rerank_limit > 0:
             rerank_start = time.time()
             top_items_for_reranking = retrieved_docs[:rerank_limit]
             
             if top_items_for_reranking:
-                sentence_pairs = [[query, item['page_content']] for item in top_items_for_reranking]
-                rerank_scores = cross_encoder_model.predict(sentence_pairs)
-                
-                # Sort by new scores
-                reranked_items = sorted(zip(rerank_scores, top_items_for_reranking), 
-                                      key=lambda x: x[0], reverse=True)
-                
-                # Update retrieved docs with reranked ones
-                final_results = []
-                for score, item in reranked_items:
-                    item['rerank_score'] = score
-                    final_results.append(item)
+                if settings.RERANK_CASCADE_ENABLED:
+                    final_results, rerank_stats = cascade_rerank(
+                        query, retrieved_docs, rerank_limit, cross_encoder_model, get_first_stage_model()
+                    )
+                else:
+                    final_results, rerank_stats = rerank(query, top_items_for_reranking, cross_encoder_model)
                 
                 rerank_elapsed = (time.time() - rerank_start) * 1000
+                log_performance("Rerank", query, rerank_elapsed, 
+                              f"pairs: {rerank_stats['cross_encoder_pairs']}, cache_hits: {rerank_stats['cache_hits']}, "
+                              f"early_exit: {rerank_stats['early_exit']}")
         
         elapsed_ms = (time.time() - start_time) * 1000
         
@@ -352,25 +491,106 @@ def search_and_rerank(query, limit=50, rerank_limit=10, pipeline="SEMANTIC", do_
         return [], [], status_message
     
 
+def _render_prompt(chat_prompt: ChatPrompt, legacy_template: str, **values) -> Tuple[str, str]:
+    """(system, user) messages in the cache-friendly layout, or the legacy single-template layout"""
+    if settings.PROMPT_CACHE_LAYOUT:
+        return chat_prompt.system, chat_prompt.render_user(**values)
+    return DEFAULT_SYSTEM_PROMPT, legacy_template.format(**values)
+
+
+def _build_product_prompt(question: str, docs: List[SearchHit], slots: Optional[Dict[str, Any]]) -> Tuple[str, str]:
+    """Product prompt (system, user) with one structured block per retrieved product as context"""
+    # Create a structured format for the LLM to parse into JSON
+    structured_docs = []
+    for i, doc in enumerate(docs):
+        doc_id = doc.point_id if doc.point_id is not None else f'product_{i+1}'
+        
+        structured_entry = f"PRODUCT {i+1}:\n" \
+                          f"ID: {doc_id}\n" \
+                          f"PRODUCT_ID: {doc.product_id}\n" \
+                          f"NAME: {doc.title}\n" \
+                          f"URL: {doc.url}\n" \
+                          f"THUMBNAIL: {doc.thumbnail}\n" \
+                          f"CONTENT: {doc.prompt_snippet}...\n"
+        structured_docs.append(structured_entry)
+    # Join the structured documents
+    docs_content = "\n\n" + "\n\n".join(structured_docs)
+    logging.info(f"First Structured document for context {docs_content}...")
+    # need slots to be a JSON string for the prompt
+    slots_json_str = json.dumps(slots if isinstance(slots, dict) else {})
+
+    # Format the prompt with the query and context
+    return _render_prompt(
+        PRODUCT_CHAT_PROMPT, PRODUCT_PROMPT,
+        question=question, context=docs_content, slots_json=slots_json_str, # Pass the JSON string of slots
+    )
+
+
+def ranked_product_list(hits: List[SearchHit], query: str) -> Dict[str, Any]:
+    """Product list in the shape of the product prompt's output, built from the top hits without an LLM call"""
+    top = hits[:settings.BUDGET_CONTEXT_DOCS]
+    return {
+        "response_type": "PRODUCT_LIST",
+        "message_text": f"Top {len(top)} matches for '{query}'.",
+        "products": [
+            {
+                "id": str(hit.point_id),
+                "product_id": str(hit.product_id) if hit.product_id is not None else None,
+                "name": hit.title,
+                "product_url": hit.url,
+                "thumbnail_url": hit.thumbnail,
+                "description": truncate_text(hit.prompt_snippet, settings.PROMPT_SNIPPET_MAX_CHARS),
+            }
+            for hit in top
+        ],
+    }
+
+
 async def process_search_query(query: str, limit: int = 30, rerank_limit: int = 10, 
                         pipeline: SearchPipeline = SearchPipeline.FUSION_RRF,
-                        do_rerank: bool = True) -> Dict[str, Any]:
-    """Process a search query and return results with product recommendations"""
+                        do_rerank: bool = True, stateful: bool = True) -> Dict[str, Any]:
+    """
+    Process a search query and return results with product recommendations. With stateful=False
+    (shared or precomputed responses) no pagination snapshot or session is kept, so no extra
+    candidates are retrieved for them either.
+    """
     overall_process_start_time = time.time()
     logger.info(f"Original User Query: {query}")
+
+    # --- 0. Serve a precomputed head-query response for the current catalog version ---
+    # Precomputed responses carry no next_cursor or session_id, so requests that get one run the pipeline
+    keeps_state = stateful and (pagination.snapshot_store is not None or sessions.session_store is not None)
+    precomputed = None if keeps_state else precompute.lookup(query, limit, rerank_limit, pipeline, do_rerank)
+    if precomputed is not None:
+        log_performance("Precomputed response", query, (time.time() - overall_process_start_time) * 1000)
+        return dict(precomputed)
+
+    # Token accounting; over the per-minute budget the whole request takes the cheaper path
+    request_usage = usage.start_request(pipeline)
+    if usage.minute_budget_exceeded():
+        usage.use_cheap_path(request_usage, "per-minute budget")
     
-    # --- 1. Expand the query using LLM ---
+    # --- 1. Expand the query using LLM (skipped on the cheaper path) ---
     expansion_start_time = time.time()
-    formatted_rewrite_prompt = REWRITE_PROMPT.format(question=query)
-    raw_expanded_query_response_str = get_openai_completion(
-        prompt=formatted_rewrite_prompt,
-        operation_name="OpenAI Query Expansion"
-    )
+    raw_expanded_query_response_str = None
+    if not request_usage.cheap_path:
+        if settings.MULTI_QUERY_ENABLED:
+            rewrite_system_prompt, formatted_rewrite_prompt = _render_prompt(
+                REWRITE_MULTI_CHAT_PROMPT, REWRITE_MULTI_PROMPT, question=query, variants=settings.MULTI_QUERY_VARIANTS,
+            )
+        else:
+            rewrite_system_prompt, formatted_rewrite_prompt = _render_prompt(REWRITE_CHAT_PROMPT, REWRITE_PROMPT, question=query)
+        raw_expanded_query_response_str = get_openai_completion(
+            prompt=formatted_rewrite_prompt,
+            operation_name="OpenAI Query Expansion",
+            system_prompt=rewrite_system_prompt,
+        )
     expansion_duration_ms = (time.time() - expansion_start_time) * 1000
     logger.info(f"Raw Expanded Query Response from LLM: {raw_expanded_query_response_str}")
 
     expanded_query_data = None
     slots = None
+    variants = None
     query_to_use = query # Default to original query
 
     if raw_expanded_query_response_str:
@@ -385,6 +605,9 @@ async def process_search_query(query: str, limit: int = 30, rerank_limit: int =
                 else:
                     logger.warning("No 'improved_query' in parsed LLM expansion or empty. Using original query.")
 
+                if settings.MULTI_QUERY_ENABLED and isinstance(expanded_query_data.get("query_variants"), list):
+                    variants = query_variants(query_to_use, expanded_query_data["query_variants"])
+
                 extracted_slots = expanded_query_data.get("slots")
                 if isinstance(extracted_slots, dict):
                     slots = extracted_slots
@@ -399,61 +622,51 @@ async def process_search_query(query: str, limit: int = 30, rerank_limit: int =
                 logger.error(f"Unexpected error processing expanded query response: {e}. Cleaned string: '{cleaned_json_for_expansion}'. Raw response: '{raw_expanded_query_response_str}'")
         else:
             logger.warning("Query expansion response was empty after cleaning. Using original query.")
-    else:
+    elif not request_usage.cheap_path:
         logger.warning("OpenAI Query Expansion returned no response. Using original query.")
     
     logger.info(f"Using query for search: {query_to_use}")
     logger.info(f"Slots extracted: {slots if slots else 'None'}")
     # --- 2. Search and rerank ---
     search_rerank_start_time = time.time()
+    store = pagination.snapshot_store if stateful else None
+    session_store = sessions.session_store if stateful else None
+    candidate_limit = max(settings.PAGINATION_CANDIDATE_LIMIT if store is not None else 0,
+                          settings.SESSION_CANDIDATE_LIMIT if session_store is not None else 0)
     original_results, final_results, status_message = search_and_rerank(
-        query_to_use, limit, rerank_limit, pipeline, do_rerank
+        query_to_use, limit, rerank_limit, pipeline, do_rerank,
+        candidate_limit=candidate_limit or None,
+        collections=sharding.route(slots),
+        variants=variants,
     )
     search_rerank_duration_ms = (time.time() - search_rerank_start_time) * 1000
     
     # # Use the returned reranked results instead of original ones for better context
     # retrieved_docs = final_results[:rerank_limit] if final_results else []
     # Use original search results for context
-    retrieved_docs = original_results[:10] if original_results else [] # Testing with top 10 results with reranking for context
+    context_size = settings.BUDGET_CONTEXT_DOCS if request_usage.cheap_path else min(limit, 10)
+    retrieved_docs = original_results[:context_size] if original_results else [] # Testing with top 10 results with reranking for context
     # logging.info(f"Retrieved {retrieved_docs[0]} as first item out of {len(retrieved_docs)} for context.")
     products_json = None
+    raw_product_json_response = None
     json_gen_duration_ms = 0  # Initialize in case this step is skipped
-    if retrieved_docs:
-        # Create a structured format for the LLM to parse into JSON
-        structured_docs = []
-        for i, doc in enumerate(retrieved_docs):
-            doc_id = doc.get('point_id', f'product_{i+1}')
-            product_id = doc.get('product_id')
-            title = doc.get('title', 'No Title')
-            url = doc.get('url', 'No URL')
-            thumbnail = doc.get('thumbnail', doc.get('image', 'https://placeholder.com/150'))
-            
-            structured_entry = f"PRODUCT {i+1}:\n" \
-                              f"ID: {doc_id}\n" \
-                              f"PRODUCT_ID: {product_id}\n" \
-                              f"NAME: {title}\n" \
-                              f"URL: {url}\n" \
-                              f"THUMBNAIL: {thumbnail}\n" \
-                              f"CONTENT: {doc.get('page_content', '')}...\n"
-            structured_docs.append(structured_entry)
-        # logging.info(f"Structured Documents for LLM: {structured_docs}")
-        # Join the structured documents
-        docs_content = "\n\n" + "\n\n".join(structured_docs)
-        logging.info(f"First Structured document for context {docs_content}...")
-        # need slots to be a JSON string for the prompt
-        slots_json_str = json.dumps(slots if isinstance(slots, dict) else {})
-
-        # Format the prompt with the query and context
-        formatted_prompt = PRODUCT_PROMPT.format(
-            question=query_to_use, context=docs_content, slots_json=slots_json_str, # Pass the JSON string of slots
-
-        )
-        
+    if retrieved_docs and not request_usage.cheap_path:
+        product_system_prompt, formatted_prompt = _build_product_prompt(query_to_use, retrieved_docs, slots)
+        # Over the per-request budget, skip product generation before spending more tokens
+        if settings.TOKEN_BUDGET_PER_REQUEST and usage.request_budget_exceeded(
+                request_usage, usage.count_tokens(product_system_prompt + formatted_prompt, settings.LLM_MODEL)):
+            usage.use_cheap_path(request_usage, "per-request budget")
+            retrieved_docs = retrieved_docs[:settings.BUDGET_CONTEXT_DOCS]
+    if retrieved_docs and request_usage.cheap_path:
+        # The cheaper path makes no product LLM call: the top hits in reranked order, deterministically
+        products_json = ranked_product_list(final_results or original_results, query_to_use)
+    elif retrieved_docs:
         # --- 3. Get the structured response using get_openai_completion ---
         json_gen_start_time = time.time()
         raw_product_json_response = get_openai_completion(
             prompt=formatted_prompt,
-            operation_name="OpenAI Product JSON Generation"
+            operation_name="OpenAI Product JSON Generation",
+            system_prompt=product_system_prompt,
         )
         json_gen_duration_ms = (time.time() - json_gen_start_time) * 1000
         
@@ -469,24 +682,183 @@ async def process_search_query(query: str, limit: int = 30, rerank_limit: int =
                     logger.error(f"Error parsing JSON response for products: {e}. Cleaned string: '{cleaned_json_for_products}'. Raw response: '{raw_product_json_response}'")
             else:
                 logger.error("Product JSON response was empty after cleaning.")
-    else:
+    elif products_json is None:
             logger.error("OpenAI Product JSON Generation returned no response.")
             
+    # Snapshot the candidates so later pages skip expansion, embedding and retrieval
+    next_cursor = None
+    candidates = pagination.order_candidates(retrieved_docs, original_results or [], final_results or [])
+    if store is not None and len(candidates) > len(retrieved_docs):
+        snapshot_id = store.put(pagination.SearchSnapshot(
+            query, query_to_use, slots, pipeline, do_rerank, candidates,
+        ))
+        next_cursor = pagination.encode_cursor(snapshot_id, len(retrieved_docs))
+    # Keep slots and candidates for follow-up refinements (POST /search/refine)
+    session_id = None
+    if session_store is not None and candidates:
+        session_id = session_store.put(sessions.SearchSession(
+            query, query_to_use, slots, pipeline, do_rerank, limit, rerank_limit, candidates,
+        ))
+
     # Construct the API response
     response = {
         "original_query": query,
         "expanded_query": query_to_use if query_to_use != query else None,
+        "query_variants": variants if variants else None,
         "extracted_slots": slots if slots else None,
         "status_message": status_message,
-        "recommended_products": products_json
+        "recommended_products": products_json,
+        "next_cursor": next_cursor,
+        "session_id": session_id,
     }
+    if settings.USAGE_IN_RESPONSE:
+        response["usage"] = request_usage.summary()
 
     total_process_duration_ms = (time.time() - overall_process_start_time) * 1000
     logger.info(
-        f"PERFORMANCE SUMMARY for '{query}': \n"
+        f"PERFORMANCE SUMMARY for '{query}' (limit: {limit}, rerank_limit: {rerank_limit}, "
+        f"pipeline: {getattr(pipeline, 'value', pipeline)}, do_rerank: {do_rerank}): \n"
         f"  Total process time: {total_process_duration_ms:.2f}ms\n"
         f"  Query Expansion: {expansion_duration_ms:.2f}ms\n"
         f"  Search & Rerank: {search_rerank_duration_ms:.2f}ms\n"
         f"  Product JSON Generation: {json_gen_duration_ms:.2f}ms"
     )
-    return response
\ No newline at end of file
+    return response
+
+
+async def fetch_search_page(cursor: str, limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Serve the next page of an earlier search from its snapshot; returns None when the cursor is
+    unknown or expired. Makes no LLM, embedding or Qdrant calls; hits that were not reranked yet
+    are reranked within the page window when the original search reranked.
+    """
+    start_time = time.time()
+    store = pagination.snapshot_store
+    decoded = pagination.decode_cursor(cursor)
+    if store is None or decoded is None:
+        return None
+    snapshot_id, offset = decoded
+    snapshot = store.get(snapshot_id)
+    if snapshot is None:
+        return None
+    limit = limit or settings.PAGINATION_PAGE_SIZE
+
+    rerank_elapsed = 0
+    with snapshot.lock:
+        window = snapshot.candidates[offset:offset + limit]
+        pending = [index for index, hit in enumerate(window) if hit.rerank_score is None]
+        if snapshot.do_rerank and pending:
+            rerank_start = time.time()
+            _, _, cross_encoder_model, _ = initialize_models()
+            first = pending[0]
+            reranked, rerank_stats = rerank(snapshot.query, window[first:], cross_encoder_model)
+            snapshot.candidates[offset + first:offset + len(window)] = reranked
+            window = snapshot.candidates[offset:offset + limit]
+            rerank_elapsed = (time.time() - rerank_start) * 1000
+            log_performance("Page rerank", snapshot.query, rerank_elapsed,
+                            f"pairs: {rerank_stats['cross_encoder_pairs']}, cache_hits: {rerank_stats['cache_hits']}")
+
+    end = offset + len(window)
+    elapsed_ms = (time.time() - start_time) * 1000
+    log_performance("Search page", snapshot.query, elapsed_ms, f"offset: {offset}, results: {len(window)}")
+    return {
+        "original_query": snapshot.original_query,
+        "expanded_query": snapshot.query if snapshot.query != snapshot.original_query else None,
+        "extracted_slots": snapshot.slots if snapshot.slots else None,
+        "status_message": (f"Results {offset + 1}-{end} of {len(snapshot.candidates)}. "
+                           f"⏱️ [Rerank: {rerank_elapsed:.1f}ms, Total: {elapsed_ms:.1f}ms]"),
+        "results": window,
+        "next_cursor": pagination.encode_cursor(snapshot_id, end) if end < len(snapshot.candidates) else None,
+    }
+
+
+def _hit_identity(hit: SearchHit) -> Any:
+    return hit.product_id if hit.product_id is not None else hit.point_id
+
+
+async def refine_search(session_id: str, refinement: Optional[str] = None, slots_delta: Optional[Dict[str, Any]] = None,
+                        limit: Optional[int] = None, generate_products: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Apply a follow-up ("cheaper", "in schwarz", "von Logitech") or an explicit slot delta to the
+    candidates of an earlier search; returns None when the session is unknown or expired.
+    The stored candidates are filtered and reordered locally; Qdrant is searched again, with the
+    refinement appended to the query, only when fewer than SESSION_MIN_CANDIDATES remain. No query
+    expansion is made, and product generation only with generate_products.
+    """
+    start_time = time.time()
+    store = sessions.session_store
+    session = store.get(session_id) if store is not None else None
+    if session is None:
+        return None
+
+    with session.lock:
+        limit = limit or session.limit
+        delta = sessions.parse_refinement(refinement, session.candidates) if refinement else {}
+        delta = sessions.resolve_price(sessions.merge_slots(delta, slots_delta or {}), session.candidates)
+        refined = sessions.filter_candidates(session.candidates, delta)
+        source = "local"
+        collections = sharding.route(sessions.merge_slots(session.slots, delta))
+        if refined is None or len(refined) < settings.SESSION_MIN_CANDIDATES:
+            source = "qdrant"
+            refined_query = f"{session.query} {refinement or sessions.delta_text(delta)}".strip()
+            original_results, final_results, _ = search_and_rerank(
+                refined_query, session.limit, session.rerank_limit, session.pipeline, session.do_rerank,
+                candidate_limit=settings.SESSION_CANDIDATE_LIMIT, collections=collections,
+            )
+            fresh = pagination.order_candidates([], original_results, final_results)
+            # Constraints of earlier refinements hold for the new candidates too
+            constraints = sessions.merge_slots(session.constraints, delta)
+            filtered = sessions.filter_candidates(fresh, constraints)
+            if filtered is None:
+                # No prices to check the cap against; brand, color and the other constraints still apply
+                filtered = sessions.filter_candidates(fresh, sessions.without_price(constraints))
+            # Survivors of the local pass stay on top, topped up from the new search
+            kept = refined or []
+            seen = {_hit_identity(hit) for hit in kept}
+            refined = kept + [hit for hit in filtered if _hit_identity(hit) not in seen]
+            session.query = refined_query
+            question = refined_query
+        else:
+            question = f"{session.query} {refinement or sessions.delta_text(delta)}".strip()
+        session.apply(delta, refined)
+        slots = session.slots
+        query_to_use = session.query
+        results = refined[:limit]
+
+    products_json = None
+    if generate_products and results:
+        product_system_prompt, formatted_prompt = _build_product_prompt(question, results[:min(limit, 10)], slots)
+        raw_product_json_response = get_openai_completion(
+            prompt=formatted_prompt,
+            operation_name="OpenAI Product JSON Generation",
+            system_prompt=product_system_prompt,
+        )
+        cleaned_json_for_products = _extract_json_string_from_llm_output(raw_product_json_response)
+        if cleaned_json_for_products:
+            try:
+                products_json = json.loads(cleaned_json_for_products)
+            except json.JSONDecodeError as e:
+                logger.error(f"Error parsing JSON response for refined products: {e}. Raw response: '{raw_product_json_response}'")
+
+    # Upstream calls a fresh search would have made (expansion, encoding, searches, product
+    # generation) minus the ones this refinement made
+    fresh_calls = 3 + len(collections)
+    made_calls = (1 + len(collections) if source == "qdrant" else 0) + (1 if generate_products and results else 0)
+    store.record_refinement(source, fresh_calls - made_calls)
+
+    elapsed_ms = (time.time() - start_time) * 1000
+    log_performance("Refine search", refinement or sessions.delta_text(delta), elapsed_ms,
+                    f"source: {source}, candidates: {len(refined)}, delta: {json.dumps(delta, ensure_ascii=False)}")
+    return {
+        "session_id": session_id,
+        "original_query": session.original_query,
+        "refinement": refinement,
+        "expanded_query": query_to_use if query_to_use != session.original_query else None,
+        "extracted_slots": slots if slots else None,
+        "applied_delta": delta,
+        "source": source,
+        "status_message": (f"{len(refined)} candidates after refinement ({source}). "
+                           f"⏱️ [Total: {elapsed_ms:.1f}ms]"),
+        "results": results,
+        "recommended_products": products_json,
+    }
@@ -0,0 +1,344 @@
+"""
+Search sessions for follow-up refinements ("cheaper", "in black", "von Logitech").
+
+A search keeps its slots and ordered candidates server-side under a session id. A refinement
+is parsed into a slot delta and applied to the stored candidates: brand, category, colour,
+attribute values and price caps filter them, the remaining words move candidates that mention
+them up, and the previous order breaks ties. Only when fewer than SESSION_MIN_CANDIDATES
+survive, or the delta cannot be checked against the payload (no prices), does the refinement
+go back to Qdrant. Sessions expire SESSION_TTL_SECONDS after their last use and the store
+holds at most SESSION_MAX_SESSIONS of them, each with at most SESSION_CANDIDATE_LIMIT hits.
+"""
+import re
+import secrets
+import statistics
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.results import SearchHit
+from app.services.typeahead import normalize_term
+
+# Canonical colour -> spellings, normalized like normalize_term (umlauts folded, ß as ss)
+COLORS = {
+    "schwarz": ("schwarz", "black"),
+    "weiss": ("weiss", "white"),
+    "grau": ("grau", "grey", "gray", "anthrazit"),
+    "silber": ("silber", "silver"),
+    "rot": ("rot", "red"),
+    "blau": ("blau", "blue"),
+    "gruen": ("gruen", "green"),
+    "gelb": ("gelb", "yellow"),
+    "rosa": ("rosa", "pink"),
+    "gold": ("gold",),
+}
+_COLOR_WORDS = {word: color for color, words in COLORS.items() for word in words}
+
+CHEAPER_WORDS = {"cheaper", "cheap", "cheapest", "budget", "guenstiger", "guenstig", "guenstigste",
+                 "billiger", "billig", "preiswerter", "preiswert"}
+
+# Number + unit -> attribute slot
+UNITS = {"gb": "capacity", "tb": "capacity", "mah": "capacity", "hz": "refresh_rate", "mhz": "speed",
+         "zoll": "size", "dpi": "resolution", "w": "power", "ms": "response_time"}
+
+STOPWORDS = {
+    "a", "an", "and", "the", "in", "with", "only", "please", "show", "me", "something", "more", "but", "also",
+    "rather", "instead", "for", "color", "colour", "price", "from", "by", "under", "below", "less", "than",
+    "max", "one", "ones", "mit", "und", "der", "die", "das", "ein", "eine", "einen", "nur", "bitte", "zeig",
+    "zeige", "mir", "etwas", "mehr", "aber", "auch", "lieber", "stattdessen", "fuer", "farbe", "preis", "von",
+    "vom", "unter", "bis", "maximal", "eur", "euro", "als",
+}
+
+_PRICE_CAP = re.compile(r"\b(?:under|below|less than|max|maximal|unter|bis)\s+(\d+)(?:\s+(?:euro|eur))?\b")
+_UNIT_PATTERN = "|".join(sorted(UNITS, key=len, reverse=True))
+_QUANTITY = re.compile(r"\b(\d+)\s?(" + _UNIT_PATTERN + r")\b")
+_SPACED_QUANTITY = re.compile(r"\b(\d+) (?=(?:" + _UNIT_PATTERN + r")\b)")
+_BRAND_PREFIX = re.compile(r"\b(?:from|by|von|vom)\s+([\w\-]+)", re.IGNORECASE)
+
+
+def _color_of(word: str) -> Optional[str]:
+    """Canonical colour of a word, allowing German adjective endings (schwarze, weissen)"""
+    for stem in (word, word[:-1], word[:-2]):
+        if stem in _COLOR_WORDS:
+            return _COLOR_WORDS[stem]
+    return None
+
+
+def _compact(text: str) -> str:
+    """Normalized text with numbers joined to their unit ("16 gb" -> "16gb")"""
+    return _SPACED_QUANTITY.sub(r"\1", normalize_term(text))
+
+
+def _known_values(candidates: List[SearchHit], field: str) -> Dict[str, str]:
+    values = {}
+    for hit in candidates:
+        value = hit.get(field)
+        if isinstance(value, str) and value.strip():
+            values.setdefault(normalize_term(value), value)
+    return values
+
+
+def parse_refinement(text: str, candidates: List[SearchHit]) -> Dict[str, Any]:
+    """
+    Slot delta of a free-text refinement. Brands and categories are recognized when they occur
+    in the candidates' payloads (or after "from"/"von" for brands); colours, price wishes and
+    number+unit attributes from fixed vocabularies. Remaining words become other_keywords.
+    """
+    normalized = _compact(text)
+    padded = f" {normalized} "
+    consumed = set()
+    delta: Dict[str, Any] = {}
+    attributes: Dict[str, str] = {}
+
+    for field in ("brand", "category"):
+        # Longest first, so "gaming maus" wins over "maus"
+        for key, value in sorted(_known_values(candidates, field).items(), key=lambda item: -len(item[0])):
+            if key and f" {key} " in padded:
+                delta[field] = value
+                consumed.update(key.split())
+                break
+    if "brand" not in delta:
+        match = _BRAND_PREFIX.search(text)
+        if match:
+            delta["brand"] = match.group(1)
+            consumed.update(normalize_term(match.group(1)).split())
+
+    match = _PRICE_CAP.search(normalized)
+    if match:
+        delta["max_price"] = float(match.group(1))
+        delta["price_indication"] = f"max {match.group(1)}"
+        consumed.update(match.group(0).split())
+    for word in normalized.split():
+        if word in CHEAPER_WORDS and "price_indication" not in delta:
+            delta["price_indication"] = "cheaper"
+            consumed.add(word)
+        color = _color_of(word)
+        if color is not None:
+            attributes["color"] = color
+            consumed.add(word)
+    for number, unit in _QUANTITY.findall(normalized):
+        attributes[UNITS[unit]] = f"{number}{unit}"
+        consumed.add(f"{number}{unit}")
+
+    if attributes:
+        delta["attributes"] = attributes
+    keywords = [word for word in normalized.split()
+                if word not in consumed and word not in STOPWORDS and word not in CHEAPER_WORDS and len(word) > 1]
+    if keywords:
+        delta["other_keywords"] = keywords
+    return delta
+
+
+def merge_slots(slots: Optional[Dict[str, Any]], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Slots with a delta applied: scalar slots are replaced, attributes updated, keywords appended"""
+    merged = dict(slots or {})
+    for key, value in delta.items():
+        if key == "attributes":
+            merged["attributes"] = {**(merged.get("attributes") or {}), **value}
+        elif key == "other_keywords":
+            existing = list(merged.get("other_keywords") or [])
+            merged["other_keywords"] = existing + [word for word in value if word not in existing]
+        elif value is not None:
+            merged[key] = value
+    return merged
+
+
+def _price(hit: SearchHit) -> Optional[float]:
+    try:
+        return float(hit.get("price"))
+    except (TypeError, ValueError):
+        return None
+
+
+def resolve_price(delta: Dict[str, Any], candidates: List[SearchHit]) -> Dict[str, Any]:
+    """
+    Turn "cheaper" into a concrete max_price: the highest price below the median of the priced
+    candidates. The cap then also holds for candidates fetched later in the session.
+    """
+    if delta.get("price_indication") != "cheaper" or "max_price" in delta:
+        return delta
+    prices = [price for price in (_price(hit) for hit in candidates) if price is not None]
+    if not prices:
+        return delta
+    median = statistics.median(prices)
+    below = [price for price in prices if price < median]
+    return dict(delta, max_price=max(below)) if below else delta
+
+
+def without_price(delta: Dict[str, Any]) -> Dict[str, Any]:
+    """The delta's non-price constraints, for candidates whose prices cannot be checked"""
+    return {key: value for key, value in delta.items() if key not in ("max_price", "price_indication")}
+
+
+def _matches_value(hit: SearchHit, text: str, field: str, wanted: str) -> bool:
+    """Payload field equal to the wanted value, or the value mentioned in the hit text when the field is absent"""
+    wanted = normalize_term(wanted)
+    value = hit.get(field)
+    if isinstance(value, str) and value.strip():
+        return normalize_term(value) == wanted
+    return f" {wanted} " in text
+
+
+def _matches_color(hit: SearchHit, text: str, color: str) -> bool:
+    value = hit.get("color")
+    if isinstance(value, str) and value.strip():
+        return _color_of(normalize_term(value)) == color
+    return any(f" {word} " in text for word in COLORS.get(color, (color,)))
+
+
+def filter_candidates(candidates: List[SearchHit], delta: Dict[str, Any]) -> Optional[List[SearchHit]]:
+    """
+    Candidates satisfying the hard constraints of a (price-resolved) delta, candidates mentioning
+    more of its keywords first. None when a price constraint cannot be checked because no
+    candidate carries a price, or "cheaper" could not be resolved to a cap.
+    """
+    max_price = delta.get("max_price")
+    if (max_price is not None or delta.get("price_indication") == "cheaper") and (
+            max_price is None or all(_price(hit) is None for hit in candidates)):
+        return None
+    attributes = {key: value for key, value in (delta.get("attributes") or {}).items() if value}
+    keywords = [normalize_term(word) for word in delta.get("other_keywords") or []]
+
+    kept = []
+    for rank, hit in enumerate(candidates):
+        text = f" {_compact(' '.join([hit.title, hit.prompt_snippet]))} "
+        if delta.get("brand") and not _matches_value(hit, text, "brand", delta["brand"]):
+            continue
+        if delta.get("category") and not _matches_value(hit, text, "category", delta["category"]):
+            continue
+        if "color" in attributes and not _matches_color(hit, text, attributes["color"]):
+            continue
+        if any(f" {_compact(str(value))} " not in text for key, value in attributes.items() if key != "color"):
+            continue
+        if max_price is not None:
+            price = _price(hit)
+            if price is None or price > max_price:
+                continue
+        mentioned = sum(1 for word in keywords if word and f" {word} " in text)
+        kept.append((-mentioned, rank, hit))
+    return [hit for _, _, hit in sorted(kept, key=lambda item: item[:2])]
+
+
+def delta_text(delta: Dict[str, Any]) -> str:
+    """Query words of a delta, for the Qdrant fallback of a refinement given only as slots"""
+    words = [delta.get("brand"), delta.get("category"), delta.get("price_indication")]
+    words += list((delta.get("attributes") or {}).values()) + list(delta.get("other_keywords") or [])
+    return " ".join(str(word) for word in words if word)
+
+
+class SearchSession:
+    """Slots, constraints and ordered candidates of one search and its refinements so far"""
+
+    __slots__ = ("original_query", "query", "slots", "constraints", "pipeline", "do_rerank", "limit",
+                 "rerank_limit", "candidates", "refinements", "last_used", "lock")
+
+    def __init__(self, original_query: str, query: str, slots: Optional[Dict[str, Any]], pipeline: str,
+                 do_rerank: bool, limit: int, rerank_limit: int, candidates: List[SearchHit]):
+        self.original_query = original_query
+        self.query = query
+        self.slots = slots
+        # Accumulated refinement deltas; re-applied to candidates fetched from Qdrant
+        self.constraints: Dict[str, Any] = {}
+        self.pipeline = pipeline
+        self.do_rerank = do_rerank
+        self.limit = limit
+        self.rerank_limit = rerank_limit
+        self.candidates = candidates[:settings.SESSION_CANDIDATE_LIMIT]
+        self.refinements = 0
+        self.last_used = time.time()
+        # Serializes refinements of the same session
+        self.lock = threading.Lock()
+
+    def apply(self, delta: Dict[str, Any], candidates: List[SearchHit]):
+        self.constraints = merge_slots(self.constraints, delta)
+        self.slots = merge_slots(self.slots, delta)
+        self.candidates = candidates[:settings.SESSION_CANDIDATE_LIMIT]
+        self.refinements += 1
+
+
+class SessionStore:
+    """Thread-safe LRU of search sessions with a sliding TTL"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, SearchSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.local_refinements = 0
+        self.qdrant_refinements = 0
+        self.upstream_calls_saved = 0
+
+    def _expire(self, now: float):
+        # Every get moves a session to the end, so the least recently used are first
+        while self._entries:
+            session_id, session = next(iter(self._entries.items()))
+            if now - session.last_used < self.ttl_seconds:
+                break
+            del self._entries[session_id]
+            self.expired += 1
+
+    def put(self, session: SearchSession) -> str:
+        session_id = secrets.token_urlsafe(12)
+        with self._lock:
+            self._expire(time.time())
+            self._entries[session_id] = session
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return session_id
+
+    def get(self, session_id: str) -> Optional[SearchSession]:
+        now = time.time()
+        with self._lock:
+            session = self._entries.get(session_id)
+            if session is not None and now - session.last_used >= self.ttl_seconds:
+                del self._entries[session_id]
+                self.expired += 1
+                session = None
+            if session is None:
+                self.misses += 1
+                return None
+            session.last_used = now
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            return session
+
+    def record_refinement(self, source: str, upstream_calls_saved: int):
+        with self._lock:
+            if source == "local":
+                self.local_refinements += 1
+            else:
+                self.qdrant_refinements += 1
+            self.upstream_calls_saved += upstream_calls_saved
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "candidates": sum(len(session.candidates) for session in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "local_refinements": self.local_refinements,
+                "qdrant_refinements": self.qdrant_refinements,
+                "upstream_calls_saved": self.upstream_calls_saved,
+            }
+
+
+session_store: Optional[SessionStore] = (
+    SessionStore(settings.SESSION_MAX_SESSIONS, settings.SESSION_TTL_SECONDS)
+    if settings.SESSIONS_ENABLED else None
+)
@@ -0,0 +1,241 @@
+"""
+Fan-out search across several Qdrant collections (regional and partner catalogs, or shards of
+one large catalog).
+
+SEARCH_COLLECTIONS lists the collections a query goes to (default: COLLECTION_NAME alone), and
+SHARD_ROUTING_JSON narrows that set by the category slot of the expanded query. Every selected
+collection is queried concurrently with the same pipeline, through the async Qdrant client on one
+background event loop; a shard that has not answered within SHARD_TIMEOUT_MS is cancelled (its
+request aborted) and dropped instead of stalling the request. The per-shard hit lists are merged
+before reranking (SHARD_FUSION):
+
+- "raw" (default) ranks by the raw scores, which are comparable between shards of one catalog
+  (same embedding model and field statistics). FUSION_RRF shards return their dense and sparse
+  legs instead, which are merged by raw score and then fused with Qdrant's RRF, so the ranking
+  matches a single collection.
+- "rrf" and "score" (min-max normalized scores) are for heterogeneous catalogs, whose scores do
+  not compare. Over shards of one catalog, rrf only interleaves the shards by rank.
+"""
+import asyncio
+import functools
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from app.core.config import settings
+from app.core.results import SearchHit
+
+logger = logging.getLogger("mini_RAG")
+
+FUSION_METHODS = ("raw", "rrf", "score")
+
+# Rank constant of Qdrant's RRF, for the FUSION_RRF legs fused here (SHARD_RRF_K is for rrf over shards)
+QDRANT_RRF_K = 2
+
+
+class LegHits:
+    """Per-leg hit lists of one collection for a FUSION_RRF query, and each leg's prefetch limit"""
+
+    __slots__ = ("legs", "limits")
+
+    def __init__(self, legs: List[List[SearchHit]], limits: List[int]):
+        self.legs = legs
+        self.limits = limits
+
+    def __len__(self) -> int:
+        return sum(len(leg) for leg in self.legs)
+
+
+def search_collections() -> List[str]:
+    names = [name.strip() for name in settings.SEARCH_COLLECTIONS.split(",") if name.strip()]
+    return names or [settings.COLLECTION_NAME]
+
+
+@functools.lru_cache(maxsize=1)
+def _routing() -> Dict[str, List[str]]:
+    if not settings.SHARD_ROUTING_JSON:
+        return {}
+    return {category.strip().lower(): list(names) for category, names in json.loads(settings.SHARD_ROUTING_JSON).items()}
+
+
+def route(slots: Optional[Dict[str, Any]]) -> List[str]:
+    """Collections for a query: the routed ones for its category slot, else all of SEARCH_COLLECTIONS"""
+    category = (slots or {}).get("category")
+    if isinstance(category, str):
+        routed = _routing().get(category.strip().lower())
+        if routed:
+            return routed
+    return search_collections()
+
+
+def hit_key(collection_name: str, hit: SearchHit) -> Any:
+    """Identity of a hit across collections: the product id, or the point id within its collection"""
+    return hit.product_id if hit.product_id is not None else (collection_name, hit.point_id)
+
+
+def _raw_ranking(hit_lists: List[Tuple[str, List[SearchHit]]], limit: int) -> List[Tuple[Any, SearchHit]]:
+    """(key, hit) of several lists by descending raw score, each product once at its best score"""
+    best: Dict[Any, SearchHit] = {}
+    for collection_name, hits in hit_lists:
+        for hit in hits:
+            key = hit_key(collection_name, hit)
+            if key not in best or hit.score > best[key].score:
+                best[key] = hit
+    return sorted(best.items(), key=lambda item: -item[1].score)[:limit]
+
+
+def _fuse_legs(shard_legs: List[Tuple[str, LegHits]], limit: int) -> List[SearchHit]:
+    """Merge every leg across shards by raw score, cut it to its prefetch limit, and fuse the legs with RRF"""
+    fused: Dict[Any, float] = defaultdict(float)
+    representative: Dict[Any, SearchHit] = {}
+    for leg_index, leg_limit in enumerate(shard_legs[0][1].limits):
+        leg = [(collection_name, legs.legs[leg_index]) for collection_name, legs in shard_legs]
+        for rank, (key, hit) in enumerate(_raw_ranking(leg, leg_limit)):
+            representative.setdefault(key, hit)
+            fused[key] += 1.0 / (QDRANT_RRF_K + rank)
+    return _with_scores(sorted(fused.items(), key=lambda item: -item[1])[:limit], representative)
+
+
+def _with_scores(ordered: List[Tuple[Any, float]], representative: Dict[Any, SearchHit]) -> List[SearchHit]:
+    merged = []
+    for key, score in ordered:
+        hit = representative[key]
+        hit.score = score
+        merged.append(hit)
+    return merged
+
+
+def fuse(shard_hits: Union[Dict[str, Any], List[Tuple[str, List[SearchHit]]]], limit: int,
+         method: str = "raw") -> List[SearchHit]:
+    """
+    Merge per-collection hit lists into one ranking. "raw" keeps each product's best raw score;
+    collections that returned LegHits are merged leg by leg and fused with RRF. RRF sums
+    1 / (k + rank) over the lists a product appears in; "score" min-max normalizes each list's
+    scores and keeps a product's best. The fused value replaces SearchHit.score. shard_hits maps
+    collection names to hit lists, or is a list of (collection name, hits) pairs when a collection
+    contributes several (query variants).
+    """
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unknown shard fusion method: {method}")
+    pairs = [(name, hits) for name, hits in (shard_hits.items() if isinstance(shard_hits, dict) else shard_hits) if hits]
+    if not pairs:
+        return []
+    if isinstance(pairs[0][1], LegHits):
+        if method != "raw":
+            raise ValueError("Per-leg hits can only be fused with the raw method")
+        return _fuse_legs(pairs, limit)
+    if method == "raw":
+        return [hit for _, hit in _raw_ranking(pairs, limit)]
+    fused: Dict[Any, float] = defaultdict(float)
+    representative: Dict[Any, SearchHit] = {}
+    for collection_name, hits in pairs:
+        if method == "score":
+            low = min(hit.score for hit in hits)
+            spread = max(hit.score for hit in hits) - low
+        for rank, hit in enumerate(hits, start=1):
+            key = hit_key(collection_name, hit)
+            representative.setdefault(key, hit)
+            if method == "rrf":
+                fused[key] += 1.0 / (settings.SHARD_RRF_K + rank)
+            else:
+                fused[key] = max(fused[key], (hit.score - low) / spread if spread > 0 else 1.0)
+    return _with_scores(sorted(fused.items(), key=lambda item: -item[1])[:limit], representative)
+
+
+class ShardMetrics:
+    """Per-collection query, timeout and error counts of the fan-out"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = defaultdict(lambda: {"queries": 0, "timeouts": 0, "errors": 0})
+        self.fan_outs = 0
+
+    def record(self, answered: List[str], timed_out: List[str], failed: List[str]):
+        with self._lock:
+            self.fan_outs += 1
+            for collection_name in answered + timed_out + failed:
+                self._counts[collection_name]["queries"] += 1
+            for collection_name in timed_out:
+                self._counts[collection_name]["timeouts"] += 1
+            for collection_name in failed:
+                self._counts[collection_name]["errors"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "collections": search_collections(),
+                "fusion": settings.SHARD_FUSION,
+                "timeout_ms": settings.SHARD_TIMEOUT_MS,
+                "fan_outs": self.fan_outs,
+                "by_collection": {name: dict(counts) for name, counts in sorted(self._counts.items())},
+            }
+
+
+shard_metrics = ShardMetrics()
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """Event loop of the fan-out, run by a daemon thread; the async client's connections live on it"""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="shard-search", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+async def _search_shards(search_shard: Callable[[str], Awaitable[Any]], collection_names: List[str],
+                         timeout: Optional[float]) -> List[Any]:
+    # The deadline starts when the shard call does: there is no worker pool to queue behind
+    return await asyncio.gather(
+        *(asyncio.wait_for(search_shard(collection_name), timeout) for collection_name in collection_names),
+        return_exceptions=True,
+    )
+
+
+def fan_out(search_shard: Callable[[str], Awaitable[Any]], collection_names: List[str], limit: int,
+            timeout_ms: float = None, method: str = None) -> Tuple[List[SearchHit], Dict[str, Any]]:
+    """
+    Await search_shard(collection_name) for every collection concurrently on the fan-out loop and
+    fuse the hit lists. Shards still running after timeout_ms (0: wait for all) are cancelled and,
+    like shards that raise, left out. Returns the fused hits and the per-shard details for logging.
+    """
+    timeout_ms = settings.SHARD_TIMEOUT_MS if timeout_ms is None else timeout_ms
+    method = method or settings.SHARD_FUSION
+    started = time.perf_counter()
+    results = asyncio.run_coroutine_threadsafe(
+        _search_shards(search_shard, collection_names, timeout_ms / 1000 if timeout_ms > 0 else None), _get_loop(),
+    ).result()
+
+    shard_hits: Dict[str, Any] = {}
+    timed_out = []
+    failed = []
+    # In collection order, so ties fuse the same way whichever shard answered first
+    for collection_name, result in zip(collection_names, results):
+        if isinstance(result, asyncio.TimeoutError):
+            timed_out.append(collection_name)
+        elif isinstance(result, BaseException):
+            logger.error(f"Search of collection '{collection_name}' failed: {result}")
+            failed.append(collection_name)
+        else:
+            shard_hits[collection_name] = result
+    if timed_out:
+        logger.warning(f"Dropped collections after {timeout_ms:.0f}ms: {', '.join(sorted(timed_out))}")
+    shard_metrics.record(list(shard_hits), timed_out, failed)
+
+    merged = fuse(shard_hits, limit, method)
+    return merged, {
+        "shards": len(collection_names),
+        "answered": len(shard_hits),
+        "timed_out": sorted(timed_out),
+        "failed": sorted(failed),
+        "fan_out_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
@@ -0,0 +1,532 @@
+"""
+In-memory typeahead over catalog titles, brands and categories.
+
+The index is an immutable segment (sorted token vocabulary with CSR posting lists and a trigram
+index over the vocabulary, so "maus" also finds compounds such as "funkmaus") plus a small
+mutable delta for incremental catalog updates, compacted (dropping removed entries) into a new
+segment when it grows. A background thread polls the catalog version and, when it changes,
+applies the changed and removed products to the delta instead of rebuilding.
+Text is normalized German-aware: case-folded, umlauts indexed both as "ae" and as the bare vowel,
+ß as "ss". Suggestions are ranked by log popularity with a bonus for matching at the start.
+"""
+import bisect
+import itertools
+import logging
+import math
+import re
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.sharding import search_collections
+
+logger = logging.getLogger("mini_RAG")
+
+_UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue"})
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+# Single-token queries of up to this many characters are answered from precomputed top lists
+SHORT_PREFIX_CHARS = 2
+SHORT_PREFIX_TOP = 32
+# Matching entries (most popular first) considered for the final ranking
+CANDIDATE_CAP = 5000
+# Vocabulary tokens considered for an infix (compound) match
+INFIX_TOKEN_CAP = 500
+# Products applied per hold of the read lock, so a large update does not stall suggest()
+APPLY_BATCH = 1000
+# Delta and removed entries that trigger a compaction into a new segment
+COMPACT_THRESHOLD = 5000
+
+KIND_PRODUCT = "product"
+KIND_BRAND = "brand"
+KIND_CATEGORY = "category"
+
+
+def _fold(text: str, umlauts_as_vowel: bool) -> str:
+    text = (text or "").casefold()
+    if not text.isascii():
+        text = unicodedata.normalize("NFC", text)
+        if not umlauts_as_vowel:
+            text = text.translate(_UMLAUTS)
+        text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return _NON_ALNUM.sub(" ", text).strip()
+
+
+def normalize_term(text: str) -> str:
+    """Canonical search form: case-folded ASCII with ä/ö/ü as ae/oe/ue and ß as ss"""
+    return _fold(text, umlauts_as_vowel=False)
+
+
+def searchable_text(text: str) -> str:
+    """Normalized text plus the bare-vowel spelling when it differs ("mäuse" -> "maeuse mause")"""
+    canonical = normalize_term(text)
+    if text.isascii():
+        return canonical
+    bare = _fold(text, umlauts_as_vowel=True)
+    return canonical if bare == canonical else f"{canonical} {bare}"
+
+
+def _signature(product: Dict[str, Any]) -> Tuple[Any, ...]:
+    return tuple(product.get(field) for field in ("title", "brand", "category", "popularity"))
+
+
+class _Segment:
+    """Immutable token -> entry-id index built in one pass"""
+
+    __slots__ = ("vocab", "offsets", "postings", "trigrams", "short_prefix_top")
+
+    def __init__(self, texts: List[str], live: Iterable[int], weights: np.ndarray):
+        token_ids: Dict[str, List[int]] = {}
+        for entry_id in live:
+            for token in set(texts[entry_id].split()):
+                token_ids.setdefault(token, []).append(entry_id)
+        self.vocab = sorted(token_ids)
+        lengths = np.fromiter((len(token_ids[token]) for token in self.vocab), dtype=np.int64, count=len(self.vocab))
+        self.offsets = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.offsets[1:])
+        self.postings = np.fromiter(
+            itertools.chain.from_iterable(token_ids[token] for token in self.vocab),
+            dtype=np.int32, count=int(self.offsets[-1]),
+        )
+        trigrams: Dict[str, List[int]] = {}
+        for index, token in enumerate(self.vocab):
+            for gram in {token[i:i + 3] for i in range(len(token) - 2)}:
+                trigrams.setdefault(gram, []).append(index)
+        self.trigrams = {gram: np.asarray(indices, dtype=np.int32) for gram, indices in trigrams.items()}
+
+        self.short_prefix_top: Dict[str, np.ndarray] = {}
+        prefixes = {token[:length] for token in self.vocab for length in range(1, SHORT_PREFIX_CHARS + 1)}
+        for prefix in prefixes:
+            ids = np.unique(self.ids_for_range(*self.prefix_range(prefix)))
+            if len(ids) > SHORT_PREFIX_TOP:
+                ids = ids[np.argpartition(-weights[ids], SHORT_PREFIX_TOP)[:SHORT_PREFIX_TOP]]
+            self.short_prefix_top[prefix] = ids[np.argsort(-weights[ids], kind="stable")]
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        return bisect.bisect_left(self.vocab, prefix), bisect.bisect_left(self.vocab, prefix + "\x7f")
+
+    def posting_count(self, lo: int, hi: int) -> int:
+        return int(self.offsets[hi] - self.offsets[lo])
+
+    def ids_for_range(self, lo: int, hi: int) -> np.ndarray:
+        # Postings of consecutive vocabulary tokens are contiguous
+        return self.postings[self.offsets[lo]:self.offsets[hi]]
+
+    def infix_ids(self, fragment: str) -> np.ndarray:
+        """Entries with a token containing fragment (len >= 3) anywhere but at its start"""
+        grams = [self.trigrams.get(fragment[i:i + 3]) for i in range(len(fragment) - 2)]
+        if not grams or any(gram is None for gram in grams):
+            return np.empty(0, dtype=np.int32)
+        token_indices = min(grams, key=len)
+        for gram in grams:
+            if gram is not token_indices:
+                token_indices = np.intersect1d(token_indices, gram, assume_unique=True)
+        matches = [index for index in token_indices[:INFIX_TOKEN_CAP]
+                   if fragment in self.vocab[index] and not self.vocab[index].startswith(fragment)]
+        if not matches:
+            return np.empty(0, dtype=np.int32)
+        return np.concatenate([self.postings[self.offsets[index]:self.offsets[index + 1]] for index in matches])
+
+
+def _batched(items: Iterable[Any], size: int) -> Iterable[List[Any]]:
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _matches_token(text: str, token: str) -> bool:
+    """Delta-side match with the segment's semantics: a word starting with token or, from 3 characters, containing it"""
+    if token not in text:
+        return False
+    if len(token) >= 3 or text.startswith(token):
+        return True
+    return f" {token}" in text
+
+
+class TypeaheadIndex:
+    """Thread-safe suggestion index; see the module docstring for the layout"""
+
+    def __init__(self):
+        # Readers and the short appends and swaps of writers hold _lock; writers are serialized
+        # by _write_lock, so a compaction can build its segment without blocking suggest()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._displays: List[str] = []
+        self._kinds: List[str] = []
+        self._product_ids: List[Optional[str]] = []
+        self._texts: List[str] = []
+        self._weights = np.zeros(0, dtype=np.float32)
+        self._by_product: Dict[str, int] = {}
+        self._by_facet: Dict[Tuple[str, str], int] = {}
+        # Products behind each facet and their summed popularity, so facets follow removals
+        self._facet_refs: Dict[Tuple[str, str], int] = {}
+        self._facet_popularity: Dict[Tuple[str, str], float] = {}
+        # Indexed fields per product, to find the products a catalog update changed
+        self._signatures: Dict[str, Tuple[Any, ...]] = {}
+        self._removed: set = set()
+        self._delta: List[int] = []
+        # Set while a large update is staged: its entries and tombstones stay invisible to
+        # suggest() until the compaction that ends the update swaps them in at once
+        self._staging = False
+        self._staged_removed: set = set()
+        self._segment = _Segment([], [], self._weights)
+        self.built_at: Optional[float] = None
+        # Catalog version the index reflects, set by the refresh thread
+        self.catalog_version: Optional[str] = None
+
+    @classmethod
+    def from_products(cls, products: Iterable[Dict[str, Any]]) -> "TypeaheadIndex":
+        index = cls()
+        with index._write_lock:
+            for product in products:
+                index._add_product(product)
+            index._compact()
+        return index
+
+    # --- updates ---
+
+    def _add_entry(self, display: str, kind: str, product_id: Optional[str], popularity: float) -> int:
+        entry_id = len(self._displays)
+        self._displays.append(display)
+        self._kinds.append(kind)
+        self._product_ids.append(product_id)
+        self._texts.append(searchable_text(display))
+        if entry_id >= len(self._weights):
+            self._weights = np.resize(self._weights, max(1024, 2 * len(self._weights)))
+        self._weights[entry_id] = math.log1p(max(popularity, 0.0))
+        if not self._staging:
+            self._delta.append(entry_id)
+        return entry_id
+
+    def _tombstone(self, entry_id: int):
+        (self._staged_removed if self._staging else self._removed).add(entry_id)
+
+    def _add_facet(self, kind: str, value: str, popularity: float):
+        key = (kind, value)
+        self._facet_refs[key] = self._facet_refs.get(key, 0) + 1
+        # Facets are as popular as the products behind them
+        self._facet_popularity[key] = self._facet_popularity.get(key, 0.0) + popularity
+        facet_id = self._by_facet.get(key)
+        if facet_id is None:
+            self._by_facet[key] = self._add_entry(value, kind, None, popularity)
+        else:
+            self._weights[facet_id] = math.log1p(max(self._facet_popularity[key], 0.0))
+
+    def _retract_facet(self, kind: str, value: str, popularity: float):
+        key = (kind, value)
+        refs = self._facet_refs.get(key, 0) - 1
+        if refs > 0:
+            self._facet_refs[key] = refs
+            self._facet_popularity[key] -= popularity
+            self._weights[self._by_facet[key]] = math.log1p(max(self._facet_popularity[key], 0.0))
+            return
+        self._facet_refs.pop(key, None)
+        self._facet_popularity.pop(key, None)
+        facet_id = self._by_facet.pop(key, None)
+        if facet_id is not None:
+            self._tombstone(facet_id)
+
+    def _retract_product(self, product_id: str, entry_id: Optional[int], signature: Optional[Tuple[Any, ...]]):
+        if entry_id is not None:
+            self._tombstone(entry_id)
+        if signature is None:
+            return
+        _, brand, category, popularity = signature
+        for kind, value in ((KIND_BRAND, brand), (KIND_CATEGORY, category)):
+            if value:
+                self._retract_facet(kind, value, float(popularity or 1.0))
+
+    def _add_product(self, product: Dict[str, Any]):
+        title = product.get("title")
+        if not title or product.get("product_id") is None:
+            return
+        product_id = str(product["product_id"])
+        popularity = float(product.get("popularity") or 1.0)
+        previous = self._by_product.get(product_id)
+        previous_signature = self._signatures.get(product_id)
+        self._signatures[product_id] = _signature(product)
+        self._by_product[product_id] = self._add_entry(title, KIND_PRODUCT, product_id, popularity)
+        for kind in (KIND_BRAND, KIND_CATEGORY):
+            value = product.get(kind)
+            if value:
+                self._add_facet(kind, value, popularity)
+        # Retract after adding, so facets the product keeps are not dropped and re-created
+        if previous is not None:
+            self._retract_product(product_id, previous, previous_signature)
+
+    def _remove(self, product_ids: Iterable[Any]):
+        for product_id in product_ids:
+            product_id = str(product_id)
+            entry_id = self._by_product.pop(product_id, None)
+            self._retract_product(product_id, entry_id, self._signatures.pop(product_id, None))
+
+    def _apply(self, products: List[Dict[str, Any]], removed_ids: List[Any]):
+        """
+        Upsert and remove in batches of APPLY_BATCH, taking _lock for each, then compact if due.
+        Updates larger than COMPACT_THRESHOLD are staged rather than put in the delta, which
+        suggest() scans entry by entry. Needs _write_lock
+        """
+        self._staging = len(products) + len(removed_ids) > COMPACT_THRESHOLD
+        for batch in _batched(products, APPLY_BATCH):
+            with self._lock:
+                for product in batch:
+                    self._add_product(product)
+        for batch in _batched(removed_ids, APPLY_BATCH):
+            with self._lock:
+                self._remove(batch)
+        if self._staging or len(self._delta) + len(self._removed) > COMPACT_THRESHOLD:
+            self._compact()
+
+    def _compact(self):
+        """
+        Build a segment over the live entries, renumbered without the tombstoned ones, and swap it
+        in. Called with _write_lock held: entry lists only change under it, so they are read here
+        without _lock and suggest() keeps serving the previous segment meanwhile
+        """
+        dropped = self._removed | self._staged_removed
+        live = [entry_id for entry_id in range(len(self._displays)) if entry_id not in dropped]
+        renumbered = {entry_id: position for position, entry_id in enumerate(live)}
+        texts = [self._texts[entry_id] for entry_id in live]
+        weights = self._weights[np.asarray(live, dtype=np.int64)] if live else np.zeros(0, dtype=np.float32)
+        segment = _Segment(texts, range(len(live)), weights)
+        displays = [self._displays[entry_id] for entry_id in live]
+        kinds = [self._kinds[entry_id] for entry_id in live]
+        product_ids = [self._product_ids[entry_id] for entry_id in live]
+        by_product = {product_id: renumbered[entry_id] for product_id, entry_id in self._by_product.items()}
+        by_facet = {key: renumbered[entry_id] for key, entry_id in self._by_facet.items()}
+        with self._lock:
+            self._displays, self._kinds, self._product_ids, self._texts = displays, kinds, product_ids, texts
+            self._weights = weights
+            self._by_product, self._by_facet = by_product, by_facet
+            self._segment = segment
+            self._removed = set()
+            self._delta = []
+            self.built_at = time.time()
+        self._staging = False
+        self._staged_removed = set()
+
+    def upsert_products(self, products: Iterable[Dict[str, Any]]):
+        """Add or replace products; the index is compacted once the delta exceeds COMPACT_THRESHOLD"""
+        with self._write_lock:
+            self._apply(list(products), [])
+
+    def remove_products(self, product_ids: Iterable[Any]):
+        with self._write_lock:
+            self._apply([], list(product_ids))
+
+    def sync_products(self, products: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Bring the index in line with a full product listing: new and changed products are
+        upserted into the delta, products missing from the listing are removed. Products
+        without a product_id or title are not indexed
+        """
+        with self._write_lock:
+            # Only writers touch the signatures, so the diff runs without blocking suggest()
+            listed = set()
+            changed = []
+            for product in products:
+                if product.get("product_id") is None or not product.get("title"):
+                    continue
+                product_id = str(product["product_id"])
+                listed.add(product_id)
+                if self._signatures.get(product_id) != _signature(product):
+                    changed.append(product)
+            removed = [product_id for product_id in self._by_product if product_id not in listed]
+            self._apply(changed, removed)
+        return {"upserted": len(changed), "removed": len(removed)}
+
+    # --- queries ---
+
+    def _token_candidates(self, token: str) -> np.ndarray:
+        segment = self._segment
+        ids = segment.ids_for_range(*segment.prefix_range(token))
+        if len(token) >= 3:
+            infix = segment.infix_ids(token)
+            if len(infix):
+                ids = np.concatenate([ids, infix])
+        if self._delta:
+            delta = [entry_id for entry_id in self._delta if _matches_token(self._texts[entry_id], token)]
+            if delta:
+                ids = np.concatenate([ids, np.asarray(delta, dtype=np.int32)])
+        return ids
+
+    def _short_prefix_candidates(self, token: str, pool: int) -> Optional[np.ndarray]:
+        top = self._segment.short_prefix_top.get(token, np.empty(0, dtype=np.int32))
+        if not self._removed:
+            return top
+        live = top[[entry_id not in self._removed for entry_id in top.tolist()]]
+        # A full top list that lost entries to removals may hide live ones ranked just below it
+        if len(live) < len(top) and len(top) >= SHORT_PREFIX_TOP and len(live) < pool:
+            return None
+        return live
+
+    def suggest(self, text: str, limit: int = 8) -> List[Dict[str, Any]]:
+        """Top suggestions whose tokens start with (or, for compounds, contain) every query token"""
+        query = normalize_term(text)
+        tokens = query.split()
+        if not tokens or limit <= 0:
+            return []
+        with self._lock:
+            segment = self._segment
+            pool = limit * 4
+            candidates = None
+            if len(tokens) == 1 and len(tokens[0]) <= SHORT_PREFIX_CHARS and not self._delta:
+                candidates = self._short_prefix_candidates(tokens[0], pool)
+            if candidates is None:
+                # Start from the most selective token and intersect with the others through a
+                # dense membership mask (one scatter per token instead of a sort)
+                counts = [segment.posting_count(*segment.prefix_range(token)) for token in tokens]
+                anchor = tokens[int(np.argmin(counts))]
+                candidates = self._token_candidates(anchor)
+                for token in tokens:
+                    if token == anchor or not len(candidates):
+                        continue
+                    mask = np.zeros(len(self._displays), dtype=bool)
+                    mask[self._token_candidates(token)] = True
+                    candidates = candidates[mask[candidates]]
+                if len(candidates) > CANDIDATE_CAP:
+                    candidates = candidates[np.argpartition(-self._weights[candidates], CANDIDATE_CAP)[:CANDIDATE_CAP]]
+                candidates = candidates[np.argsort(-self._weights[candidates], kind="stable")]
+
+            matches = []
+            seen = set()
+            for entry_id in candidates.tolist():
+                if entry_id in seen or entry_id in self._removed:
+                    continue
+                seen.add(entry_id)
+                matches.append(entry_id)
+                if len(matches) >= pool:
+                    break
+
+            scored = []
+            for entry_id in matches:
+                score = float(self._weights[entry_id])
+                if self._texts[entry_id].startswith(query):
+                    score += settings.TYPEAHEAD_PREFIX_BOOST
+                if self._kinds[entry_id] != KIND_PRODUCT:
+                    score += settings.TYPEAHEAD_FACET_BOOST
+                scored.append((score, entry_id))
+            scored.sort(key=lambda item: (-item[0], len(self._displays[item[1]])))
+            return [
+                {"text": self._displays[entry_id], "kind": self._kinds[entry_id], "product_id": self._product_ids[entry_id]}
+                for _, entry_id in scored[:limit]
+            ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._displays) - len(self._removed),
+                "facets": len(self._by_facet),
+                "tokens": len(self._segment.vocab),
+                "delta": len(self._delta),
+                "removed": len(self._removed),
+                "built_at": self.built_at,
+                "catalog_version": self.catalog_version,
+            }
+
+
+typeahead_index = TypeaheadIndex()
+
+
+def load_products_from_collection(client, collection_name: str, batch_size: int = 1000) -> List[Dict[str, Any]]:
+    """Scroll the typeahead fields of every catalog point"""
+    products = []
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name, limit=batch_size, offset=offset, with_vectors=False,
+            with_payload=["product_id", "title", "brand", "category", "popularity"],
+        )
+        products.extend(point.payload or {} for point in points)
+        if offset is None or not points:
+            return products
+
+
+def _load_products(client, collection_names: List[str]) -> List[Dict[str, Any]]:
+    products = []
+    for collection_name in collection_names:
+        products.extend(load_products_from_collection(client, collection_name))
+    return products
+
+
+def _read_catalog_version(client, collection_names: List[str]) -> Optional[str]:
+    from app.services.catalog import get_catalogs_version
+
+    try:
+        return get_catalogs_version(client, collection_names)
+    except Exception as e:
+        logger.error(f"Could not read the catalog version for typeahead refresh: {e}")
+        return None
+
+
+def rebuild_typeahead_index():
+    """Build a fresh index from the searched Qdrant collections and swap it in"""
+    global typeahead_index
+    from app.services.qdrant_transport import get_client
+
+    start_time = time.time()
+    try:
+        client = get_client()
+        collection_names = search_collections()
+        # Read before the scroll, so a catalog update during the build is picked up by the next check
+        catalog_version = _read_catalog_version(client, collection_names)
+        typeahead_index = TypeaheadIndex.from_products(_load_products(client, collection_names))
+        typeahead_index.catalog_version = catalog_version
+        logger.info(f"PERFORMANCE: Typeahead index build for '{', '.join(collection_names)}' took "
+                    f"{(time.time() - start_time) * 1000:.2f}ms, details: {typeahead_index.stats()}")
+    except Exception as e:
+        logger.error(f"Failed to build typeahead index: {e}")
+
+
+def refresh_typeahead_index() -> bool:
+    """
+    Apply catalog changes to the live index when the catalog version has moved on since it was
+    built or last refreshed; returns whether it had
+    """
+    from app.services.qdrant_transport import get_client
+
+    index = typeahead_index
+    start_time = time.time()
+    try:
+        client = get_client()
+        collection_names = search_collections()
+        catalog_version = _read_catalog_version(client, collection_names)
+        if catalog_version is None or catalog_version == index.catalog_version:
+            return False
+        changes = index.sync_products(_load_products(client, collection_names))
+    except Exception as e:
+        logger.error(f"Failed to refresh typeahead index: {e}")
+        return False
+    index.catalog_version = catalog_version
+    logger.info(f"PERFORMANCE: Typeahead index refresh to catalog version {catalog_version} took "
+                f"{(time.time() - start_time) * 1000:.2f}ms, details: {changes}")
+    return True
+
+
+def start_typeahead_refresh() -> Optional[threading.Event]:
+    """
+    Build the index in a background thread (so startup is not blocked) and, when
+    TYPEAHEAD_REFRESH_SECONDS is set, check the catalog version on that interval and apply
+    changed products incrementally. Returns the stop event.
+    """
+    if not settings.TYPEAHEAD_ENABLED:
+        return None
+    stop = threading.Event()
+
+    def refresh_loop():
+        rebuild_typeahead_index()
+        while settings.TYPEAHEAD_REFRESH_SECONDS > 0 and not stop.wait(settings.TYPEAHEAD_REFRESH_SECONDS):
+            if typeahead_index.built_at is None:
+                rebuild_typeahead_index()
+            else:
+                refresh_typeahead_index()
+
+    threading.Thread(target=refresh_loop, name="typeahead-refresh", daemon=True).start()
+    return stop
@@ -0,0 +1,215 @@
+"""
+LLM and embedding token accounting.
+
+Every completion and query embedding is recorded with its stage, pipeline and model: per
+request (returned in the response when USAGE_IN_RESPONSE is set) and in process-wide totals
+reported by /metrics. The per-minute window and the per-request running total back the
+token budgets that switch process_search_query to its cheaper path.
+"""
+import contextvars
+import functools
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger("mini_RAG")
+
+# USD per 1M tokens: (input, cached input, output); override or extend with MODEL_PRICES_JSON
+DEFAULT_MODEL_PRICES: Dict[str, Tuple[float, float, float]] = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "text-embedding-3-large": (0.13, 0.13, 0.0),
+    "text-embedding-3-small": (0.02, 0.02, 0.0),
+}
+
+
+@functools.lru_cache(maxsize=1)
+def model_prices() -> Dict[str, Tuple[float, float, float]]:
+    prices = dict(DEFAULT_MODEL_PRICES)
+    if settings.MODEL_PRICES_JSON:
+        prices.update({model: tuple(values) for model, values in json.loads(settings.MODEL_PRICES_JSON).items()})
+    return prices
+
+
+def token_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> Optional[float]:
+    """Cost in USD, or None for a model without a known price"""
+    prices = model_prices().get(model)
+    if prices is None:
+        return None
+    input_price, cached_price, output_price = prices
+    uncached = max(prompt_tokens - cached_tokens, 0)
+    return (uncached * input_price + cached_tokens * cached_price + completion_tokens * output_price) / 1_000_000
+
+
+@functools.lru_cache(maxsize=8)
+def _encoding(model: str):
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model(model)
+    except Exception as e:
+        # Unknown model or the encoding file cannot be fetched; fall back to a length estimate
+        logger.warning(f"No tokenizer for {model} ({e}); estimating tokens from text length")
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    encoding = _encoding(model)
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text))
+
+
+class RequestUsage:
+    """Token records of one process_search_query call"""
+
+    def __init__(self, pipeline: str):
+        self.pipeline = pipeline
+        self.calls: List[Dict[str, Any]] = []
+        self.cheap_path = False
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(call["prompt_tokens"] + call["completion_tokens"] + call["embedding_tokens"] for call in self.calls)
+
+    def summary(self) -> Dict[str, Any]:
+        costs = [call["cost_usd"] for call in self.calls if call["cost_usd"] is not None]
+        return {
+            "prompt_tokens": sum(call["prompt_tokens"] for call in self.calls),
+            "completion_tokens": sum(call["completion_tokens"] for call in self.calls),
+            "cached_tokens": sum(call["cached_tokens"] for call in self.calls),
+            "embedding_tokens": sum(call["embedding_tokens"] for call in self.calls),
+            "cost_usd": round(sum(costs), 8),
+            "cheap_path": self.cheap_path,
+            "calls": self.calls,
+        }
+
+
+class UsageMetrics:
+    """Process-wide token totals by (stage, pipeline, model) and a one-minute token window"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals: Dict[Tuple[str, str, str], Dict[str, float]] = defaultdict(
+            lambda: {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0,
+                     "embedding_tokens": 0, "cost_usd": 0.0}
+        )
+        self._window: deque = deque()
+        self._window_tokens = 0
+        self.cheap_path_requests = 0
+
+    def _trim(self, now: float):
+        while self._window and now - self._window[0][0] > 60:
+            self._window_tokens -= self._window.popleft()[1]
+
+    def add(self, call: Dict[str, Any], pipeline: str):
+        tokens = call["prompt_tokens"] + call["completion_tokens"] + call["embedding_tokens"]
+        now = time.time()
+        with self._lock:
+            totals = self._totals[(call["stage"], pipeline, call["model"])]
+            totals["calls"] += 1
+            for field in ("prompt_tokens", "completion_tokens", "cached_tokens", "embedding_tokens"):
+                totals[field] += call[field]
+            totals["cost_usd"] += call["cost_usd"] or 0.0
+            self._window.append((now, tokens))
+            self._window_tokens += tokens
+            self._trim(now)
+
+    def count_cheap_path(self):
+        with self._lock:
+            self.cheap_path_requests += 1
+
+    def tokens_last_minute(self) -> int:
+        with self._lock:
+            self._trim(time.time())
+            return self._window_tokens
+
+    def stats(self) -> Dict[str, Any]:
+        tokens_last_minute = self.tokens_last_minute()
+        with self._lock:
+            prompt_tokens = sum(totals["prompt_tokens"] for totals in self._totals.values())
+            cached_tokens = sum(totals["cached_tokens"] for totals in self._totals.values())
+            return {
+                "tokens_last_minute": tokens_last_minute,
+                "cheap_path_requests": self.cheap_path_requests,
+                # Share of prompt tokens the provider served from its prefix cache
+                "cached_prompt_ratio": cached_tokens / prompt_tokens if prompt_tokens else 0.0,
+                "cost_usd": round(sum(totals["cost_usd"] for totals in self._totals.values()), 6),
+                "by_stage": [
+                    {"stage": stage, "pipeline": pipeline, "model": model, **totals}
+                    for (stage, pipeline, model), totals in sorted(self._totals.items())
+                ],
+            }
+
+
+usage_metrics = UsageMetrics()
+
+_request_usage: contextvars.ContextVar[Optional[RequestUsage]] = contextvars.ContextVar("request_usage", default=None)
+
+
+def start_request(pipeline: Any) -> RequestUsage:
+    """Begin accounting for the current request; later records in this context attach to it"""
+    request_usage = RequestUsage(getattr(pipeline, "value", str(pipeline)))
+    _request_usage.set(request_usage)
+    return request_usage
+
+
+def current_request() -> Optional[RequestUsage]:
+    """Usage of the request running in this context, if accounting was started for it"""
+    return _request_usage.get()
+
+
+def _record(stage: str, model: str, prompt_tokens: int = 0, completion_tokens: int = 0,
+            cached_tokens: int = 0, embedding_tokens: int = 0) -> Dict[str, Any]:
+    request_usage = _request_usage.get()
+    call = {
+        "stage": stage,
+        "model": model,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cached_tokens": cached_tokens,
+        "embedding_tokens": embedding_tokens,
+        "cost_usd": token_cost(model, prompt_tokens + embedding_tokens, completion_tokens, cached_tokens),
+    }
+    if request_usage is not None:
+        request_usage.calls.append(call)
+    usage_metrics.add(call, request_usage.pipeline if request_usage is not None else "")
+    return call
+
+
+def record_completion(stage: str, model: str, usage: Any) -> Optional[Dict[str, Any]]:
+    """Record the usage block of a chat completion response; returns the recorded call"""
+    if usage is None:
+        return None
+    details = getattr(usage, "prompt_tokens_details", None)
+    return _record(stage, model,
+            prompt_tokens=usage.prompt_tokens or 0,
+            completion_tokens=usage.completion_tokens or 0,
+            cached_tokens=(getattr(details, "cached_tokens", None) or 0) if details is not None else 0)
+
+
+def record_embedding(stage: str, model: str, text: str):
+    """Record a query embedding; the embeddings client does not return usage, so tokens are counted locally"""
+    _record(stage, model, embedding_tokens=count_tokens(text, model))
+
+
+def minute_budget_exceeded() -> bool:
+    return 0 < settings.TOKEN_BUDGET_PER_MINUTE <= usage_metrics.tokens_last_minute()
+
+
+def request_budget_exceeded(request_usage: RequestUsage, upcoming_tokens: int = 0) -> bool:
+    """Whether the tokens spent so far plus the next call's estimate exceed the per-request budget"""
+    return 0 < settings.TOKEN_BUDGET_PER_REQUEST < request_usage.total_tokens + upcoming_tokens
+
+
+def use_cheap_path(request_usage: RequestUsage, reason: str):
+    if not request_usage.cheap_path:
+        request_usage.cheap_path = True
+        usage_metrics.count_cheap_path()
+        logger.warning(f"Token budget exceeded ({reason}); using the cheaper path")
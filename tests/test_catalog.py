@@ -0,0 +1,32 @@
+from app.core.config import settings
+from app.services.catalog import derive_payload_fields, search_payload_fields, truncate_text
+
+
+def test_truncate_text_prefers_a_sentence_end():
+    text = "Kabellose Maus. Mit leisen Tasten und langer Laufzeit."
+    assert truncate_text(text, 100) == text
+    assert truncate_text(text, 26) == "Kabellose Maus."
+    # A sentence end in the first half of the cut is too early; the word boundary wins
+    assert truncate_text(text, 34) == "Kabellose Maus. Mit leisen Tasten"
+
+
+def test_truncate_text_falls_back_to_a_word_boundary():
+    assert truncate_text("Kabellose Maus mit leisen Tasten", 20) == "Kabellose Maus mit"
+    assert truncate_text("Funkmausmodell", 5) == "Funkm"
+    assert truncate_text(None, 10) == ""
+
+
+def test_derive_payload_fields(monkeypatch):
+    monkeypatch.setattr(settings, "PROMPT_SNIPPET_MAX_CHARS", 10)
+    monkeypatch.setattr(settings, "RERANK_TEXT_MAX_CHARS", 100)
+    fields = derive_payload_fields({"page_content": "Schnelle SSD mit 1TB Speicher"})
+    assert fields == {"prompt_snippet": "Schnelle", "rerank_text": "Schnelle SSD mit 1TB Speicher"}
+
+
+def test_page_content_is_projected_only_until_backfilled(monkeypatch):
+    monkeypatch.setattr(settings, "USE_PRECOMPUTED_SNIPPETS", False)
+    assert "page_content" in search_payload_fields()
+    monkeypatch.setattr(settings, "USE_PRECOMPUTED_SNIPPETS", True)
+    fields = search_payload_fields()
+    assert "page_content" not in fields
+    assert {"prompt_snippet", "rerank_text", "brand", "price"} <= set(fields)
@@ -0,0 +1,86 @@
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.services import http_cache
+from app.services.http_cache import ResponseStore, cacheable_response, etag_matches, response_etag
+from app.services.usage import RequestUsage
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(http_cache.time, "time", clock)
+    return clock
+
+
+@pytest.mark.parametrize("if_none_match, expected", [
+    ('W/"abc"', True),
+    ('"abc"', True),
+    ('"xyz", W/"abc"', True),
+    ("*", True),
+    ('W/"xyz"', False),
+    ("", False),
+    (None, False),
+])
+def test_etag_matches_with_weak_comparison(if_none_match, expected):
+    assert etag_matches(if_none_match, 'W/"abc"') is expected
+
+
+def test_response_etag_follows_the_request_key_and_catalog_version(monkeypatch):
+    monkeypatch.setattr(settings, "CATALOG_VERSION", "v1")
+    etag = response_etag("Gaming Maus", 30, 10, "FUSION_RRF", True)
+    assert etag.startswith('W/"')
+    assert response_etag("  gaming   maus ", 30, 10, "FUSION_RRF", True) == etag
+    assert response_etag("gaming maus", 50, 10, "FUSION_RRF", True) != etag
+    monkeypatch.setattr(settings, "CATALOG_VERSION", "v2")
+    assert response_etag("gaming maus", 30, 10, "FUSION_RRF", True) != etag
+
+
+def test_no_etag_without_a_catalog_version(monkeypatch):
+    monkeypatch.setattr(settings, "CATALOG_VERSION", "")
+    # A failed read, still within the re-read interval
+    monkeypatch.setattr(http_cache, "_catalog_version", (time.time(), None))
+    assert response_etag("gaming maus", 30, 10, "FUSION_RRF", True) is None
+
+
+def test_cacheable_response_drops_per_request_fields():
+    response = {"recommended_products": [], "usage": {"total_tokens": 10}, "next_cursor": "abc.30", "session_id": "s"}
+    assert cacheable_response(response) == {"recommended_products": [], "next_cursor": None, "session_id": None}
+    assert cacheable_response({"recommended_products": None}) is None
+    cheap = RequestUsage("SEMANTIC")
+    cheap.cheap_path = True
+    assert cacheable_response(response, cheap) is None
+    assert cacheable_response(response, RequestUsage("SEMANTIC")) is not None
+
+
+def test_response_store_evicts_least_recently_used(clock):
+    store = ResponseStore(max_entries=2, ttl_seconds=60)
+    store.put("a", b"1")
+    store.put("b", b"2")
+    assert store.get("a") == b"1"
+    store.put("c", b"3")
+    assert store.get("b") is None
+    assert store.get("a") == b"1"
+    assert store.stats()["evictions"] == 1
+
+
+def test_response_store_ttl_counts_from_put(clock):
+    store = ResponseStore(max_entries=10, ttl_seconds=60)
+    store.put("a", b"1")
+    clock.now += 59
+    assert store.get("a") == b"1"
+    # Reads do not extend the lifetime of a body
+    clock.now += 1
+    assert store.get("a") is None
+    stats = store.stats()
+    assert (stats["hits"], stats["misses"], stats["expired"], stats["entries"]) == (1, 1, 1, 0)
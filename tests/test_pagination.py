@@ -0,0 +1,71 @@
+import pytest
+
+from app.core.results import SearchHit
+from app.services import pagination
+from app.services.pagination import SearchSnapshot, SnapshotStore, decode_cursor, encode_cursor, order_candidates
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(pagination.time, "time", clock)
+    return clock
+
+
+def snapshot(query="maus"):
+    return SearchSnapshot(query, query, None, "FUSION_RRF", True, [])
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("abc.def_-1", 30)
+    assert decode_cursor(cursor) == ("abc.def_-1", 30)
+
+
+@pytest.mark.parametrize("cursor", ["", None, "abc", "abc.", ".30", "abc.-1", "abc.3x"])
+def test_malformed_cursors_are_rejected(cursor):
+    assert decode_cursor(cursor) is None
+
+
+def test_order_candidates_keeps_shown_hits_first_without_duplicates():
+    a, b, c, d = (SearchHit(name, 1.0, None) for name in "abcd")
+    ordered = order_candidates([b], original_results=[a, b, c, d], final_results=[c, a])
+    assert ordered == [b, c, a, d]
+
+
+def test_lru_eviction(clock):
+    store = SnapshotStore(max_entries=2, ttl_seconds=60)
+    first = store.put(snapshot("a"))
+    second = store.put(snapshot("b"))
+    assert store.get(first) is not None  # first is now the most recently used
+    store.put(snapshot("c"))
+    assert store.get(second) is None
+    assert store.get(first).query == "a"
+    assert store.stats()["evictions"] == 1
+
+
+def test_snapshots_expire(clock):
+    store = SnapshotStore(max_entries=10, ttl_seconds=60)
+    snapshot_id = store.put(snapshot())
+    clock.now += 59
+    assert store.get(snapshot_id) is not None
+    clock.now += 1
+    assert store.get(snapshot_id) is None
+    stats = store.stats()
+    assert (stats["entries"], stats["expired"], stats["hits"], stats["misses"]) == (0, 1, 1, 1)
+
+
+def test_put_drops_expired_snapshots(clock):
+    store = SnapshotStore(max_entries=10, ttl_seconds=60)
+    store.put(snapshot("old"))
+    clock.now += 60
+    store.put(snapshot("new"))
+    assert store.stats()["entries"] == 1
+    assert store.stats()["expired"] == 1
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+from qdrant_client import QdrantClient, models
+
+from app.core.config import settings
+from app.services import catalog, precompute
+from app.services.precompute import PrecomputedStore, mine_head_queries, request_key
+
+REQUEST = {"query": "Gaming Maus", "limit": 30, "rerank_limit": 10, "pipeline": "FUSION_RRF", "do_rerank": True}
+
+
+def test_request_key_normalizes_the_query_and_pipeline():
+    class Pipeline:
+        value = "FUSION_RRF"
+
+    assert request_key(" gaming   MAUS", "30", 10, Pipeline(), 1) == request_key(**REQUEST)
+
+
+def test_mine_head_queries_keeps_logged_parameters(tmp_path):
+    query_log = tmp_path / "queries.jsonl"
+    query_log.write_text("\n".join(json.dumps(entry) for entry in [
+        {"query": "ssd 1tb", "limit": 50},
+        {"query": "SSD 1TB ", "limit": 50},
+        {"query": ""},
+    ]) + "\n", encoding="utf-8")
+    perf_log = tmp_path / "mini_RAG.log"
+    perf_log.write_text(
+        "2026-01-01 - mini_RAG - INFO - PERFORMANCE SUMMARY for 'gaming maus' "
+        "(limit: 10, rerank_limit: 5, pipeline: SEMANTIC, do_rerank: False):\n"
+        "2026-01-01 - mini_RAG - INFO - PERFORMANCE SUMMARY for 'gaming maus':\n"
+        "2026-01-01 - mini_RAG - INFO - PERFORMANCE: Query encoding took 3ms\n",
+        encoding="utf-8",
+    )
+    requests, coverage = mine_head_queries([str(query_log)], [str(perf_log)], top_n=2)
+    assert requests[0] == {"query": "ssd 1tb", "limit": 50, "rerank_limit": 10, "pipeline": "FUSION_RRF",
+                           "do_rerank": True}
+    assert len(requests) == 2
+    assert coverage == pytest.approx(3 / 4)
+
+    requests, _ = mine_head_queries(perf_logs=[str(perf_log)])
+    assert {"query": "gaming maus", "limit": 10, "rerank_limit": 5, "pipeline": "SEMANTIC",
+            "do_rerank": False} in requests
+    assert dict(precompute.DEFAULT_PARAMS, query="gaming maus") in requests
+
+
+def test_put_stores_the_shared_response():
+    store = PrecomputedStore()
+    store.catalog_version = "v1"
+    response = {"recommended_products": [{"name": "Maus"}], "usage": {"total_tokens": 900},
+                "next_cursor": "abc.30", "session_id": "s1"}
+    assert store.put(REQUEST, response, "v1")
+    assert store.get(request_key(**REQUEST)) == {"recommended_products": [{"name": "Maus"}],
+                                                 "next_cursor": None, "session_id": None}
+    # Failed product generation is left to the live path
+    assert not store.put(dict(REQUEST, query="other"), {"recommended_products": None}, "v1")
+
+
+def test_entries_are_served_only_at_the_current_catalog_version():
+    store = PrecomputedStore()
+    store.put(REQUEST, {"recommended_products": []}, "v1")
+    assert store.get(request_key(**REQUEST)) is None  # version not known yet
+    store.catalog_version = "v1"
+    assert store.get(request_key(**REQUEST)) is not None
+    store.catalog_version = "v2"
+    assert store.get(request_key(**REQUEST)) is None
+    assert store.requests(stale_only=True) == [REQUEST]
+    stats = store.stats()
+    assert (stats["hits"], stats["stale"], stats["current"]) == (1, 2, 0)
+
+
+def test_load_strips_usage_from_older_files(tmp_path):
+    path = tmp_path / "precomputed.json"
+    path.write_text(json.dumps({"entries": [{
+        "request": REQUEST, "catalog_version": "v1", "created_at": 0,
+        "response": {"recommended_products": [], "usage": {"total_tokens": 900}},
+    }]}), encoding="utf-8")
+    store = PrecomputedStore()
+    store.load(str(path))
+    store.catalog_version = "v1"
+    assert "usage" not in store.get(request_key(**REQUEST))
+
+
+def test_catalog_version_marker(monkeypatch):
+    monkeypatch.setattr(settings, "CATALOG_VERSION", "")
+    client = QdrantClient(":memory:")
+    client.create_collection("products", vectors_config=models.VectorParams(size=2, distance=models.Distance.DOT))
+    client.upsert("products", points=[models.PointStruct(id=1, vector=[1.0, 0.0])])
+    # Without a marker the point count stands in for the version
+    assert catalog.get_catalog_version(client, "products") == "count-1"
+    assert catalog.bump_catalog_version(client, "products", "2026-01-01") == "2026-01-01"
+    assert catalog.get_catalog_version(client, "products") == "2026-01-01"
+    assert catalog.get_catalogs_version(client, ["products"]) == "2026-01-01"
+    monkeypatch.setattr(settings, "CATALOG_VERSION", "pinned")
+    assert catalog.get_catalog_version(client, "products") == "pinned"
@@ -0,0 +1,44 @@
+import httpx
+from qdrant_client import QdrantClient, models
+
+from app.core.config import settings
+from app.services import qdrant_transport
+from app.services.qdrant_transport import client_kwargs, query_timeout, response_hits
+
+
+def test_rest_transport_pools_http_connections(monkeypatch):
+    monkeypatch.setattr(settings, "QDRANT_HTTP_POOL_SIZE", 16)
+    kwargs = client_kwargs(prefer_grpc=False)
+    assert kwargs["prefer_grpc"] is False
+    assert "grpc_options" not in kwargs and "pool_size" not in kwargs
+    assert isinstance(kwargs["limits"], httpx.Limits)
+    assert kwargs["limits"].max_connections == 16
+
+
+def test_grpc_pool_size_depends_on_the_installed_client(monkeypatch):
+    monkeypatch.setattr(settings, "QDRANT_GRPC_POOL_SIZE", 4)
+    kwargs = client_kwargs(prefer_grpc=True)
+    assert kwargs["grpc_options"]["grpc.keepalive_permit_without_calls"] == 1
+    if qdrant_transport.supports_pool_size():
+        assert kwargs["pool_size"] == 4 and "limits" not in kwargs
+    else:
+        assert "pool_size" not in kwargs and "limits" in kwargs
+
+
+def test_query_timeout_is_only_sent_when_set(monkeypatch):
+    monkeypatch.setattr(settings, "QDRANT_SEARCH_TIMEOUT_SECONDS", 0)
+    assert query_timeout() == {}
+    monkeypatch.setattr(settings, "QDRANT_SEARCH_TIMEOUT_SECONDS", 2)
+    assert query_timeout() == {"timeout": 2}
+
+
+def test_response_hits_from_client_responses_and_raw_bodies():
+    client = QdrantClient(":memory:")
+    client.create_collection("products", vectors_config=models.VectorParams(size=2, distance=models.Distance.DOT))
+    client.upsert("products", points=[models.PointStruct(id=1, vector=[1.0, 0.0], payload={"product_id": "p1"})])
+    hits = response_hits(client.query_points("products", query=[1.0, 0.0], with_payload=True))
+    assert [(hit.point_id, hit.score, hit.product_id) for hit in hits] == [(1, 1.0, "p1")]
+
+    body = {"result": {"points": [{"id": 2, "score": 0.5, "payload": {"product_id": "p2"}}]}}
+    assert [hit.product_id for hit in response_hits(body)] == ["p2"]
+    assert response_hits({"result": None}) == []
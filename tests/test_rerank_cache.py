@@ -0,0 +1,58 @@
+import json
+
+from app.services.rerank_cache import RerankScoreCache, content_hash, normalize_query
+
+
+def test_normalize_query():
+    assert normalize_query("  Gaming\tMAUS  ") == "gaming maus"
+    # NFKC folds compatibility forms such as full-width letters
+    assert normalize_query("ＳＳＤ") == "ssd"
+    assert normalize_query(None) == ""
+
+
+def test_key_depends_on_the_document_text():
+    assert RerankScoreCache.key("Maus", "text") == RerankScoreCache.key("maus ", "text")
+    assert RerankScoreCache.key("maus", "text") != RerankScoreCache.key("maus", "text v2")
+    assert content_hash("") == content_hash(None)
+
+
+def test_lru_eviction():
+    cache = RerankScoreCache(max_entries=2, model_name="model")
+    cache.put(("q", "a"), 1.0)
+    cache.put(("q", "b"), 2.0)
+    assert cache.get(("q", "a")) == 1.0  # a is now the most recently used
+    cache.put(("q", "c"), 3.0)
+    assert cache.get(("q", "b")) is None
+    assert cache.get(("q", "a")) == 1.0
+    assert cache.get(("q", "c")) == 3.0
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 1
+    assert (stats["hits"], stats["misses"]) == (3, 1)
+
+
+def test_save_and_load_keep_the_lru_order(tmp_path):
+    path = str(tmp_path / "rerank.json")
+    cache = RerankScoreCache(max_entries=3, model_name="model")
+    for name, score in (("a", 1.0), ("b", 2.0), ("c", 3.0)):
+        cache.put(("q", name), score)
+    cache.save(path)
+
+    # A smaller cache keeps the most recently used entries
+    restored = RerankScoreCache(max_entries=2, model_name="model")
+    restored.load(path)
+    assert restored.get(("q", "a")) is None
+    assert restored.get(("q", "c")) == 3.0
+
+
+def test_load_ignores_other_models_and_broken_files(tmp_path):
+    path = tmp_path / "rerank.json"
+    path.write_text(json.dumps({"model": "other", "entries": [["q", "a", 1.0]]}), encoding="utf-8")
+    cache = RerankScoreCache(max_entries=10, model_name="model")
+    cache.load(str(path))
+    assert cache.stats()["entries"] == 0
+
+    path.write_text("{not json", encoding="utf-8")
+    cache.load(str(path))
+    cache.load(str(tmp_path / "missing.json"))
+    assert cache.stats()["entries"] == 0
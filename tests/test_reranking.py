@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.core.results import SearchHit
+from app.services import rerank_cache, reranking
+
+
+class CountingModel:
+    """Cross-encoder stand-in scoring a pair by the number in its text"""
+
+    def __init__(self):
+        self.pairs = 0
+
+    def predict(self, pairs):
+        self.pairs += len(pairs)
+        return np.asarray([float(text) for _, text in pairs], dtype=np.float32)
+
+
+def hits(retrieval_scores, rerank_scores):
+    return [SearchHit(index, score, {"rerank_text": str(rerank_score)})
+            for index, (score, rerank_score) in enumerate(zip(retrieval_scores, rerank_scores))]
+
+
+@pytest.fixture(autouse=True)
+def no_score_cache(monkeypatch):
+    monkeypatch.setattr(rerank_cache, "rerank_score_cache", None)
+
+
+def test_normalize():
+    assert reranking._normalize([2.0, 4.0, 3.0]).tolist() == [0.0, 1.0, 0.5]
+    assert reranking._normalize([5.0, 5.0]).tolist() == [1.0, 1.0]
+    assert reranking._normalize([]).size == 0
+
+
+def test_confident_head():
+    scores = np.asarray([1.0, 0.9, 0.4, 0.3])
+    assert reranking._confident_head(scores, top_k=1, margin=0.35) == 0
+    assert reranking._confident_head(scores, top_k=2, margin=0.35) == 2
+    assert reranking._confident_head(np.asarray([1.0]), top_k=3, margin=0.1) == 0
+
+
+def test_rerank_sorts_by_cross_encoder_score():
+    model = CountingModel()
+    ranked, stats = reranking.rerank("q", hits([0.9, 0.8, 0.7], [0.1, 0.9, 0.5]), model)
+    assert [hit.point_id for hit in ranked] == [1, 2, 0]
+    assert ranked[0].rerank_score == pytest.approx(0.9)
+    assert stats["cross_encoder_pairs"] == 3
+
+
+def test_cascade_exits_early_on_a_clear_leader(monkeypatch):
+    monkeypatch.setattr(settings, "RERANK_CASCADE_EARLY_EXIT_TOP_K", 1)
+    monkeypatch.setattr(settings, "RERANK_CASCADE_EARLY_EXIT_MARGIN", 0.35)
+    model = CountingModel()
+    ranked, stats = reranking.cascade_rerank("q", hits([1.0, 0.3, 0.2, 0.0], [0, 1, 2, 3]), 4, model)
+    assert stats["early_exit"] is True
+    assert model.pairs == 0
+    assert [hit.point_id for hit in ranked] == [0, 1, 2, 3]
+
+
+def test_cascade_prunes_and_caps_pairs(monkeypatch):
+    monkeypatch.setattr(settings, "RERANK_CASCADE_EARLY_EXIT_MARGIN", 2.0)
+    monkeypatch.setattr(settings, "RERANK_CASCADE_PRUNE_BELOW", 0.2)
+    monkeypatch.setattr(settings, "RERANK_CASCADE_MAX_PAIRS", 2)
+    model = CountingModel()
+    # Stage one (scaled retrieval scores): 1.0, 0.9, 0.8, 0.0
+    ranked, stats = reranking.cascade_rerank("q", hits([1.0, 0.9, 0.8, 0.0], [1, 5, 9, 9]), 4, model)
+    assert stats["early_exit"] is False
+    assert stats["cross_encoder_pairs"] == model.pairs == 2
+    assert stats["pruned"] == 2
+    # The two scored candidates are reranked; the overflow and the pruned one follow in stage-one order
+    assert [hit.point_id for hit in ranked] == [1, 0, 2, 3]
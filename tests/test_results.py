@@ -0,0 +1,37 @@
+import numpy as np
+import orjson
+
+from app.core.results import DEFAULT_THUMBNAIL, SearchHit, dumps_response
+
+
+def test_payload_fields_are_read_on_access():
+    hit = SearchHit(7, np.float32(0.5), {"product_id": "p7", "title": "Funkmaus", "image": "img.png",
+                                         "page_content": "Full text", "brand": "Logitech"})
+    assert type(hit.score) is float
+    assert (hit.product_id, hit.title, hit.thumbnail) == ("p7", "Funkmaus", "img.png")
+    # Snippets fall back to the full text until the catalog is backfilled
+    assert hit.prompt_snippet == hit.rerank_text == "Full text"
+    assert hit.get("brand") == "Logitech"
+    assert hit.get("price", 0) == 0
+
+
+def test_missing_payload_gets_defaults():
+    hit = SearchHit("id", None, None)
+    assert hit.score == 0.0
+    assert (hit.title, hit.url, hit.thumbnail) == ("No Title", "No URL", DEFAULT_THUMBNAIL)
+
+
+def test_to_dict_leaves_out_page_content_and_unset_rerank_score():
+    hit = SearchHit(1, 0.25, {"product_id": "p1", "title": "T", "url": "u", "page_content": "long"})
+    assert hit.to_dict() == {"point_id": 1, "product_id": "p1", "score": 0.25, "title": "T", "url": "u",
+                             "thumbnail": DEFAULT_THUMBNAIL}
+    hit.rerank_score = 0.75
+    assert hit.to_dict()["rerank_score"] == 0.75
+
+
+def test_dumps_response_encodes_hits_and_numpy_values():
+    hit = SearchHit(1, 0.5, {"title": "T"})
+    body = orjson.loads(dumps_response({"results": [hit], "score": np.float32(0.5), "ids": np.arange(3)}))
+    assert body["results"][0]["title"] == "T"
+    assert body["score"] == 0.5
+    assert body["ids"] == [0, 1, 2]
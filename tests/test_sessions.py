@@ -0,0 +1,127 @@
+import pytest
+
+from app.core.results import SearchHit
+from app.services import sessions
+from app.services.sessions import (SearchSession, SessionStore, delta_text, filter_candidates, merge_slots,
+                                   parse_refinement, resolve_price, without_price)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(sessions.time, "time", clock)
+    return clock
+
+
+def product(product_id, title, **payload):
+    return SearchHit(product_id, 1.0, dict(payload, product_id=product_id, title=title))
+
+
+CANDIDATES = [
+    product("p1", "Logitech G305 Gaming Maus schwarz", brand="Logitech", category="Gaming Maus", price=39.0),
+    product("p2", "Razer Viper Gaming Maus", brand="Razer", category="Gaming Maus", color="White", price=59.0),
+    product("p3", "Cherry MW 2310 Maus", brand="Cherry", category="Maus", price=15.0),
+    product("p4", "Logitech M185 Maus grau", brand="Logitech", category="Maus", price=19.0),
+]
+
+
+def session(query="maus"):
+    return SearchSession(query, query, None, "FUSION_RRF", True, 30, 10, [])
+
+
+def test_parse_refinement_recognizes_known_brands_colours_prices_and_units():
+    delta = parse_refinement("lieber von Logitech in Schwarze mit 16 GB unter 50 euro", CANDIDATES)
+    assert delta == {
+        "brand": "Logitech",
+        "max_price": 50.0,
+        "price_indication": "max 50",
+        "attributes": {"color": "schwarz", "capacity": "16gb"},
+    }
+
+
+def test_parse_refinement_prefers_the_longest_known_category():
+    assert parse_refinement("eine gaming maus", CANDIDATES)["category"] == "Gaming Maus"
+
+
+def test_parse_refinement_falls_back_to_brand_prefix_and_keywords():
+    assert parse_refinement("from Roccat but wireless", []) == {"brand": "Roccat", "other_keywords": ["wireless"]}
+    assert parse_refinement("etwas guenstiger bitte", CANDIDATES) == {"price_indication": "cheaper"}
+
+
+def test_resolve_price_caps_cheaper_below_the_median():
+    # Prices 15, 19, 39, 59: median 29, highest price below it 19
+    assert resolve_price({"price_indication": "cheaper"}, CANDIDATES)["max_price"] == 19.0
+    explicit = {"price_indication": "max 50", "max_price": 50.0}
+    assert resolve_price(explicit, CANDIDATES) is explicit
+    unpriced = [product("p5", "Maus")]
+    assert "max_price" not in resolve_price({"price_indication": "cheaper"}, unpriced)
+
+
+def test_filter_candidates_applies_hard_constraints():
+    logitech = filter_candidates(CANDIDATES, {"brand": "logitech"})
+    assert [hit.product_id for hit in logitech] == ["p1", "p4"]
+    # Colour from the payload, else from the title
+    white = filter_candidates(CANDIDATES, {"attributes": {"color": "weiss"}})
+    assert [hit.product_id for hit in white] == ["p2"]
+    black = filter_candidates(CANDIDATES, {"attributes": {"color": "schwarz"}})
+    assert [hit.product_id for hit in black] == ["p1"]
+    capped = filter_candidates(CANDIDATES, {"max_price": 20.0, "price_indication": "max 20"})
+    assert [hit.product_id for hit in capped] == ["p3", "p4"]
+
+
+def test_filter_candidates_ranks_keyword_mentions_first():
+    ranked = filter_candidates(CANDIDATES, {"other_keywords": ["gaming"]})
+    assert [hit.product_id for hit in ranked] == ["p1", "p2", "p3", "p4"]
+    ranked = filter_candidates(CANDIDATES, {"other_keywords": ["cherry"]})
+    assert ranked[0].product_id == "p3"
+
+
+def test_unverifiable_price_constraints_need_qdrant():
+    unpriced = [product("p5", "Logitech Maus", brand="Logitech")]
+    assert filter_candidates(unpriced, {"max_price": 20.0}) is None
+    assert filter_candidates(CANDIDATES, {"price_indication": "cheaper"}) is None
+    # The fallback's fresh candidates are still held to the other constraints
+    constraints = {"brand": "Logitech", "max_price": 20.0, "price_indication": "max 20"}
+    assert without_price(constraints) == {"brand": "Logitech"}
+    assert [hit.product_id for hit in filter_candidates(unpriced, without_price(constraints))] == ["p5"]
+
+
+def test_merge_slots_and_delta_text():
+    slots = {"category": "Maus", "attributes": {"color": "schwarz"}, "other_keywords": ["leise"]}
+    delta = {"brand": "Logitech", "attributes": {"capacity": "16gb"}, "other_keywords": ["leise", "kabellos"],
+             "max_price": None}
+    merged = merge_slots(slots, delta)
+    assert merged == {"category": "Maus", "brand": "Logitech", "attributes": {"color": "schwarz", "capacity": "16gb"},
+                      "other_keywords": ["leise", "kabellos"]}
+    assert slots["attributes"] == {"color": "schwarz"}
+    assert delta_text(delta) == "Logitech 16gb leise kabellos"
+
+
+def test_session_store_evicts_least_recently_used(clock):
+    store = SessionStore(max_entries=2, ttl_seconds=60)
+    first, second = store.put(session("a")), store.put(session("b"))
+    assert store.get(first) is not None
+    store.put(session("c"))
+    assert store.get(second) is None
+    assert store.get(first).query == "a"
+    assert store.stats()["evictions"] == 1
+
+
+def test_session_store_ttl_slides_with_use(clock):
+    store = SessionStore(max_entries=10, ttl_seconds=60)
+    session_id = store.put(session())
+    clock.now += 50
+    assert store.get(session_id) is not None
+    clock.now += 50
+    assert store.get(session_id) is not None
+    clock.now += 60
+    assert store.get(session_id) is None
+    assert store.stats()["expired"] == 1
@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.core.results import SearchHit
+from app.services import sharding
+from app.services.sharding import LegHits, fan_out, fuse
+
+
+def hit(product_id, score, point_id=None):
+    return SearchHit(point_id if point_id is not None else product_id, score,
+                     {"product_id": product_id} if product_id is not None else None)
+
+
+def ids(hits):
+    return [hit.product_id for hit in hits]
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    metrics = sharding.ShardMetrics()
+    monkeypatch.setattr(sharding, "shard_metrics", metrics)
+    return metrics
+
+
+def test_raw_fusion_keeps_each_product_at_its_best_score():
+    merged = fuse({"a": [hit("p1", 0.9), hit("p2", 0.4)], "b": [hit("p2", 0.7), hit("p3", 0.5)]}, limit=10)
+    assert ids(merged) == ["p1", "p2", "p3"]
+    assert merged[1].score == 0.7
+    assert ids(fuse({"a": [hit("p1", 0.9), hit("p2", 0.4)], "b": [hit("p3", 0.5)]}, limit=2)) == ["p1", "p3"]
+
+
+def test_points_without_product_id_stay_apart_across_collections():
+    merged = fuse({"a": [hit(None, 0.9, point_id=1)], "b": [hit(None, 0.8, point_id=1)]}, limit=10)
+    assert len(merged) == 2
+
+
+def test_rrf_fusion_sums_reciprocal_ranks(monkeypatch):
+    monkeypatch.setattr(settings, "SHARD_RRF_K", 60)
+    merged = fuse({"a": [hit("x", 10.0), hit("y", 9.0)], "b": [hit("y", 0.2), hit("z", 0.1)]}, limit=10, method="rrf")
+    assert ids(merged) == ["y", "x", "z"]
+    assert merged[0].score == pytest.approx(1 / 61 + 1 / 62)
+
+
+def test_score_fusion_normalizes_each_list():
+    merged = fuse([("a", [hit("x", 10.0), hit("y", 5.0), hit("z", 0.0)]), ("b", [hit("w", 0.3)])],
+                  limit=10, method="score")
+    assert [(hit.product_id, hit.score) for hit in merged] == [("x", 1.0), ("w", 1.0), ("y", 0.5), ("z", 0.0)]
+
+
+def test_leg_hits_are_merged_per_leg_then_fused_with_rrf():
+    shard_legs = {
+        "a": LegHits([[hit("p1", 0.9), hit("p2", 0.5)], [hit("p2", 10.0), hit("p3", 8.0)]], limits=[2, 2]),
+        "b": LegHits([[hit("p4", 0.8)], [hit("p4", 9.0)]], limits=[2, 2]),
+    }
+    merged = fuse(shard_legs, limit=10)
+    # p2 falls out of the dense leg's prefetch limit, p3 out of the sparse one's
+    assert ids(merged) == ["p4", "p1", "p2"]
+    assert merged[0].score == pytest.approx(2 / (sharding.QDRANT_RRF_K + 1))
+    with pytest.raises(ValueError):
+        fuse(shard_legs, limit=10, method="rrf")
+
+
+def test_unknown_method_and_empty_input():
+    with pytest.raises(ValueError):
+        fuse({"a": [hit("p1", 1.0)]}, limit=10, method="borda")
+    assert fuse({"a": [], "b": []}, limit=10) == []
+
+
+def test_fan_out_drops_slow_and_failing_shards(metrics):
+    async def search_shard(collection_name):
+        if collection_name == "slow":
+            await asyncio.sleep(5)
+        if collection_name == "broken":
+            raise RuntimeError("connection refused")
+        return [hit(f"{collection_name}-1", 0.5)]
+
+    started = time.perf_counter()
+    merged, details = fan_out(search_shard, ["a", "slow", "broken", "b"], limit=10, timeout_ms=100, method="raw")
+    # The slow shard is cancelled at its timeout instead of being waited for
+    assert time.perf_counter() - started < 2
+    assert ids(merged) == ["a-1", "b-1"]
+    assert (details["answered"], details["timed_out"], details["failed"]) == (2, ["slow"], ["broken"])
+    by_collection = metrics.stats()["by_collection"]
+    assert by_collection["slow"] == {"queries": 1, "timeouts": 1, "errors": 0}
+    assert by_collection["broken"]["errors"] == 1
+
+
+def test_fan_out_fuses_in_collection_order(metrics):
+    async def search_shard(collection_name):
+        # The first collection answers last; equal scores still rank it first
+        await asyncio.sleep(0.05 if collection_name == "a" else 0)
+        return [hit(collection_name, 1.0)]
+
+    merged, _ = fan_out(search_shard, ["a", "b", "c"], limit=10, timeout_ms=0, method="raw")
+    assert ids(merged) == ["a", "b", "c"]
+
+
+def test_route_narrows_by_category(monkeypatch):
+    monkeypatch.setattr(settings, "SEARCH_COLLECTIONS", "de, partner")
+    monkeypatch.setattr(settings, "SHARD_ROUTING_JSON", '{"Laptops": ["de"]}')
+    sharding._routing.cache_clear()
+    try:
+        assert sharding.route({"category": " laptops"}) == ["de"]
+        assert sharding.route({"category": "Maus"}) == ["de", "partner"]
+        assert sharding.route(None) == ["de", "partner"]
+    finally:
+        sharding._routing.cache_clear()
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from app.benchmarks.replay import load_query_log
+from app.benchmarks.stats import diff_summaries, percentile, summarize
+
+
+def test_percentile_interpolates_between_ranks():
+    values = [40.0, 10.0, 30.0, 20.0]
+    assert percentile(values, 0) == 10.0
+    assert percentile(values, 100) == 40.0
+    assert percentile(values, 50) == pytest.approx(25.0)
+    assert percentile(values, 95) == pytest.approx(38.5)
+
+
+def test_percentile_of_no_values_is_zero():
+    assert percentile([], 99) == 0.0
+
+
+def test_summarize():
+    summary = summarize(float(value) for value in range(1, 101))
+    assert summary["count"] == 100
+    assert summary["mean"] == pytest.approx(50.5)
+    assert summary["p50"] == pytest.approx(50.5)
+    assert summary["p99"] == pytest.approx(99.01)
+    assert summary["max"] == 100.0
+    assert summarize([]) == {"count": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+
+
+def test_diff_summaries():
+    diff = diff_summaries({"p50": 10.0, "p95": 0.0}, {"p50": 15.0, "p95": 5.0}, keys=("p50", "p95"))
+    assert diff["p50"] == {"base": 10.0, "current": 15.0, "delta": 5.0, "delta_pct": 50.0}
+    # No relative change against a zero base
+    assert diff["p95"]["delta_pct"] == 0.0
+
+
+def test_load_query_log_keeps_replayable_entries(tmp_path):
+    path = tmp_path / "queries.jsonl"
+    path.write_text("\n".join(json.dumps(entry) for entry in [
+        {"query": "gaming maus", "limit": 10},
+        {"query": "   "},
+        {"event": "no query"},
+        {"query": 42},
+    ]) + "\n", encoding="utf-8")
+    entries = load_query_log(str(path), repeat=2)
+    assert entries == [{"query": "gaming maus", "limit": 10}] * 2
@@ -0,0 +1,105 @@
+import pytest
+
+from app.services import typeahead
+from app.services.typeahead import TypeaheadIndex, normalize_term, searchable_text
+
+
+def products():
+    return [
+        {"product_id": 1, "title": "Logitech Funkmaus M185", "brand": "Logitech", "category": "Maus", "popularity": 50},
+        {"product_id": 2, "title": "Cherry Tastatur KC 1000", "brand": "Cherry", "category": "Tastatur", "popularity": 20},
+        {"product_id": 3, "title": "Logitech Tastatur K120", "brand": "Logitech", "category": "Tastatur", "popularity": 10},
+        {"product_id": 4, "title": "Mäuse-Set für Kinder", "category": "Maus", "popularity": 5},
+    ]
+
+
+def texts(suggestions):
+    return [suggestion["text"] for suggestion in suggestions]
+
+
+def test_normalization_is_german_aware():
+    assert normalize_term("Größe MÄUSE") == "groesse maeuse"
+    assert searchable_text("Mäuse") == "maeuse mause"
+    assert searchable_text("Maus") == "maus"
+
+
+def test_prefix_infix_and_umlaut_matches():
+    index = TypeaheadIndex.from_products(products())
+    assert "Logitech Funkmaus M185" in texts(index.suggest("funkm"))
+    # Compound match inside a token
+    assert "Logitech Funkmaus M185" in texts(index.suggest("maus", limit=10))
+    assert "Mäuse-Set für Kinder" in texts(index.suggest("mause"))
+    assert "Mäuse-Set für Kinder" in texts(index.suggest("maeuse"))
+    assert texts(index.suggest("logitech tast")) == ["Logitech Tastatur K120"]
+    assert index.suggest("   ") == []
+
+
+def test_facets_are_suggested_and_ranked_by_popularity():
+    index = TypeaheadIndex.from_products(products())
+    suggestions = index.suggest("t", limit=3)
+    assert suggestions[0] == {"text": "Tastatur", "kind": "category", "product_id": None}
+
+
+def test_products_without_an_id_are_skipped():
+    index = TypeaheadIndex.from_products(products() + [{"title": "Tastatur ohne ID"}])
+    assert "Tastatur ohne ID" not in texts(index.suggest("tastatur", limit=20))
+    assert index.sync_products(products() + [{"title": "Tastatur ohne ID"}]) == {"upserted": 0, "removed": 0}
+
+
+def test_delta_matches_by_prefix_like_the_segment():
+    index = TypeaheadIndex.from_products(products())
+    index.upsert_products([{"product_id": 5, "title": "Haustier Kamera", "popularity": 1}])
+    assert texts(index.suggest("kam")) == ["Haustier Kamera"]
+    assert texts(index.suggest("tier")) == ["Haustier Kamera"]
+    # Two characters only match at a word start
+    assert "Haustier Kamera" not in texts(index.suggest("am"))
+    assert "Haustier Kamera" not in texts(index.suggest("st", limit=20))
+
+
+def test_removal_retracts_entries_and_facets():
+    index = TypeaheadIndex.from_products(products())
+    index.remove_products([2])
+    assert "Cherry" not in texts(index.suggest("ch"))
+    assert "Cherry Tastatur KC 1000" not in texts(index.suggest("tastatur", limit=20))
+    # Logitech keeps one product behind it
+    index.remove_products([1])
+    assert "Logitech" in texts(index.suggest("logi"))
+    index.remove_products([3])
+    assert "Logitech" not in texts(index.suggest("logi"))
+    assert index.stats()["facets"] == 1  # only the "Maus" category of product 4
+
+
+def test_sync_upserts_changed_and_removes_missing_products():
+    index = TypeaheadIndex.from_products(products())
+    changed = [dict(product) for product in products()[1:]]
+    changed[0]["title"] = "Cherry Tastatur Stream"
+    assert index.sync_products(changed) == {"upserted": 1, "removed": 1}
+    assert texts(index.suggest("stream")) == ["Cherry Tastatur Stream"]
+    assert index.suggest("funkmaus") == []
+    assert index.sync_products(changed) == {"upserted": 0, "removed": 0}
+
+
+def test_compaction_drops_tombstones(monkeypatch):
+    monkeypatch.setattr(typeahead, "COMPACT_THRESHOLD", 3)
+    index = TypeaheadIndex.from_products(products())
+    index.remove_products([1, 2])
+    index.upsert_products([{"product_id": 6, "title": "Webcam", "popularity": 1}])
+    stats = index.stats()
+    assert (stats["delta"], stats["removed"]) == (0, 0)
+    assert stats["entries"] == len(index._displays)
+    assert texts(index.suggest("web")) == ["Webcam"]
+    assert "Cherry" not in texts(index.suggest("ch"))
+
+
+def test_short_prefix_lists_skip_removed_entries(monkeypatch):
+    monkeypatch.setattr(typeahead, "SHORT_PREFIX_TOP", 2)
+    many = [{"product_id": n, "title": f"Kabel {n}", "popularity": 100 - n} for n in range(10)]
+    index = TypeaheadIndex.from_products(many)
+    index.remove_products([0, 1])
+    suggestions = texts(index.suggest("ka", limit=2))
+    assert suggestions == ["Kabel 2", "Kabel 3"]
+
+
+@pytest.mark.parametrize("limit", [0, -1])
+def test_non_positive_limit(limit):
+    assert TypeaheadIndex.from_products(products()).suggest("maus", limit=limit) == []
@@ -0,0 +1,95 @@
+import contextvars
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.services import usage
+from app.services.usage import RequestUsage, UsageMetrics
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(usage.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    metrics = UsageMetrics()
+    monkeypatch.setattr(usage, "usage_metrics", metrics)
+    return metrics
+
+
+def completion(prompt_tokens, completion_tokens, cached_tokens=0):
+    return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                           prompt_tokens_details=SimpleNamespace(cached_tokens=cached_tokens))
+
+
+def test_token_cost_prices_cached_input_separately():
+    assert usage.token_cost("gpt-4o-mini", 1000, 100, cached_tokens=400) == pytest.approx(
+        (600 * 0.15 + 400 * 0.075 + 100 * 0.60) / 1_000_000)
+    assert usage.token_cost("unknown-model", 1000, 100) is None
+
+
+def test_records_attach_to_the_current_request(metrics):
+    def run():
+        request_usage = usage.start_request("FUSION_RRF")
+        usage.record_completion("query_enhancement", "gpt-4o-mini", completion(100, 20, cached_tokens=50))
+        usage.record_completion("product_generation", "gpt-4o-mini", None)
+        return request_usage
+
+    request_usage = contextvars.copy_context().run(run)
+    assert request_usage.total_tokens == 120
+    summary = request_usage.summary()
+    assert (summary["prompt_tokens"], summary["cached_tokens"], summary["cheap_path"]) == (100, 50, False)
+    stats = metrics.stats()
+    assert stats["cached_prompt_ratio"] == 0.5
+    assert stats["by_stage"][0]["pipeline"] == "FUSION_RRF"
+
+
+def test_minute_budget_uses_a_sliding_window(monkeypatch, clock, metrics):
+    monkeypatch.setattr(settings, "TOKEN_BUDGET_PER_MINUTE", 1000)
+    usage.record_completion("product_generation", "gpt-4o-mini", completion(900, 50))
+    assert not usage.minute_budget_exceeded()
+    clock.now += 30
+    usage.record_completion("product_generation", "gpt-4o-mini", completion(40, 10))
+    assert usage.minute_budget_exceeded()
+    # The first call leaves the window
+    clock.now += 31
+    assert metrics.tokens_last_minute() == 50
+    assert not usage.minute_budget_exceeded()
+
+
+def test_zero_budgets_never_switch(monkeypatch, metrics):
+    monkeypatch.setattr(settings, "TOKEN_BUDGET_PER_MINUTE", 0)
+    monkeypatch.setattr(settings, "TOKEN_BUDGET_PER_REQUEST", 0)
+    usage.record_completion("product_generation", "gpt-4o-mini", completion(10 ** 6, 10 ** 6))
+    assert not usage.minute_budget_exceeded()
+    assert not usage.request_budget_exceeded(RequestUsage("SEMANTIC"), upcoming_tokens=10 ** 6)
+
+
+def test_request_budget_counts_the_upcoming_call(monkeypatch):
+    monkeypatch.setattr(settings, "TOKEN_BUDGET_PER_REQUEST", 1000)
+    request_usage = RequestUsage("SEMANTIC")
+    request_usage.calls.append({"prompt_tokens": 300, "completion_tokens": 100, "embedding_tokens": 100})
+    assert not usage.request_budget_exceeded(request_usage, upcoming_tokens=500)
+    assert usage.request_budget_exceeded(request_usage, upcoming_tokens=501)
+
+
+def test_cheap_path_is_counted_once_per_request(metrics):
+    request_usage = RequestUsage("SEMANTIC")
+    usage.use_cheap_path(request_usage, "per-minute budget")
+    usage.use_cheap_path(request_usage, "per-request budget")
+    assert request_usage.cheap_path
+    assert request_usage.summary()["cheap_path"]
+    assert metrics.stats()["cheap_path_requests"] == 1